@@ -0,0 +1,115 @@
+"""
+Benchmark one turn's worth of DynamoDB calls, made one after another with the
+sync API and concurrently with the async API
+
+Runs against DynamoDB Local when DYNAMODB_ENDPOINT is set, e.g.
+
+    docker run -p 8000:8000 amazon/dynamodb-local
+    DYNAMODB_ENDPOINT=http://localhost:8000 python -m benchmarks.bench_async_data_access
+
+and otherwise against an in-memory table that sleeps for LATENCY seconds per
+call, standing in for the network round trip.
+"""
+import asyncio
+import os
+import time
+import uuid
+
+from worlds_worst_serverless.worlds_worst_auth import async_database_ops
+from worlds_worst_serverless.worlds_worst_auth import database_ops
+
+TURNS = 20
+LATENCY = 0.01
+
+
+class SimulatedTable:
+    """
+    Just enough of a boto3 Table for these calls, with a fixed delay per call
+    """
+
+    name = "simulated"
+
+    def __init__(self):
+        self.items = dict()
+
+    def get_item(self, Key, **kwargs):
+        time.sleep(LATENCY)
+        item = self.items.get(Key["playerId"])
+        return {"Item": dict(item)} if item is not None else {}
+
+    def put_item(self, Item, **kwargs):
+        time.sleep(LATENCY)
+        self.items[Item["playerId"]] = dict(Item)
+        return {}
+
+    def update_item(self, Key, **kwargs):
+        time.sleep(LATENCY)
+        return {}
+
+
+def make_table():
+    """
+    Create the benchmark table on DynamoDB Local, or a simulated one
+
+    :return: Table object
+    """
+    if not os.environ.get("DYNAMODB_ENDPOINT"):
+        return SimulatedTable()
+
+    return database_ops.dynamodb.create_table(
+        TableName=f"bench-{uuid.uuid4()}",
+        KeySchema=[{"AttributeName": "playerId", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "playerId", "AttributeType": "S"}],
+        ProvisionedThroughput={"ReadCapacityUnits": 100, "WriteCapacityUnits": 100},
+    )
+
+
+def sync_turn(table, player_token, target_token):
+    database_ops.load_player(table, player_token, use_cache=False)
+    database_ops.load_player(table, target_token, use_cache=False)
+    database_ops.update_player(table, player_token, {"hit_points": 400})
+    database_ops.update_player(table, target_token, {"hit_points": 300})
+    table.put_item(Item={"playerId": f"history-{uuid.uuid4()}", "entry": {}})
+
+
+async def async_turn(table, player_token, target_token):
+    await asyncio.gather(
+        async_database_ops.load_player(table, player_token, use_cache=False),
+        async_database_ops.load_player(table, target_token, use_cache=False),
+    )
+    await asyncio.gather(
+        async_database_ops.update_player(table, player_token, {"hit_points": 400}),
+        async_database_ops.update_player(table, target_token, {"hit_points": 300}),
+        async_database_ops.put_item(
+            table, {"playerId": f"history-{uuid.uuid4()}", "entry": {}}
+        ),
+    )
+
+
+def main() -> None:
+    table = make_table()
+    for player_token in ("player_hash", "target_hash"):
+        table.put_item(
+            Item={"playerId": player_token, "player_data": {}, "version": 1}
+        )
+
+    start = time.perf_counter()
+    for _ in range(TURNS):
+        sync_turn(table, "player_hash", "target_hash")
+    sync_time = (time.perf_counter() - start) / TURNS
+
+    async def run_async():
+        for _ in range(TURNS):
+            await async_turn(table, "player_hash", "target_hash")
+
+    start = time.perf_counter()
+    asyncio.run(run_async())
+    async_time = (time.perf_counter() - start) / TURNS
+
+    print(f"table: {table.name}")
+    print(f"  sync, one call after another: {sync_time * 1e3:7.2f} ms per turn")
+    print(f"  async, concurrent calls:      {async_time * 1e3:7.2f} ms per turn")
+
+
+if __name__ == "__main__":
+    main()
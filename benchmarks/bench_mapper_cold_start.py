@@ -0,0 +1,120 @@
+"""
+Benchmark the mapper's cold start: the time from a fresh interpreter to the
+first matched action
+
+Compares the old deployment, which extracted fuzzywuzzy and python-Levenshtein
+from .requirements.zip to /tmp (as serverless-python-requirements' zip option
+does) before importing them, with the standard-library matcher. Every run is
+a new process with an empty extraction directory and no compiled bytecode for
+the mapper or its requirements, like a new Lambda container.
+
+    python -m benchmarks.bench_mapper_cold_start
+"""
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+
+import fuzzywuzzy
+import Levenshtein
+
+RUNS = 20
+ROOT = Path(__file__).resolve().parents[1]
+MAPPER = ROOT / "worlds_worst_serverless" / "worlds_worst_mapper"
+
+# Each script prints the seconds from its first line to the first response
+ZIPPED = """
+import time
+start = time.perf_counter()
+import os, sys, zipfile
+zipfile.ZipFile(sys.argv[1]).extractall(sys.argv[2])
+sys.path.insert(0, sys.argv[2])
+from fuzzywuzzy import process
+from guidelines import ACTIONS_MAP
+ACTIONS_MAP[process.extractOne("attac", ACTIONS_MAP.keys())[0]]
+print(time.perf_counter() - start)
+"""
+STDLIB = """
+import time
+start = time.perf_counter()
+import json
+import mapper
+mapper.get_matching_action({"body": json.dumps({"action": "attac"})}, {})
+print(time.perf_counter() - start)
+"""
+
+
+def build_requirements_zip(path: Path) -> None:
+    """
+    Zip the installed fuzzywuzzy and Levenshtein packages, like the
+    serverless-python-requirements plugin did for the mapper
+
+    :param path: Where to write the zip
+    """
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as requirements:
+        for package in (fuzzywuzzy, Levenshtein):
+            package_dir = Path(package.__file__).parent
+            for file in package_dir.rglob("*"):
+                if "__pycache__" not in file.parts and file.is_file():
+                    requirements.write(file, file.relative_to(package_dir.parent))
+
+
+def time_cold_starts(script: str, work_dir: Path, args: list = ()) -> list:
+    """
+    Run a script in fresh interpreters and collect its reported times
+
+    :param script: Python source to run
+    :param work_dir: Scratch directory, emptied before every run
+    :param args: Arguments for the script
+    :return: List of seconds to first response
+    """
+    times = []
+    for _ in range(RUNS):
+        # A fresh copy of the deployed sources, without their __pycache__
+        shutil.rmtree(work_dir / "run", ignore_errors=True)
+        task_root = work_dir / "run" / "task"
+        task_root.mkdir(parents=True)
+        for source in MAPPER.glob("*.py"):
+            shutil.copy(source, task_root)
+
+        output = subprocess.run(
+            [sys.executable, "-c", script, *args],
+            cwd=task_root,
+            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+        times.append(float(output.stdout.strip().splitlines()[-1]))
+    return times
+
+
+def main() -> None:
+    work_dir = Path(tempfile.mkdtemp())
+    try:
+        requirements_zip = work_dir / ".requirements.zip"
+        build_requirements_zip(requirements_zip)
+        print(f"requirements zip: {requirements_zip.stat().st_size / 1024:.0f} KiB")
+
+        zipped = time_cold_starts(
+            ZIPPED,
+            work_dir,
+            [str(requirements_zip), str(work_dir / "run" / "sls-py-req")],
+        )
+        stdlib = time_cold_starts(STDLIB, work_dir)
+    finally:
+        shutil.rmtree(work_dir)
+
+    for name, times in (("zipped fuzzywuzzy", zipped), ("standard library", stdlib)):
+        print(
+            f"{name:>18}: median {statistics.median(times) * 1000:6.1f}ms"
+            f"  max {max(times) * 1000:6.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark mapper lookups as the vocabulary grows
+
+Compares process.extractOne, which scores every choice on every call, against
+MatchIndex for exact hits, near-exact misspellings of long commands, repeated
+queries and new short misspellings (which still score every choice).
+
+    python -m benchmarks.bench_mapper_matching
+"""
+import random
+import string
+import timeit
+from typing import Callable, List
+
+from fuzzywuzzy import process
+
+from worlds_worst_serverless.worlds_worst_mapper.guidelines import ACTIONS_MAP
+from worlds_worst_serverless.worlds_worst_mapper.match_index import MatchIndex
+
+VOCABULARY_SIZES = (7, 100, 1000, 5000)
+
+
+def make_vocabulary(size: int, rng: random.Random) -> List[str]:
+    """
+    Build a vocabulary of the real actions plus random multi-word commands
+
+    :param size: Number of entries
+    :param rng: Random number generator
+    :return: List of commands
+    """
+    vocabulary = list(ACTIONS_MAP)
+    while len(vocabulary) < size:
+        words = (
+            "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8)))
+            for _ in range(rng.randint(2, 3))
+        )
+        vocabulary.append(" ".join(words))
+    return vocabulary
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    """
+    Replace one character of a word
+
+    :param word: Word to misspell
+    :param rng: Random number generator
+    :return: Misspelled word
+    """
+    position = rng.randrange(len(word))
+    return word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1 :]
+
+
+def time_per_call(function: Callable, queries: List[str], number: int) -> float:
+    """
+    Average time of one call, in microseconds
+
+    :param function: Function taking a query
+    :param queries: Queries to run
+    :param number: Times to run every query
+    :return: Microseconds per call
+    """
+    total = timeit.timeit(lambda: [function(query) for query in queries], number=number)
+    return total / (number * len(queries)) * 1e6
+
+
+def main() -> None:
+    rng = random.Random(0)
+    print(f"{'vocabulary':>10} {'query':>12} {'extractOne':>12} {'MatchIndex':>12}")
+    for size in VOCABULARY_SIZES:
+        vocabulary = make_vocabulary(size, rng)
+        index = MatchIndex(vocabulary)
+        long_commands = [entry for entry in vocabulary if len(entry) >= 16]
+        cases = {
+            "exact": (index.match, ["attack", "change class", "Dodge!"]),
+            "near-exact": (
+                index._match,
+                [misspell(rng.choice(long_commands), rng) for _ in range(3)],
+            ),
+            "repeated": (index.match, ["attac", "blok", "dodg"]),
+            # Bypass the query cache, so every call scores the whole vocabulary
+            "new typo": (index._match, ["attac", "blok", "dodg"]),
+        }
+
+        # extractOne gets slow quickly; keep the large runs to a few seconds
+        number = max(1, 20000 // size)
+        for name, (match, queries) in cases.items():
+            for query in queries:
+                match(query)
+            extract_time = time_per_call(
+                lambda query: process.extractOne(query, vocabulary), queries, number
+            )
+            index_time = time_per_call(match, queries, number)
+            print(
+                f"{size:>10} {name:>12} {extract_time:>10.1f}us {index_time:>10.1f}us"
+            )
+
+
+if __name__ == "__main__":
+    main()
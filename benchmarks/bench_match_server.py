@@ -0,0 +1,84 @@
+"""
+Benchmark the match server with thousands of fights in one process: turns
+played per second, memory per live fight, and how many checkpoint writes the
+turns cost
+
+    python -m benchmarks.bench_match_server
+"""
+import asyncio
+import contextlib
+import io
+import random
+import time
+import tracemalloc
+
+from worlds_worst_serverless.worlds_worst_arena.checkpoints import MemoryCheckpoints
+from worlds_worst_serverless.worlds_worst_arena.match_server import MatchServer
+from worlds_worst_serverless.worlds_worst_combat.player_data import Player
+
+FIGHTS = 5000
+TURNS = 5
+MOVES = ("attack", "block", "dodge", "disrupt", "area")
+
+
+def make_player(name: str) -> Player:
+    return Player(
+        name=name,
+        character_class="dreamer",
+        max_hit_points=100000,
+        max_ex=1000,
+        hit_points=100000,
+        ex=0,
+        status_effects=[],
+        action="attack",
+        enhanced=False,
+    )
+
+
+async def run() -> None:
+    store = MemoryCheckpoints()
+    server = MatchServer(store)
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for i in range(FIGHTS):
+        await server.start_fight(
+            f"fight-{i}", make_player(f"left-{i}"), make_player(f"right-{i}")
+        )
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    # The combat engine prints as it goes, which would dominate the timings
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(TURNS):
+            await asyncio.gather(
+                *(
+                    server.submit_move(
+                        f"fight-{i}", f"{side}-{i}", random.choice(MOVES)
+                    )
+                    for i in range(FIGHTS)
+                    for side in ("left", "right")
+                )
+            )
+    play_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    saved = await server.checkpoint_dirty()
+    checkpoint_time = time.perf_counter() - start
+
+    print(f"{FIGHTS} fights, {TURNS} turns each")
+    print(f"  memory per live fight:  {(after - before) / FIGHTS / 1024:7.2f} KiB")
+    print(f"  turns per second:       {FIGHTS * TURNS / play_time:10.0f}")
+    print(
+        f"  checkpoint of {saved} fights: {checkpoint_time * 1e3:7.2f} ms, "
+        f"{store.writes} writes for {FIGHTS * TURNS} turns"
+    )
+
+
+def main() -> None:
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Benchmark the matchmaking queue with tens of thousands of queued players:
+time to queue each player, and time to pair everyone as their windows widen
+
+    python -m benchmarks.bench_matchmaking
+"""
+import random
+import time
+
+from worlds_worst_serverless.worlds_worst_arena.matchmaking import MatchQueue
+
+PLAYERS = 50000
+
+
+def main() -> None:
+    random.seed(0)
+    ratings = [int(random.gauss(1000, 300)) for _ in range(PLAYERS)]
+
+    queue = MatchQueue()
+    start = time.perf_counter()
+    # Everyone joins at once, before anyone's window has widened
+    paired = sum(
+        queue.join(f"player-{i}", rating, now=0) is not None
+        for i, rating in enumerate(ratings)
+    )
+    join_time = time.perf_counter() - start
+
+    rounds = 0
+    start = time.perf_counter()
+    for waited in range(0, 60, 5):
+        paired += len(queue.match(now=waited))
+        rounds += 1
+    match_time = time.perf_counter() - start
+
+    print(f"{PLAYERS} players")
+    print(f"  join:  {join_time / PLAYERS * 1e6:7.2f} us per player")
+    print(f"  match: {match_time / rounds * 1e3:7.2f} ms per round over the queue")
+    print(f"  {paired} pairs, {len(queue)} players still queued")
+
+
+if __name__ == "__main__":
+    main()
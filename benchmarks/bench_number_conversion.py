@@ -0,0 +1,77 @@
+"""
+Benchmark turning DynamoDB player items into JSON / native Python types
+
+Compares the DecimalEncoder hook, which converts numbers one callback at a time
+inside json.dumps, against converting the whole item once with to_native.
+
+    python -m benchmarks.bench_number_conversion
+"""
+import json
+import timeit
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from worlds_worst_serverless.worlds_worst_auth.database_ops import (
+    DecimalEncoder,
+    to_native,
+)
+
+ROUNDS = 2000
+
+
+def make_item(history_length: int) -> dict:
+    """
+    Build a player item as boto3 hands it back, with every number a Decimal
+
+    :param history_length: Number of recent fights kept in the player item
+    :return: DynamoDB player item
+    """
+    player_data = {
+        "name": "Truckthunders",
+        "character_class": "dreamer",
+        "max_hit_points": 500,
+        "max_ex": 1000,
+        "hit_points": 350,
+        "ex": 450,
+        "status_effects": [["prone", 1], ["poison", 12], ["anti_area", 999]],
+        "action": "attack",
+        "enhanced": False,
+        "auth_token": "i_am_authed",
+        "context": "home",
+        "target": "Crunchbucket",
+        "history": [
+            {"opponent": "Crunchbucket", "hit_points": 500 - i, "ex": 50 * i}
+            for i in range(history_length)
+        ],
+    }
+    item = {"playerId": "player_hash", "version": 12, "player_data": player_data}
+
+    # Round trip through the wire format so numbers come back as Decimals
+    serializer = TypeSerializer()
+    deserializer = TypeDeserializer()
+    wire = {key: serializer.serialize(value) for key, value in item.items()}
+    return {key: deserializer.deserialize(value) for key, value in wire.items()}
+
+
+def main() -> None:
+    for history_length in (0, 10, 100):
+        item = make_item(history_length)
+
+        encoder_dumps = timeit.timeit(
+            lambda: json.dumps(item, cls=DecimalEncoder), number=ROUNDS
+        )
+        encoder_native = timeit.timeit(
+            lambda: json.loads(json.dumps(item, cls=DecimalEncoder)), number=ROUNDS
+        )
+        bulk_dumps = timeit.timeit(lambda: json.dumps(to_native(item)), number=ROUNDS)
+        bulk_native = timeit.timeit(lambda: to_native(item), number=ROUNDS)
+
+        print(f"history entries: {history_length}")
+        print(f"  to JSON,   DecimalEncoder: {encoder_dumps / ROUNDS * 1e6:8.1f} us")
+        print(f"  to JSON,   to_native:      {bulk_dumps / ROUNDS * 1e6:8.1f} us")
+        print(f"  to native, DecimalEncoder: {encoder_native / ROUNDS * 1e6:8.1f} us")
+        print(f"  to native, to_native:      {bulk_native / ROUNDS * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
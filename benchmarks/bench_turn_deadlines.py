@@ -0,0 +1,47 @@
+"""
+Benchmark the timer wheel with hundreds of thousands of turn deadlines: cost of
+scheduling and cancelling one, and of moving the wheel on a tick
+
+    python -m benchmarks.bench_turn_deadlines
+"""
+import random
+import time
+
+from worlds_worst_serverless.worlds_worst_arena.timer_wheel import TimerWheel
+
+FIGHTS = 200000
+TURN_TIMEOUT = 30.0
+
+
+def main() -> None:
+    random.seed(0)
+    wheel = TimerWheel(now=0)
+    deadlines = [random.uniform(0, TURN_TIMEOUT) for _ in range(FIGHTS)]
+
+    start = time.perf_counter()
+    for i, deadline in enumerate(deadlines):
+        wheel.schedule(i, deadline)
+    schedule_time = time.perf_counter() - start
+
+    # Most turns resolve before their deadline
+    start = time.perf_counter()
+    for i in range(0, FIGHTS, 2):
+        wheel.cancel(i)
+    cancel_time = time.perf_counter() - start
+
+    ticks = int(TURN_TIMEOUT / wheel.tick) + 1
+    expired = 0
+    start = time.perf_counter()
+    for tick in range(1, ticks + 1):
+        expired += len(wheel.advance(tick * wheel.tick))
+    advance_time = time.perf_counter() - start
+
+    print(f"{FIGHTS} deadlines over {TURN_TIMEOUT:.0f}s")
+    print(f"  schedule: {schedule_time / FIGHTS * 1e6:7.2f} us each")
+    print(f"  cancel:   {cancel_time / (FIGHTS // 2) * 1e6:7.2f} us each")
+    print(f"  advance:  {advance_time / ticks * 1e3:7.2f} ms per tick")
+    print(f"  {expired} expired, {len(wheel)} left")
+
+
+if __name__ == "__main__":
+    main()
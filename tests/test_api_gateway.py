@@ -1,3 +1,10 @@
+import json
+
+import pytest
+
+from worlds_worst_serverless.worlds_worst_gateway import routes
+
+
 def test_placeholder():
     """
     Placeholder for tests, to make sure pytest and tox and poetry are playing nice
@@ -9,3 +16,149 @@ def test_placeholder():
     return_value = 0.0
 
     assert test_value == return_value
+
+
+def test_http_route_runs_handler_in_process() -> None:
+    """
+    Test that an HTTP request is turned into a proxy event and the handler's
+    proxy response back into an HTTP response
+    """
+    # Arrange
+    event = routes.build_event(
+        "POST",
+        "/mapper",
+        {"content-type": "application/json"},
+        {},
+        b'{"action": "attac"}',
+    )
+
+    # Act
+    status, headers, body = routes.call_route(routes.ROUTES["/mapper"], event)
+
+    # Assert
+    assert event["body"] == '{"action": "attac"}'
+    assert event["isBase64Encoded"] is False
+    assert status == 200
+    assert headers == {"Access-Control-Allow-Origin": "*"}
+    assert body == b"do_combat"
+
+
+def test_http_route_maps_unhandled_errors_to_502(mocker) -> None:
+    """
+    Test that a handler raising is answered like API Gateway answers it
+
+    :param mocker: Pytest mock fixture
+    """
+    # Arrange
+    handler = mocker.Mock(side_effect=RuntimeError("boom"))
+    mocker.patch.dict(routes.FUNCTIONS, {"combat": ("/combat", handler)})
+    event = routes.build_event("POST", "/combat", {}, {}, b"{}")
+
+    # Act
+    status, _, body = routes.call_route("combat", event)
+
+    # Assert
+    assert status == 502
+    assert json.loads(body) == {"message": "Internal server error"}
+
+
+def test_http_route_rejects_bad_requests() -> None:
+    """
+    Test that a request the handler's schema rejects is answered with a 400
+    """
+    # Arrange
+    event = routes.build_event("POST", "/combat", {}, {}, b"{}")
+
+    # Act
+    status, headers, body = routes.call_route("combat", event)
+
+    # Assert
+    assert status == 400
+    assert headers["Content-Type"] == "application/json"
+    assert json.loads(body) == {"Error": "body is missing Player1, Player2"}
+
+
+def test_invoke_accepts_lambda_events(mocker) -> None:
+    """
+    Test that the Lambda Invoke API path runs the handler on a raw event, which
+    is validated like any other, and reports unhandled errors the way Lambda
+    does
+
+    :param mocker: Pytest mock fixture
+    """
+    # Arrange
+    payload = json.dumps({"body": {"action": "dodge on bob"}}).encode("utf-8")
+
+    # Act
+    status, headers, body = routes.invoke("parse", payload)
+    rejected_status, _, rejected_body = routes.invoke("combat", b"{}")
+    handler = mocker.Mock(side_effect=RuntimeError("boom"))
+    mocker.patch.dict(routes.FUNCTIONS, {"combat": ("/combat", handler)})
+    failed_status, failed_headers, failed_body = routes.invoke("combat", b"{}")
+
+    # Assert
+    assert status == 200
+    assert "X-Amz-Function-Error" not in headers
+    assert json.loads(json.loads(body)["body"])["target"] == "bob"
+    assert rejected_status == 200
+    assert json.loads(rejected_body)["statusCode"] == 400
+    assert failed_status == 200
+    assert failed_headers["X-Amz-Function-Error"] == "Unhandled"
+    assert json.loads(failed_body)["errorType"] == "RuntimeError"
+
+
+@pytest.mark.parametrize(
+    "function_name,expected",
+    [
+        ("map", "map"),
+        ("worlds-worst-mapper-dev-map", "map"),
+        ("worlds-worst-mapper-dev-map_batch", "map_batch"),
+        (
+            "arn:aws:lambda:us-east-1:123456789012:function:worlds-worst-auth-dev-authenticate:3",
+            "authenticate",
+        ),
+        ("worlds-worst-combat-dev-missing", None),
+    ],
+)
+def test_resolve_function(function_name: str, expected: str) -> None:
+    """
+    Test that deployed function names and ARNs resolve to their handlers
+
+    :param function_name: FunctionName passed to the Invoke API
+    :param expected: Expected key of FUNCTIONS
+    """
+    # Act
+    resolved = routes.resolve_function(function_name)
+
+    # Assert
+    assert resolved == expected
+
+
+def test_app_serves_routes(monkeypatch) -> None:
+    """
+    Test the FastAPI app end to end, when FastAPI is installed, with the Invoke
+    API only answering internal clients
+
+    :param monkeypatch: Pytest monkeypatch fixture
+    """
+    # Arrange
+    testclient = pytest.importorskip("fastapi.testclient")
+    from worlds_worst_serverless.worlds_worst_gateway.main import app
+
+    client = testclient.TestClient(app)
+    invoke_path = "/2015-03-31/functions/worlds-worst-mapper-dev-map/invocations"
+
+    # Act
+    mapped = client.post("/mapper", json={"action": "Block!"})
+    refused = client.post(invoke_path, json={"body": {"action": "Block!"}})
+    # TestClient requests come from "testclient"
+    monkeypatch.setattr(routes, "INVOKE_CLIENTS", frozenset(["testclient"]))
+    invoked = client.post(invoke_path, json={"body": {"action": "Block!"}})
+    missing = client.post("/2015-03-31/functions/nope/invocations", json={})
+
+    # Assert
+    assert mapped.status_code == 200
+    assert mapped.text == "do_combat"
+    assert refused.status_code == 403
+    assert invoked.json()["body"] == "do_combat"
+    assert missing.status_code == 404
@@ -0,0 +1,496 @@
+import asyncio
+from dataclasses import asdict, replace
+
+import pytest
+
+from worlds_worst_serverless.worlds_worst_arena.checkpoints import MemoryCheckpoints
+from worlds_worst_serverless.worlds_worst_arena.match_server import (
+    MatchServer,
+    MoveError,
+)
+from worlds_worst_serverless.worlds_worst_arena.matchmaking import (
+    Matchmaker,
+    MatchQueue,
+)
+from worlds_worst_serverless.worlds_worst_arena.timer_wheel import TimerWheel
+from worlds_worst_serverless.worlds_worst_combat.player_data import Player
+
+
+def make_player(name: str, hit_points: int = 500) -> Player:
+    return Player(
+        name=name,
+        character_class="dreamer",
+        max_hit_points=500,
+        max_ex=1000,
+        hit_points=hit_points,
+        ex=0,
+        status_effects=[],
+        action="attack",
+        enhanced=False,
+    )
+
+
+def test_turn_is_played_once_both_moves_are_in() -> None:
+    """
+    Test that both players get the same result once the second move arrives,
+    and that nothing is checkpointed until the checkpoint runs
+    """
+    # Arrange
+    store = MemoryCheckpoints()
+    server = MatchServer(store)
+
+    async def play():
+        await server.start_fight("fight", make_player("bob"), make_player("jim"))
+        return await asyncio.gather(
+            server.submit_move("fight", "bob", "attac"),
+            server.submit_move("fight", "jim", "block!"),
+        )
+
+    # Act
+    bob_result, jim_result = asyncio.run(play())
+
+    # Assert
+    assert bob_result == jim_result
+    assert bob_result["turn"] == 1
+    assert "bob uses attack!" in bob_result["message"]
+    assert "jim uses block!" in bob_result["message"]
+    assert store.writes == 0
+    assert server.fights["fight"].dirty is True
+
+
+def test_checkpoint_and_restore() -> None:
+    """
+    Test that changed fights are checkpointed together, dropped once idle and
+    brought back when a move arrives for them
+    """
+    # Arrange
+    store = MemoryCheckpoints()
+    server = MatchServer(store, idle_timeout=0)
+
+    async def play():
+        await server.start_fight("one", make_player("bob"), make_player("jim"))
+        await server.start_fight("two", make_player("amy"), make_player("sue"))
+        await asyncio.gather(
+            server.submit_move("one", "bob", "attack"),
+            server.submit_move("one", "jim", "dodge"),
+        )
+        saved = await server.checkpoint_dirty()
+        saved_again = await server.checkpoint_dirty()
+        evicted = server.evict_idle()
+        result = await asyncio.gather(
+            server.submit_move("one", "bob", "area"),
+            server.submit_move("one", "jim", "disrupt"),
+        )
+        return saved, saved_again, evicted, result
+
+    # Act
+    saved, saved_again, evicted, (result, _) = asyncio.run(play())
+
+    # Assert
+    assert (saved, saved_again, evicted) == (2, 0, 2)
+    assert store.fights["one"]["turn"] == 1
+    assert result["turn"] == 2
+    assert "one" in server.fights
+
+
+def test_checkpoints_leave_out_auth_tokens() -> None:
+    """
+    Test that neither fight checkpoints nor the queue snapshot store players'
+    auth tokens
+    """
+    # Arrange
+    store = MemoryCheckpoints()
+    server = MatchServer(store)
+    matchmaker = Matchmaker(server)
+    bob = replace(make_player("bob"), auth_token="bobs-token")
+    matchmaker.players["bob"] = bob
+
+    async def play():
+        await server.start_fight("one", bob, make_player("jim"))
+        await server.checkpoint_dirty()
+
+    # Act
+    asyncio.run(play())
+    snapshot = matchmaker.snapshot()
+
+    # Assert
+    assert all("auth_token" not in player for player in store.fights["one"]["players"])
+    assert "auth_token" not in snapshot["players"]["bob"]
+    assert "bobs-token" not in repr((store.fights, snapshot))
+
+
+@pytest.mark.parametrize(
+    "player_token, text, status_code",
+    [
+        ("amy", "attack", 403),
+        ("bob", "change class to thief", 400),
+        ("bob", "???", 400),
+    ],
+)
+def test_bad_moves_are_refused(player_token: str, text: str, status_code: int) -> None:
+    """
+    Test that moves by outsiders and moves that aren't combat actions are
+    refused with a status code
+    """
+    # Arrange
+    server = MatchServer(MemoryCheckpoints())
+
+    async def play():
+        await server.start_fight("fight", make_player("bob"), make_player("jim"))
+        await server.submit_move("fight", player_token, text)
+
+    # Act
+    with pytest.raises(MoveError) as e:
+        asyncio.run(play())
+
+    # Assert
+    assert e.value.status_code == status_code
+
+
+def test_finished_fight_is_checkpointed_immediately() -> None:
+    """
+    Test that a fight where someone dies is written out and dropped at once,
+    and further moves are refused
+    """
+    # Arrange
+    store = MemoryCheckpoints()
+    server = MatchServer(store)
+
+    async def play():
+        await server.start_fight("fight", make_player("bob"), make_player("jim", 1))
+        result, _ = await asyncio.gather(
+            server.submit_move("fight", "bob", "attack"),
+            server.submit_move("fight", "jim", "disrupt"),
+        )
+        with pytest.raises(MoveError) as e:
+            await server.submit_move("fight", "bob", "attack")
+        return result, e.value
+
+    # Act
+    result, error = asyncio.run(play())
+
+    # Assert
+    assert result["finished"] is True
+    assert store.fights["fight"]["finished"] is True
+    assert "fight" not in server.fights
+    assert error.status_code == 409
+
+
+def test_finished_fight_is_kept_until_checkpointed() -> None:
+    """
+    Test that a finished fight whose checkpoint fails stays in memory, dirty,
+    until a later checkpoint saves it
+    """
+    # Arrange
+    store = MemoryCheckpoints()
+    server = MatchServer(store)
+    saved = store.save_many
+    failures = [ConnectionError("DynamoDB is down")]
+
+    async def flaky_save_many(fights):
+        if failures:
+            raise failures.pop()
+        await saved(fights)
+
+    store.save_many = flaky_save_many
+
+    async def play():
+        await server.start_fight("fight", make_player("bob"), make_player("jim", 1))
+        result, _ = await asyncio.gather(
+            server.submit_move("fight", "bob", "attack"),
+            server.submit_move("fight", "jim", "disrupt"),
+        )
+        kept = "fight" in server.fights and server.fights["fight"].dirty
+        checkpointed = await server.checkpoint_dirty()
+        return result, kept, checkpointed
+
+    # Act
+    result, kept, checkpointed = asyncio.run(play())
+
+    # Assert
+    assert result["finished"] is True
+    assert kept is True
+    assert checkpointed == 1
+    assert store.fights["fight"]["finished"] is True
+
+
+def test_queue_snapshot_is_not_a_fight() -> None:
+    """
+    Test that the matchmaking queue's snapshot, stored with the fights, can't be
+    loaded as a fight
+    """
+    # Arrange
+    store = MemoryCheckpoints()
+    server = MatchServer(store)
+
+    async def play():
+        await store.save_many([{"fightId": "matchmaking-queue", "queue": []}])
+        with pytest.raises(MoveError) as e:
+            await server.get_fight("matchmaking-queue")
+        return e.value
+
+    # Act
+    error = asyncio.run(play())
+
+    # Assert
+    assert error.status_code == 404
+
+
+@pytest.mark.parametrize(
+    "ratings, waited, pairs",
+    [
+        # Closest ratings pair up, across bucket edges too
+        ([1000, 1180, 1040, 1199], 0, [("a", "c"), ("b", "d")]),
+        # Too far apart until their windows widen
+        ([1000, 1300], 0, []),
+        ([1000, 1300], 30, [("a", "b")]),
+        # Windows stop widening at the maximum
+        ([1000, 2000], 3600, []),
+    ],
+)
+def test_queue_pairs_closest_ratings_within_window(
+    ratings: list, waited: float, pairs: list
+) -> None:
+    """
+    Test that queued players are paired with their closest rated opponent once
+    both their windows accept the difference
+    """
+    # Arrange
+    queue = MatchQueue()
+
+    # Act
+    matched = [
+        queue.join(player_token, rating, now=0)
+        for player_token, rating in zip("abcd", ratings)
+    ]
+    matched = [pair for pair in matched if pair is not None]
+    matched += queue.match(now=waited)
+
+    # Assert
+    assert sorted(matched) == sorted(pairs)
+    assert len(queue) == len(ratings) - 2 * len(pairs)
+
+
+def test_queue_restores_from_snapshot() -> None:
+    """
+    Test that a restored queue keeps its players, their ratings and how long
+    they waited
+    """
+    # Arrange
+    queue = MatchQueue()
+    queue.join("a", 1000, now=0)
+    queue.join("b", 1300, now=10)
+    snapshot = queue.snapshot(now=20)
+
+    # Act
+    restored = MatchQueue()
+    restored.restore(snapshot, now=100)
+    early = restored.match(now=100)
+    later = restored.match(now=115)
+
+    # Assert
+    assert snapshot == [
+        {"playerId": "a", "rating": 1000, "waited_ms": 20000},
+        {"playerId": "b", "rating": 1300, "waited_ms": 10000},
+    ]
+    assert early == []
+    assert later == [("a", "b")]
+
+
+def test_matchmaker_starts_fight_for_pair() -> None:
+    """
+    Test that two queued players both get the fight the match server started
+    for them
+    """
+    # Arrange
+    server = MatchServer(MemoryCheckpoints())
+    matchmaker = Matchmaker(server)
+
+    async def play():
+        return await asyncio.gather(
+            matchmaker.join(make_player("bob"), 1000),
+            matchmaker.join(make_player("jim"), 1010),
+        )
+
+    # Act
+    bob_fight, jim_fight = asyncio.run(play())
+
+    # Assert
+    assert bob_fight == jim_fight
+    assert set(bob_fight["players"]) == {"bob", "jim"}
+    assert bob_fight["fightId"] in server.fights
+    assert len(matchmaker.queue) == 0
+
+
+def test_timer_wheel_expires_deadlines_in_order() -> None:
+    """
+    Test that deadlines expire at their tick, across wheels and past the
+    wheels' reach, and that cancelled ones don't
+    """
+    # Arrange
+    wheel = TimerWheel(tick=1, slot_bits=2, levels=2, now=0)
+    deadlines = {"soon": 3, "later": 9, "cancelled": 5, "far": 40, "passed": -5}
+    for key, deadline in deadlines.items():
+        wheel.schedule(key, deadline)
+
+    # Act
+    cancelled = wheel.cancel("cancelled")
+    expired = [wheel.advance(now) for now in (1, 3, 8, 9, 39, 40)]
+
+    # Assert
+    assert cancelled is True
+    assert expired == [["passed"], ["soon"], [], ["later"], [], ["far"]]
+    assert len(wheel) == 0
+
+
+def test_expired_turn_plays_default_action() -> None:
+    """
+    Test that a player who doesn't answer in time plays their last action, and
+    the player who moved gets the turn's result
+    """
+    # Arrange
+    server = MatchServer(MemoryCheckpoints(), turn_timeout=0)
+
+    async def play():
+        await server.start_fight("fight", make_player("bob"), make_player("jim"))
+        server.fights["fight"].players["jim"].action = "dodge"
+        waiting = asyncio.ensure_future(server.submit_move("fight", "bob", "block"))
+        await asyncio.sleep(0)
+        deadline = server.deadlines.deadline("fight")
+        expired = server.deadlines.advance(deadline + 1)
+        await server.expire_turn("fight")
+        return deadline, expired, await waiting
+
+    # Act
+    deadline, expired, result = asyncio.run(play())
+
+    # Assert
+    assert deadline is not None
+    assert expired == ["fight"]
+    assert result["message"][0] == "jim ran out of time."
+    assert "jim uses dodge!" in result["message"]
+    assert server.fights["fight"].deadline is None
+
+
+def test_deadlines_survive_restart() -> None:
+    """
+    Test that a turn deadline checkpointed with its fight is scheduled again by
+    a new server using the same store
+    """
+    # Arrange
+    store = MemoryCheckpoints()
+    server = MatchServer(store)
+
+    async def play():
+        await server.start_fight("fight", make_player("bob"), make_player("jim"))
+        asyncio.ensure_future(server.submit_move("fight", "bob", "attack"))
+        await asyncio.sleep(0)
+        await server.checkpoint_dirty()
+
+        restarted = MatchServer(store)
+        restored = await restarted.restore_deadlines()
+        result = await restarted.expire_turn("fight")
+        return restarted, restored, result
+
+    # Act
+    restarted, restored, result = asyncio.run(play())
+
+    # Assert
+    assert restored == 1
+    assert restarted.deadlines.deadline("fight") is None
+    assert "bob uses attack!" in result["message"]
+    assert result["turn"] == 1
+
+
+def test_app_plays_moves_over_http_and_websockets(monkeypatch) -> None:
+    """
+    Test that a move sent over HTTP and one sent over a WebSocket play the same
+    turn, for the players their auth tokens belong to
+
+    :param monkeypatch: Pytest monkeypatch fixture
+    """
+    # Arrange
+    testclient = pytest.importorskip("fastapi.testclient")
+    from fastapi import WebSocketDisconnect
+
+    from worlds_worst_serverless.worlds_worst_arena import app
+    from worlds_worst_serverless.worlds_worst_arena.match_server import Fight
+
+    tokens = {"bob_token": "bob", "jim_token": "jim", "amy_token": "amy"}
+    monkeypatch.setenv("TOKEN_TABLE", "Tokens")
+    monkeypatch.setattr(app, "resolve_token", lambda table, token: tokens.get(token))
+    app.server.fights["fight"] = Fight(
+        "fight", {"bob": make_player("bob"), "jim": make_player("jim")}
+    )
+    client = testclient.TestClient(app.app)
+
+    # Act
+    with client.websocket_connect("/arena/fights/fight/ws?auth_token=bob_token") as ws:
+        ws.send_json({"action": "attack"})
+        moved = client.post(
+            "/arena/fights/fight/moves",
+            json={"auth_token": "jim_token", "playerId": "bob", "action": "dodge"},
+        )
+        pushed = ws.receive_json()
+    refused = client.post(
+        "/arena/fights/fight/moves", json={"auth_token": "amy_token", "action": "dodge"}
+    )
+    forged = client.post(
+        "/arena/fights/fight/moves", json={"playerId": "jim", "action": "dodge"}
+    )
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/arena/fights/fight/ws?auth_token=nope") as ws:
+            ws.receive_json()
+
+    # Assert
+    assert moved.status_code == 200
+    assert moved.json() == pushed
+    assert pushed["turn"] == 1
+    assert "jim uses dodge!" in pushed["message"]
+    assert refused.status_code == 403
+    assert forged.status_code == 401
+
+
+def test_app_starts_fights_for_authenticated_players(monkeypatch) -> None:
+    """
+    Test that a fight is only started by one of its players, and bad requests
+    are answered with a 400 instead of failing
+
+    :param monkeypatch: Pytest monkeypatch fixture
+    """
+    # Arrange
+    testclient = pytest.importorskip("fastapi.testclient")
+
+    from worlds_worst_serverless.worlds_worst_arena import app
+
+    tokens = {"bob_token": "bob", "amy_token": "amy"}
+    monkeypatch.setenv("TOKEN_TABLE", "Tokens")
+    monkeypatch.setenv("DYNAMODB_TABLE", "Players")
+    monkeypatch.setattr(app, "resolve_token", lambda table, token: tokens.get(token))
+
+    async def batch_load_players(table, player_tokens):
+        return {
+            token: {"player_data": asdict(make_player(token))}
+            for token in player_tokens
+        }
+
+    monkeypatch.setattr(app, "batch_load_players", batch_load_players)
+    client = testclient.TestClient(app.app)
+    fight = {"playerIds": ["bob", "jim"], "fightId": "started"}
+
+    # Act
+    started = client.post("/arena/fights", json={"auth_token": "bob_token", **fight})
+    unauthenticated = client.post("/arena/fights", json=fight)
+    someone_else = client.post(
+        "/arena/fights", json={"auth_token": "amy_token", **fight}
+    )
+    malformed = client.post("/arena/fights", content="{not json")
+    no_players = client.post("/arena/fights", json={"auth_token": "bob_token"})
+
+    # Assert
+    assert started.status_code == 200
+    assert "started" in app.server.fights
+    assert unauthenticated.status_code == 401
+    assert someone_else.status_code == 403
+    assert malformed.status_code == 400
+    assert no_players.status_code == 400
@@ -0,0 +1,823 @@
+import asyncio
+import base64
+import decimal
+import hashlib
+import hmac
+import json
+import pytest
+import threading
+import time
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+from worlds_worst_serverless.worlds_worst_auth import async_database_ops
+from worlds_worst_serverless.worlds_worst_auth import authenticator
+from worlds_worst_serverless.worlds_worst_auth import database_ops
+from worlds_worst_serverless.worlds_worst_auth import fight_history
+from worlds_worst_serverless.worlds_worst_auth import token_index
+from worlds_worst_serverless.worlds_worst_auth import token_verifier
+from worlds_worst_serverless.worlds_worst_auth import update_expressions
+from worlds_worst_serverless.worlds_worst_auth.item_cache import ItemCache
+from worlds_worst_serverless.worlds_worst_auth.player_diff import diff_player
+from worlds_worst_serverless.worlds_worst_auth.update_expressions import (
+    Append,
+    Increment,
+    REMOVE,
+    compile_update,
+)
+
+
+SIGNING_KEY = "not_a_real_secret"
+
+
+def make_token(claims: dict, key: str = SIGNING_KEY, header: dict = None) -> str:
+    """
+    Build an HS256-signed JWT
+
+    :param claims: Claims to put in the token
+    :param key: Secret to sign the token with
+    :param header: Token header, defaults to a plain HS256 header
+    :return: Encoded token
+    """
+
+    def encode(data: bytes) -> str:
+        return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+    header = header or {"alg": "HS256", "typ": "JWT"}
+    signing_input = (
+        encode(json.dumps(header).encode()) + "." + encode(json.dumps(claims).encode())
+    )
+    signature = hmac.new(key.encode(), signing_input.encode(), hashlib.sha256)
+    return signing_input + "." + encode(signature.digest())
+
+
+@pytest.fixture(autouse=True)
+def signing_keys(mocker: mock) -> None:
+    """
+    Fixture to configure the signing key and empty the verified token cache
+
+    :param mocker: Pytest mock fixture
+    """
+    mocker.patch.dict(
+        "os.environ", {"AUTH_SIGNING_KEYS": json.dumps({"main": SIGNING_KEY})}
+    )
+    token_verifier.verified_tokens.clear()
+
+
+class FakeClock:
+    """
+    Clock that only moves when told to
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def player_item() -> dict:
+    return {
+        "playerId": "player_hash",
+        "version": 3,
+        "player_data": {
+            "name": "Truckthunders",
+            "character_class": "dreamer",
+            "hit_points": 500,
+            "status_effects": [],
+        },
+    }
+
+
+@pytest.fixture
+def mock_table(player_item: dict) -> mock.MagicMock:
+    """
+    Fixture to create a table whose get_item returns player_item
+
+    :param player_item: Player as stored in DynamoDB
+    :return: Mock DynamoDB table
+    """
+    database_ops.player_cache.clear()
+    table = mock.MagicMock()
+    table.name = "Table"
+    table.get_item.side_effect = lambda **kwargs: {"Item": dict(player_item)}
+    return table
+
+
+def test_cache_ttl_expiry() -> None:
+    """
+    Test that entries expire after the TTL
+    """
+    # Arrange
+    clock = FakeClock()
+    cache = ItemCache(ttl=10, clock=clock)
+    cache.put("key", {"hit_points": 500}, version=1)
+
+    # Act
+    clock.now = 9
+    before_expiry = cache.get("key")
+    clock.now = 11
+    after_expiry = cache.get("key")
+
+    # Assert
+    assert before_expiry == {"hit_points": 500}
+    assert after_expiry is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_cache_lru_eviction() -> None:
+    """
+    Test that the least recently used entry is evicted first, by count and by bytes
+    """
+    # Arrange
+    cache = ItemCache(max_entries=2, max_bytes=1000)
+
+    # Act
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+    cache.get("a")
+    cache.put("c", {"v": 3})
+
+    # Assert
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert cache.stats()["evictions"] == 1
+
+    # Act - a large item pushes everything else out
+    cache.put("big", {"v": "x" * 990})
+
+    # Assert
+    assert len(cache) == 1
+    assert cache.stats()["bytes"] <= 1000
+
+
+def test_cache_refuses_older_versions() -> None:
+    """
+    Test that an older version of an item never replaces a newer one
+    """
+    # Arrange
+    cache = ItemCache()
+    cache.put("key", {"hit_points": 400}, version=5)
+
+    # Act
+    stored = cache.put("key", {"hit_points": 500}, version=4)
+
+    # Assert
+    assert stored is False
+    assert cache.get("key") == {"hit_points": 400}
+    assert cache.version("key") == 5
+    assert cache.stats()["stale_writes"] == 1
+
+
+def test_cache_returns_copies() -> None:
+    """
+    Test that mutating a returned item does not change the cached item
+    """
+    # Arrange
+    cache = ItemCache()
+    cache.put("key", {"status_effects": [["prone", 1]]})
+
+    # Act
+    cache.get("key")["status_effects"].append(["lag", 1])
+
+    # Assert
+    assert cache.get("key") == {"status_effects": [["prone", 1]]}
+
+
+def test_to_native() -> None:
+    """
+    Test that DynamoDB numbers become ints and floats all the way down
+    """
+    # Arrange
+    item = {
+        "version": decimal.Decimal("3"),
+        "player_data": {
+            "hit_points": decimal.Decimal("450"),
+            "ratio": decimal.Decimal("0.5"),
+            "status_effects": [["prone", decimal.Decimal("1")]],
+            "name": "Truckthunders",
+            "enhanced": False,
+        },
+    }
+
+    # Act
+    native = database_ops.to_native(item)
+
+    # Assert
+    assert native == {
+        "version": 3,
+        "player_data": {
+            "hit_points": 450,
+            "ratio": 0.5,
+            "status_effects": [["prone", 1]],
+            "name": "Truckthunders",
+            "enhanced": False,
+        },
+    }
+    assert type(native["player_data"]["hit_points"]) is int
+    assert type(native["player_data"]["status_effects"][0][1]) is int
+    assert type(native["player_data"]["ratio"]) is float
+
+
+def test_load_player_uses_cache(mock_table: mock.MagicMock) -> None:
+    """
+    Test that repeat loads of a player only read DynamoDB once
+
+    :param mock_table: Mock DynamoDB table
+    """
+    # Act
+    first = database_ops.load_player(table=mock_table, player_token="player_hash")
+    second = database_ops.load_player(table=mock_table, player_token="player_hash")
+
+    # Assert
+    assert first == second
+    assert "playerId" not in first
+    assert mock_table.get_item.call_count == 1
+    assert database_ops.player_cache.stats()["hits"] >= 1
+
+
+def test_update_player_bumps_version(
+    mock_table: mock.MagicMock, player_item: dict
+) -> None:
+    """
+    Test that updates increment the version and refresh the cached player
+
+    :param mock_table: Mock DynamoDB table
+    :param player_item: Player as stored in DynamoDB
+    """
+    # Arrange
+    updated_item = dict(player_item, version=4)
+    updated_item["player_data"] = dict(player_item["player_data"], hit_points=400)
+    mock_table.update_item.return_value = {"Attributes": updated_item}
+
+    # Act
+    database_ops.update_player(
+        table=mock_table,
+        player_token="player_hash",
+        update_map={"hit_points": 400},
+        expected_version=3,
+    )
+    cached = database_ops.load_player(table=mock_table, player_token="player_hash")
+
+    # Assert
+    kwargs = mock_table.update_item.call_args[1]
+    assert kwargs["ExpressionAttributeNames"]["#version"] == "version"
+    assert kwargs["ConditionExpression"] == "#version = :expected_version"
+    assert kwargs["ExpressionAttributeValues"][":expected_version"] == 3
+    assert cached["player_data"]["hit_points"] == 400
+    assert mock_table.get_item.call_count == 0
+
+
+def test_update_player_stale_version(mock_table: mock.MagicMock) -> None:
+    """
+    Test that a write based on a stale player raises and refreshes the cache
+
+    :param mock_table: Mock DynamoDB table
+    """
+    # Arrange
+    mock_table.update_item.side_effect = ClientError(
+        {"Error": {"Code": "ConditionalCheckFailedException", "Message": "No"}},
+        "UpdateItem",
+    )
+
+    # Act
+    with pytest.raises(database_ops.StaleVersionError):
+        database_ops.update_player(
+            table=mock_table,
+            player_token="player_hash",
+            update_map={"hit_points": 400},
+            expected_version=2,
+        )
+
+    # Assert
+    assert mock_table.get_item.call_args[1]["ConsistentRead"] is True
+    assert database_ops.player_cache.version(("Table", "player_hash")) == 3
+
+
+def test_compile_update_operations() -> None:
+    """
+    Test that every kind of operation compiles, with reserved words as names
+    """
+    # Arrange
+    update_map = {
+        "player_data.name": "Truckthunders",
+        "player_data.ex": Increment(50),
+        "player_data.status_effects": Append([["prone", 1]]),
+        "player_data.history[0]": REMOVE,
+    }
+
+    # Act
+    expression, names, values = compile_update(update_map)
+
+    # Assert
+    assert expression == (
+        "SET #n0.#n1 = :v0, "
+        "#n0.#n2 = if_not_exists(#n0.#n2, :zero) + :v1, "
+        "#n0.#n3 = list_append(if_not_exists(#n0.#n3, :empty_list), :v2) "
+        "REMOVE #n0.#n4[0]"
+    )
+    assert names == {
+        "#n0": "player_data",
+        "#n1": "name",
+        "#n2": "ex",
+        "#n3": "status_effects",
+        "#n4": "history",
+    }
+    assert values == {
+        ":v0": "Truckthunders",
+        ":v1": 50,
+        ":v2": [["prone", 1]],
+        ":zero": 0,
+        ":empty_list": [],
+    }
+
+
+def test_compile_update_many_fields() -> None:
+    """
+    Test that updates with more than 26 fields compile
+    """
+    # Arrange
+    update_map = {f"field_{i}": i for i in range(40)}
+
+    # Act
+    expression, names, values = compile_update(update_map)
+
+    # Assert
+    assert len(names) == 40
+    assert len(values) == 40
+    assert values[":v39"] == 39
+
+
+def test_compile_update_caches_by_shape() -> None:
+    """
+    Test that updates of the same shape reuse the compiled expression
+    """
+    # Arrange
+    update_expressions.compile_shape.cache_clear()
+
+    # Act
+    first = compile_update({"hit_points": 400, "ex": Increment(50)})
+    second = compile_update({"hit_points": 300, "ex": Increment(100)})
+
+    # Assert
+    assert first[0] == second[0]
+    assert second[2] == {":v0": 300, ":v1": 100, ":zero": 0}
+    assert update_expressions.compile_shape.cache_info().hits == 1
+
+
+def test_compile_update_bad_path() -> None:
+    """
+    Test that malformed attribute paths are rejected
+    """
+    with pytest.raises(ValueError):
+        compile_update({"player_data..name": "Truckthunders"})
+
+
+def test_diff_player_only_changed_fields() -> None:
+    """
+    Test that only changed attributes end up in the update
+    """
+    # Arrange
+    before = {
+        "name": "Truckthunders",
+        "hit_points": 500,
+        "ex": 0,
+        "enhanced": True,
+        "history": ["won", "lost", "won", "won", "lost", "lost", "won"],
+    }
+    after = dict(before, hit_points=400, ex=150, enhanced=False)
+
+    # Act
+    update_map = diff_player(before, after)
+
+    # Assert
+    assert update_map == {"hit_points": 400, "ex": 150, "enhanced": False}
+
+
+@pytest.mark.parametrize(
+    "before,after,expected",
+    [
+        (
+            [["anti_area", 999], ["connected", 2]],
+            [["anti_area", 999], ["connected", 2], ["enhancement_sickness", 1]],
+            {"status_effects": Append([["enhancement_sickness", 1]])},
+        ),
+        (
+            [["anti_area", 998], ["connected", 1], ["poison", 9], ["lag", 1]],
+            [["anti_area", 998], ["poison", 9]],
+            {"status_effects[1]": REMOVE, "status_effects[3]": REMOVE},
+        ),
+        (
+            [["prone", 2]],
+            [["prone", 1]],
+            {"status_effects": [["prone", 1]]},
+        ),
+        (
+            [["prone", 1]],
+            [],
+            {"status_effects": []},
+        ),
+    ],
+)
+def test_diff_player_lists(before: list, after: list, expected: dict) -> None:
+    """
+    Test that lists use appends and removes only when they are cheaper
+
+    :param before: status_effects before the turn
+    :param after: status_effects after the turn
+    :param expected: Expected update map
+    """
+    # Act
+    update_map = diff_player({"status_effects": before}, {"status_effects": after})
+
+    # Assert
+    assert update_map == expected
+
+
+def test_save_player_skips_unchanged(mock_table: mock.MagicMock) -> None:
+    """
+    Test that saving an unchanged player doesn't write to DynamoDB
+
+    :param mock_table: Mock DynamoDB table
+    """
+    # Arrange
+    player_data = {"hit_points": 500, "status_effects": []}
+
+    # Act
+    response = database_ops.save_player(
+        table=mock_table,
+        player_token="player_hash",
+        before=player_data,
+        after=dict(player_data),
+    )
+
+    # Assert
+    assert response is None
+    assert mock_table.update_item.call_count == 0
+
+
+def test_fight_history_pages() -> None:
+    """
+    Test that fight history is queried newest first, one page at a time
+    """
+    # Arrange
+    table = mock.MagicMock()
+    table.query.side_effect = [
+        {"Items": [{"fought_at": 2}], "LastEvaluatedKey": {"fought_at": 2}},
+        {"Items": [{"fought_at": 1}]},
+    ]
+
+    # Act
+    first_page, next_key = fight_history.get_fight_history(
+        table=table, player_token="player_hash", limit=1
+    )
+    second_page, last_key = fight_history.get_fight_history(
+        table=table, player_token="player_hash", limit=1, start_key=next_key
+    )
+
+    # Assert
+    first_kwargs = table.query.call_args_list[0][1]
+    second_kwargs = table.query.call_args_list[1][1]
+    assert first_kwargs["ScanIndexForward"] is False
+    assert "ExclusiveStartKey" not in first_kwargs
+    assert second_kwargs["ExclusiveStartKey"] == {"fought_at": 2}
+    assert first_page + second_page == [{"fought_at": 2}, {"fought_at": 1}]
+    assert last_key is None
+
+
+def test_record_fight() -> None:
+    """
+    Test that a fight is stored under the player, keyed by time
+    """
+    # Arrange
+    table = mock.MagicMock()
+
+    # Act
+    record = fight_history.record_fight(
+        table=table, player_token="player_hash", entry={"won": True}, fought_at=5
+    )
+
+    # Assert
+    table.put_item.assert_called_once_with(Item=record)
+    assert record == {"playerId": "player_hash", "fought_at": 5, "entry": {"won": True}}
+
+
+def test_push_recent_ring_buffer() -> None:
+    """
+    Test that the in-item ring buffer keeps only the last N fights
+    """
+    # Act
+    full = fight_history.push_recent([1, 2, 3], 4, size=3)
+    disabled = fight_history.push_recent([1, 2, 3], 4, size=0)
+
+    # Assert
+    assert full == [2, 3, 4]
+    assert disabled == []
+
+
+def test_batch_load_players(mock_table: mock.MagicMock, player_item: dict) -> None:
+    """
+    Test that batch loads only fetch cache misses and retry unprocessed keys
+
+    :param mock_table: Mock DynamoDB table
+    :param player_item: Player as stored in DynamoDB
+    """
+    # Arrange
+    database_ops.load_player(table=mock_table, player_token="player_hash")
+    target_item = dict(player_item, playerId="target_hash")
+    other_item = dict(player_item, playerId="other_hash")
+    mock_table.meta.client.batch_get_item.side_effect = [
+        {
+            "Responses": {"Table": [target_item]},
+            "UnprocessedKeys": {"Table": {"Keys": [{"playerId": "other_hash"}]}},
+        },
+        {"Responses": {"Table": [other_item]}, "UnprocessedKeys": {}},
+    ]
+
+    # Act
+    players = database_ops.batch_load_players(
+        table=mock_table,
+        player_tokens=["player_hash", "target_hash", "other_hash", "missing_hash"],
+    )
+
+    # Assert
+    first_request = mock_table.meta.client.batch_get_item.call_args_list[0][1]
+    assert first_request["RequestItems"]["Table"]["Keys"] == [
+        {"playerId": "target_hash"},
+        {"playerId": "other_hash"},
+        {"playerId": "missing_hash"},
+    ]
+    assert set(players) == {"player_hash", "target_hash", "other_hash"}
+    assert "playerId" not in players["target_hash"]
+
+
+def test_transact_update_players(mock_table: mock.MagicMock) -> None:
+    """
+    Test that both players of a fight are written in one transaction
+
+    :param mock_table: Mock DynamoDB table
+    """
+    # Act
+    database_ops.transact_update_players(
+        table=mock_table,
+        updates={
+            "player_hash": ({"hit_points": 400}, 3),
+            "target_hash": ({"hit_points": 300}, None),
+        },
+    )
+
+    # Assert
+    transact_items = mock_table.meta.client.transact_write_items.call_args[1][
+        "TransactItems"
+    ]
+    assert [item["Update"]["Key"] for item in transact_items] == [
+        {"playerId": "player_hash"},
+        {"playerId": "target_hash"},
+    ]
+    assert transact_items[0]["Update"]["TableName"] == "Table"
+    assert "ConditionExpression" in transact_items[0]["Update"]
+    assert "ConditionExpression" not in transact_items[1]["Update"]
+
+
+def test_async_calls_run_concurrently(mock_table: mock.MagicMock) -> None:
+    """
+    Test that gathered async loads are in flight at the same time
+
+    :param mock_table: Mock DynamoDB table
+    """
+    # Arrange - each get_item waits until the other one has started
+    barrier = threading.Barrier(2, timeout=5)
+    get_item = mock_table.get_item.side_effect
+
+    def concurrent_get_item(**kwargs):
+        barrier.wait()
+        return get_item(**kwargs)
+
+    mock_table.get_item.side_effect = concurrent_get_item
+
+    async def load_both():
+        return await asyncio.gather(
+            async_database_ops.load_player(mock_table, "player_hash"),
+            async_database_ops.load_player(mock_table, "target_hash"),
+        )
+
+    # Act
+    player, target = asyncio.run(load_both())
+
+    # Assert
+    assert player["player_data"]["name"] == "Truckthunders"
+    assert target["player_data"]["name"] == "Truckthunders"
+    assert mock_table.get_item.call_count == 2
+
+
+@pytest.fixture
+def token_table() -> mock.MagicMock:
+    """
+    Fixture to create an in-memory token table
+
+    :return: Mock DynamoDB token table
+    """
+    token_index.token_cache.clear()
+    records = dict()
+    table = mock.MagicMock()
+    table.put_item.side_effect = lambda Item: records.update(
+        {Item["token_digest"]: Item}
+    )
+    table.delete_item.side_effect = lambda Key: records.pop(Key["token_digest"])
+    table.get_item.side_effect = lambda Key: (
+        {"Item": records[Key["token_digest"]]} if Key["token_digest"] in records else {}
+    )
+    table.records = records
+    return table
+
+
+def test_resolve_token(token_table: mock.MagicMock) -> None:
+    """
+    Test that tokens resolve to players, from the cache after the first read
+
+    :param token_table: Mock DynamoDB token table
+    """
+    # Arrange
+    token_index.index_token(token_table, "i_am_authed", "player_hash")
+    token_index.token_cache.clear()
+
+    # Act
+    first = token_index.resolve_token(token_table, "i_am_authed")
+    second = token_index.resolve_token(token_table, "i_am_authed")
+    unknown = token_index.resolve_token(token_table, "i_am_not_authed")
+
+    # Assert
+    assert first == second == "player_hash"
+    assert unknown is None
+    assert token_table.get_item.call_count == 2
+    assert "i_am_authed" not in str(token_table.records)
+
+
+def test_resolve_expired_token(token_table: mock.MagicMock) -> None:
+    """
+    Test that expired tokens not yet deleted by DynamoDB's TTL don't resolve
+
+    :param token_table: Mock DynamoDB token table
+    """
+    # Arrange
+    token_index.index_token(token_table, "i_am_authed", "player_hash", ttl=-1)
+    token_index.token_cache.clear()
+
+    # Act
+    player_token = token_index.resolve_token(token_table, "i_am_authed")
+
+    # Assert
+    assert player_token is None
+
+
+def test_authenticate_indexes_token(
+    mocker: mock, mock_table: mock.MagicMock, token_table: mock.MagicMock
+) -> None:
+    """
+    Test that re-authenticating points the index at the new token only
+
+    :param mocker: Pytest mock fixture
+    :param mock_table: Mock DynamoDB player table
+    :param token_table: Mock DynamoDB token table
+    """
+    # Arrange
+    mocker.patch.dict(
+        "os.environ", {"DYNAMODB_TABLE": "Table", "TOKEN_TABLE": "Tokens"}
+    )
+    mocker.patch.object(
+        authenticator.dynamodb,
+        "Table",
+        side_effect=lambda name: mock_table if name == "Table" else token_table,
+    )
+    mock_table.update_item.return_value = {}
+    exp = int(time.time()) + 60
+    old_token = make_token({"sub": "player_hash", "session": 1, "exp": exp})
+    new_token = make_token({"sub": "player_hash", "session": 2, "exp": exp})
+    event = {"body": {"playerId": "player_hash", "auth_token": old_token}}
+
+    # Act
+    authenticator.authenticate(event, {})
+    database_ops.player_cache.put(
+        ("Table", "player_hash"),
+        {"player_data": {"auth_token": old_token}, "version": 4},
+        version=4,
+    )
+    event["body"]["auth_token"] = new_token
+    authenticator.authenticate(event, {})
+
+    # Assert
+    assert token_index.resolve_token(token_table, new_token) == "player_hash"
+    assert token_index.resolve_token(token_table, old_token) is None
+
+
+def test_verify_token() -> None:
+    """
+    Test that good tokens verify, and are cached until they expire
+    """
+    # Arrange
+    claims = {"sub": "player_hash", "exp": int(time.time()) + 60}
+    token = make_token(claims)
+
+    # Act
+    first = token_verifier.verify_token(token)
+    second = token_verifier.verify_token(token)
+
+    # Assert
+    assert first == second == claims
+    assert token_verifier.verified_tokens.stats()["hits"] == 1
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        make_token({"sub": "player_hash"}, key="wrong_secret"),
+        make_token({"sub": "player_hash", "exp": int(time.time()) - 3600}),
+        make_token({"sub": "player_hash"}),
+        make_token(
+            {
+                "sub": "player_hash",
+                "exp": int(time.time()) + 7200,
+                "nbf": int(time.time()) + 3600,
+            }
+        ),
+        make_token({"sub": "player_hash"}, header={"alg": "none"}),
+        make_token({"sub": "player_hash"}, header={"alg": "HS256", "kid": "other"}),
+        "i_am_authed",
+        "a.b.c",
+        None,
+    ],
+)
+def test_verify_bad_tokens(token: str) -> None:
+    """
+    Test that forged, expired, never expiring, early and malformed tokens are
+    rejected
+
+    :param token: Token to verify
+    """
+    with pytest.raises(token_verifier.InvalidTokenError):
+        token_verifier.verify_token(token)
+
+
+def test_authenticate_rejects_bad_token(mocker: mock) -> None:
+    """
+    Test that an invalid token is turned away before any DynamoDB traffic
+
+    :param mocker: Pytest mock fixture
+    """
+    # Arrange
+    table = mocker.patch.object(authenticator.dynamodb, "Table")
+    event = {"body": {"playerId": "player_hash", "auth_token": "i_am_authed"}}
+
+    # Act
+    response = authenticator.authenticate(event, {})
+
+    # Assert
+    assert response["statusCode"] == 401
+    assert table.call_count == 0
+
+
+def test_authenticate_rejects_token_for_another_player(mocker: mock) -> None:
+    """
+    Test that a valid token for one player can't log in as another, and nothing
+    is written or revoked
+
+    :param mocker: Pytest mock fixture
+    """
+    # Arrange
+    table = mocker.patch.object(authenticator.dynamodb, "Table")
+    token = make_token({"sub": "player_a", "exp": int(time.time()) + 60})
+    event = {"body": {"playerId": "player_b", "auth_token": token}}
+
+    # Act
+    response = authenticator.authenticate(event, {})
+
+    # Assert
+    assert response["statusCode"] == 401
+    assert "playerId" in json.loads(response["body"])["Error"]
+    assert table.call_count == 0
+
+
+def test_authenticate_warm_up(mocker: mock) -> None:
+    """
+    Test that a warm-up ping connects to both tables without authenticating
+    anyone
+
+    :param mocker: Pytest mock fixture
+    """
+    # Arrange
+    mocker.patch.dict(
+        "os.environ", {"DYNAMODB_TABLE": "Table", "TOKEN_TABLE": "Tokens"}
+    )
+    table = mocker.patch.object(authenticator.dynamodb, "Table")
+
+    # Act
+    response = authenticator.authenticate({"source": "serverless-plugin-warmup"}, {})
+
+    # Assert
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["primed"]["tables"] == ["Table", "Tokens"]
+    assert table.return_value.load.call_count == 2
+    assert table.return_value.put_item.call_count == 0
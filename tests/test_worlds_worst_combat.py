@@ -1,10 +1,15 @@
+import base64
 import copy
+import functools
+import gzip
 import json
 import pytest
 from pathlib import Path
 
+from worlds_worst_serverless.worlds_worst_combat import handler
 from worlds_worst_serverless.worlds_worst_combat.handler import do_combat
 from worlds_worst_serverless.worlds_worst_combat import combat_effects
+from worlds_worst_serverless.worlds_worst_combat import wire_format
 
 
 @pytest.fixture
@@ -98,6 +103,29 @@ def test_combat_round_p1_wins(mock_event: dict, abilities: dict) -> None:
     assert combat_message == expected_message
 
 
+def test_history_not_returned(mock_event: dict) -> None:
+    """
+    Test that player history is only sent back when the request asks for it
+
+    :param mock_event: Mock AWS lambda event dict
+    """
+    # Arrange
+    for player in ("Player1", "Player2"):
+        mock_event["body"][player].update(
+            {"context": "home", "target": "", "history": ["an old fight"]}
+        )
+
+    # Act
+    default_body = json.loads(do_combat(mock_event, mock_event)["body"])
+    mock_event["body"]["include_history"] = True
+    history_body = json.loads(do_combat(mock_event, mock_event)["body"])
+
+    # Assert
+    assert "history" not in default_body["Player1"]
+    assert "history" not in default_body["Player2"]
+    assert history_body["Player1"]["history"] == ["an old fight"]
+
+
 def test_matchups(mock_event: dict) -> None:
     """
     Test that the following holds true:
@@ -156,9 +184,11 @@ def test_check_dead(mock_event: dict) -> None:
     # Arrange
     mock_event["body"]["Player1"]["hit_points"] = 0
     expected_message = ["Truckthunders died to their status effects."]
+    # Players are sent back with the fields they default, but not their history
+    defaults = {"context": "home", "target": ""}
     expected_body = {
-        "Player1": mock_event["body"]["Player1"],
-        "Player2": mock_event["body"]["Player2"],
+        "Player1": {**mock_event["body"]["Player1"], **defaults},
+        "Player2": {**mock_event["body"]["Player2"], **defaults},
         "message": expected_message,
     }
 
@@ -239,7 +269,7 @@ def test_multiple_status(mock_event: dict) -> None:
     assert combat_body_2["Player2"]["status_effects"] == []
 
     # Act - Do it again! Player1 does not re-apply prone
-    combat_body_2["Player1"]["enhanced"] = "False"
+    combat_body_2["Player1"]["enhanced"] = False
     combat_result_2 = {"body": combat_body_2}
 
     # Perform a round of combat
@@ -493,3 +523,256 @@ def test_rules_change(
             different_rules.append(key)
 
     assert set(different_rules) == set(expected_diff)
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        None,
+        [True, False, 0, 127, 128, 65536, 2 ** 40, -1, -33, -40000, -(2 ** 40)],
+        [1.5, "", "Truckthunders", "x" * 300, b"bytes"],
+        {"nested": [{"a": 1}, list(range(20))], "map": {str(i): i for i in range(20)}},
+    ],
+)
+def test_msgpack_round_trip(value) -> None:
+    """
+    Test that values encoded as MessagePack decode to themselves
+
+    :param value: Value to encode
+    """
+    # Act
+    decoded = wire_format.unpack(wire_format.pack(value))
+
+    # Assert
+    assert decoded == value
+
+
+def test_msgpack_depth_is_limited() -> None:
+    """
+    Test that deeply nested arrays are refused as malformed instead of running
+    out of stack
+    """
+    # Arrange
+    nested = b"\x91" * 100000 + b"\xc0"
+    deepest = wire_format.pack(
+        functools.reduce(lambda value, _: [value], range(wire_format.MAX_DEPTH), None)
+    )
+
+    # Act / Assert
+    with pytest.raises(wire_format.WireFormatError):
+        wire_format.unpack(nested)
+    with pytest.raises(wire_format.WireFormatError):
+        wire_format.unpack(b"\x91" + deepest)
+    assert wire_format.unpack(deepest) is not None
+
+
+def test_binary_combat_matches_json(mock_event: dict) -> None:
+    """
+    Test that a MessagePack request gets the same combat results as a JSON one,
+    as base64 MessagePack with players sent as arrays of codes
+
+    :param mock_event: Mock AWS lambda event dict
+    """
+    # Arrange
+    mock_event["body"]["Player2"]["status_effects"] = [["haste", 1]]
+    binary_request = dict(mock_event["body"])
+    for player in ("Player1", "Player2"):
+        binary_request[player] = wire_format.encode_player(binary_request[player])
+    binary_event = {
+        "headers": {"Content-Type": "application/msgpack"},
+        "body": base64.b64encode(wire_format.pack(binary_request)).decode("ascii"),
+        "isBase64Encoded": True,
+    }
+
+    # Act
+    json_result = do_combat(copy.deepcopy(mock_event), {})
+    binary_result = do_combat(binary_event, {})
+    binary_body = wire_format.unpack(base64.b64decode(binary_result["body"]))
+
+    # Assert
+    json_body = json.loads(json_result["body"])
+    assert binary_result["isBase64Encoded"] is True
+    assert binary_result["headers"]["Content-Type"] == "application/msgpack"
+    assert binary_body["Player2"][1] == wire_format.CLASSES.index("cloistered")
+    assert binary_body["Player2"][7] == wire_format.ACTIONS.index("area")
+    for player in ("Player1", "Player2"):
+        decoded = wire_format.decode_player(binary_body[player])
+        assert decoded == json_body[player]
+    assert binary_body["message"] == json_body["message"]
+    assert len(binary_result["body"]) < len(json_result["body"])
+
+
+@pytest.mark.parametrize(
+    "field,value",
+    [
+        (1, -1),
+        (1, len(wire_format.CLASSES)),
+        (7, -len(wire_format.ACTIONS)),
+        (6, [5]),
+        (6, [[]]),
+        (6, ["haste"]),
+    ],
+)
+def test_binary_combat_rejects_bad_codes(mock_event: dict, field: int, value) -> None:
+    """
+    Test that codes out of range and status effects that aren't arrays are
+    answered with a 400 rather than read as something else or failing later
+
+    :param mock_event: Mock AWS lambda event dict
+    :param field: Position of the Player field to break
+    :param value: Bad value for it
+    """
+    # Arrange
+    binary_request = dict(mock_event["body"])
+    for player in ("Player1", "Player2"):
+        binary_request[player] = wire_format.encode_player(binary_request[player])
+    binary_request["Player2"][field] = value
+    binary_event = {
+        "headers": {"Content-Type": "application/msgpack"},
+        "body": base64.b64encode(wire_format.pack(binary_request)).decode("ascii"),
+        "isBase64Encoded": True,
+    }
+
+    # Act
+    with pytest.raises(wire_format.WireFormatError):
+        wire_format.decode_player(binary_request["Player2"])
+    combat_result = do_combat(binary_event, {})
+
+    # Assert
+    assert combat_result["statusCode"] == 400
+
+
+@pytest.mark.parametrize(
+    "headers,expected",
+    [
+        ({}, False),
+        ({"Content-Type": "application/json"}, False),
+        ({"content-type": "application/msgpack"}, True),
+        ({"Content-Type": "application/msgpack", "Accept": "application/json"}, False),
+        ({"Accept": "application/json, application/x-msgpack;q=0.9"}, True),
+    ],
+)
+def test_wants_binary(headers: dict, expected: bool) -> None:
+    """
+    Test content negotiation: MessagePack when accepted, or when sent without
+    asking for something else
+
+    :param headers: Request headers
+    :param expected: Whether the response should be MessagePack
+    """
+    # Act
+    wants = wire_format.wants_binary({"headers": headers})
+
+    # Assert
+    assert wants is expected
+
+
+
+def test_combat_rejects_bad_players(mock_event: dict) -> None:
+    """
+    Test that a player that doesn't match Player is answered with a 400 instead
+    of failing inside the handler
+
+    :param mock_event: Mock AWS lambda event dict
+    """
+    # Arrange
+    del mock_event["body"]["Player2"]["hit_points"]
+    mock_event["body"] = json.dumps(mock_event["body"])
+    mock_event["requestContext"] = {"requestId": "request-1"}
+
+    # Act
+    combat_result = do_combat(mock_event, {})
+
+    # Assert
+    assert combat_result["statusCode"] == 400
+    assert json.loads(combat_result["body"]) == {
+        "Error": "body.Player2 is missing hit_points"
+    }
+
+
+@pytest.mark.parametrize("action", ["punch", "", ["attack"]])
+def test_combat_rejects_unknown_actions(mock_event: dict, action) -> None:
+    """
+    Test that an action the rules don't have is answered with a 400 instead of
+    failing inside resolve_turn
+
+    :param mock_event: Mock AWS lambda event dict
+    :param action: The action Player1 asks for
+    """
+    # Arrange
+    mock_event["body"]["Player1"]["action"] = action
+    mock_event["body"] = json.dumps(mock_event["body"])
+    mock_event["requestContext"] = {"requestId": "request-1"}
+
+    # Act
+    combat_result = do_combat(mock_event, {})
+
+    # Assert
+    assert combat_result["statusCode"] == 400
+    assert json.loads(combat_result["body"]) == {
+        "Error": "body.Player1.action must be one of area, attack, block, "
+        "disrupt, dodge"
+    }
+
+
+def test_combat_compresses_large_responses(mock_event: dict) -> None:
+    """
+    Test that combat results with history are gzipped for clients that accept
+    it, and decode to the same results
+
+    :param mock_event: Mock AWS lambda event dict
+    """
+    # Arrange
+    mock_event["body"]["include_history"] = True
+    mock_event["body"]["Player1"]["history"] = ["Truckthunders wins."] * 100
+    plain_event = copy.deepcopy(mock_event)
+    mock_event["headers"] = {"Accept-Encoding": "gzip, deflate"}
+
+    # Act
+    plain_result = do_combat(plain_event, {})
+    gzip_result = do_combat(mock_event, {})
+
+    # Assert
+    assert gzip_result["isBase64Encoded"] is True
+    assert gzip_result["headers"]["Content-Encoding"] == "gzip"
+    decompressed = gzip.decompress(base64.b64decode(gzip_result["body"]))
+    assert json.loads(decompressed) == json.loads(plain_result["body"])
+    assert len(gzip_result["body"]) < len(plain_result["body"])
+
+
+def test_combat_retries_are_not_played_twice(mock_event: dict, mocker) -> None:
+    """
+    Test that retrying a turn with the same Idempotency-Key gets the first
+    turn's results back instead of playing the turn again
+
+    :param mock_event: Mock AWS lambda event dict
+    :param mocker: Pytest mock fixture
+    """
+    # Arrange
+    resolve_turn = mocker.spy(handler, "resolve_turn")
+    mock_event["headers"] = {"Idempotency-Key": "retried-turn"}
+
+    # Act
+    first_result = do_combat(copy.deepcopy(mock_event), {})
+    retried_result = do_combat(copy.deepcopy(mock_event), {})
+
+    # Assert
+    assert retried_result == first_result
+    assert resolve_turn.call_count == 1
+
+
+def test_combat_warm_up() -> None:
+    """
+    Test that a warm-up ping plays practice turns instead of a real one
+    """
+    # Act
+    result = do_combat({"source": "serverless-plugin-warmup"}, {})
+
+    # Assert
+    body = json.loads(result["body"])
+    assert result["statusCode"] == 200
+    assert body["primed"] == {
+        "abilities": len(handler.ABILITIES),
+        "practice_turns": 5,
+        "idempotency_table": False,
+    }
@@ -0,0 +1,538 @@
+import json
+import random
+from collections import Counter
+import pytest
+from pathlib import Path
+
+from fuzzywuzzy import fuzz, process
+
+from worlds_worst_serverless.worlds_worst_mapper import aliases, fuzzy, mapper
+from worlds_worst_serverless.worlds_worst_mapper.command_parser import parse_command
+from worlds_worst_serverless.worlds_worst_mapper.guidelines import (
+    ACTIONS_MAP,
+    VOCABULARY,
+)
+from worlds_worst_serverless.worlds_worst_mapper.match_index import MatchIndex
+
+SERVERLESS_DIR = Path(__file__).resolve().parents[1] / "worlds_worst_serverless"
+
+
+@pytest.fixture
+def ability_names() -> list:
+    """
+    Fixture to provide a bigger vocabulary: every ability name in abilities.json
+
+    :return: List of ability names
+    """
+    path_to_file = SERVERLESS_DIR / "worlds_worst_combat" / "abilities.json"
+    with path_to_file.open() as json_file:
+        abilities = json.load(json_file)
+
+    return [ability["name"] for ability in abilities]
+
+
+def make_queries(vocabulary: list, seed: int = 0) -> list:
+    """
+    Build queries that hit every path of the index: exact, misspelled,
+    reordered, padded and unrelated text
+
+    :param vocabulary: Words to build queries from
+    :param seed: Random seed
+    :return: List of queries
+    """
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz "
+    queries = ["", "!!!", "please do a thing", "zzzzzzzzzzzzzzzzzzzzzzzz"]
+    for word in vocabulary:
+        queries.append(word)
+        queries.append(word.upper() + "!")
+        queries.append(" ".join(reversed(word.split())))
+        queries.append(f"use {word} now")
+        for _ in range(4):
+            chars = list(word)
+            position = rng.randrange(len(chars))
+            edit = rng.choice(["delete", "insert", "replace"])
+            if edit == "delete":
+                del chars[position]
+            elif edit == "insert":
+                chars.insert(position, rng.choice(letters))
+            else:
+                chars[position] = rng.choice(letters)
+            queries.append("".join(chars))
+    return queries
+
+
+def test_index_matches_extract_one(ability_names: list) -> None:
+    """
+    Test that the index returns the same match and score as extractOne
+
+    :param ability_names: Ability names from abilities.json
+    """
+    for vocabulary in (list(ACTIONS_MAP), list(ACTIONS_MAP) + ability_names):
+        # Arrange
+        index = MatchIndex(vocabulary)
+
+        for query in make_queries(vocabulary):
+            # Act
+            matched = index.match(query)
+
+            # Assert
+            assert matched == process.extractOne(query, vocabulary), query
+
+
+def test_vocabulary_index_matches_extract_one_on_typos() -> None:
+    """
+    Test that every single-typo verb matches what extract_one finds over the
+    whole VOCABULARY, which the index scores in full
+    """
+    # Arrange
+    index = MatchIndex(VOCABULARY)
+    queries = {"boclk", "tthac"}
+    for word in VOCABULARY:
+        word = word.lower()
+        for i in range(len(word)):
+            queries.add(word[:i] + word[i + 1 :])
+            queries.add(word[:i] + "x" + word[i + 1 :])
+            queries.add(word[:i] + word[i + 1 : i + 2] + word[i] + word[i + 2 :])
+
+    for query in sorted(queries):
+        # Act
+        matched = index.match(query)
+
+        # Assert
+        assert matched == fuzzy.extract_one(query, VOCABULARY), query
+
+
+def test_index_finds_near_exact_matches_in_large_vocabulary() -> None:
+    """
+    Test that near-exact matches are exact even when most choices don't get
+    scored
+    """
+    # Arrange
+    rng = random.Random(0)
+    vocabulary = list(VOCABULARY) + [
+        " ".join(
+            "".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(3, 8)))
+            for _ in range(rng.randint(2, 4))
+        )
+        for _ in range(1000)
+    ]
+    index = MatchIndex(vocabulary, max_candidates=8)
+    queries = [
+        query for query in make_queries(rng.sample(vocabulary, 30)) if len(query) >= 11
+    ]
+
+    for query in queries:
+        # Act
+        matched = index.match(query)
+
+        # Assert
+        expected = fuzzy.extract_one(query, vocabulary)
+        if expected[1] >= 96:
+            assert matched == expected, query
+
+
+def test_abilities_match_combat() -> None:
+    """
+    Test that the mapper's copy of abilities.json matches the combat service's
+    """
+    # Arrange
+    combat_abilities = SERVERLESS_DIR / "worlds_worst_combat" / "abilities.json"
+    mapper_abilities = SERVERLESS_DIR / "worlds_worst_mapper" / "abilities.json"
+
+    # Assert
+    assert mapper_abilities.read_bytes() == combat_abilities.read_bytes()
+
+
+def test_scores_match_fuzzywuzzy(ability_names: list) -> None:
+    """
+    Test that the standard-library scorers give fuzzywuzzy's scores
+
+    :param ability_names: Ability names from abilities.json
+    """
+    # Arrange
+    vocabulary = list(ACTIONS_MAP) + ability_names
+    pairs = [
+        (fuzzy.process_query(query), fuzzy.process_choice(choice))
+        for query in make_queries(vocabulary)[::7]
+        for choice in vocabulary
+    ]
+
+    for p1, p2 in pairs:
+        # Act
+        scores = [
+            fuzzy.ratio(p1, p2),
+            fuzzy.partial_ratio(p1, p2),
+            fuzzy.token_sort_ratio(p1, p2),
+            fuzzy.token_set_ratio(p1, p2, partial=True),
+            fuzzy.weighted_ratio(p1, p2),
+        ]
+
+        # Assert
+        assert scores == [
+            fuzz.ratio(p1, p2),
+            fuzz.partial_ratio(p1, p2),
+            fuzz.token_sort_ratio(p1, p2, full_process=False),
+            fuzz.partial_token_set_ratio(p1, p2, full_process=False),
+            fuzz.WRatio(p1, p2, full_process=False),
+        ], (p1, p2)
+
+
+def test_extract_one_matches_fuzzywuzzy(ability_names: list) -> None:
+    """
+    Test that extract_one picks the same match as extractOne
+
+    :param ability_names: Ability names from abilities.json
+    """
+    # Arrange
+    vocabulary = list(ACTIONS_MAP) + ability_names
+
+    for query in make_queries(vocabulary, seed=1):
+        # Act
+        matched = fuzzy.extract_one(query, vocabulary)
+
+        # Assert
+        assert matched == process.extractOne(query, vocabulary), query
+
+
+def test_index_caches_queries() -> None:
+    """
+    Test that repeated queries are answered from the cache
+    """
+    # Arrange
+    index = MatchIndex(ACTIONS_MAP)
+
+    # Act
+    first = index.match("attac")
+    second = index.match("attac")
+
+    # Assert
+    assert first == second == ("attack", 91)
+    assert index.cache_info().hits == 1
+
+
+@pytest.mark.parametrize(
+    "action,expected_function",
+    [
+        ("attac", "do_combat"),
+        ("Block!", "do_combat"),
+        ("chnage class", "change_class"),
+        ("change my character", "change_class"),
+        ("micro black hole", "do_combat"),
+    ],
+)
+def test_get_matching_action(action: str, expected_function: str) -> None:
+    """
+    Test that free text is mapped to the right function
+
+    :param action: Text the player typed
+    :param expected_function: Function the mapper should route to
+    """
+    # Arrange
+    event = {"body": json.dumps({"action": action})}
+
+    # Act
+    result = mapper.get_matching_action(event, {})
+
+    # Assert
+    assert result["statusCode"] == 200
+    assert result["body"] == expected_function
+
+
+def test_mapper_warm_up(mocker) -> None:
+    """
+    Test that a warm-up ping runs the parser without being observed as a
+    player's command
+
+    :param mocker: Pytest mock fixture
+    """
+    # Arrange
+    observe = mocker.patch.object(mapper, "observe")
+
+    # Act
+    result = mapper.get_matching_action({"source": "aws.events"}, {})
+
+    # Assert
+    assert result["statusCode"] == 200
+    assert json.loads(result["body"])["primed"]["parsed"] == "do_combat"
+    assert observe.call_count == 0
+
+
+def test_get_matching_actions() -> None:
+    """
+    Test that a batch is matched in order, matching each distinct action once
+    """
+    # Arrange
+    actions = ["attac", "chnage class", "attac", "Blocking Wall!"]
+    event = {"body": json.dumps({"actions": actions})}
+    mapper.VOCABULARY_INDEX.match.cache_clear()
+
+    # Act
+    result = mapper.get_matching_actions(event, {})
+
+    # Assert
+    assert result["statusCode"] == 200
+    assert json.loads(result["body"]) == [
+        {
+            "action": "attac",
+            "matched": "attack",
+            "score": 91,
+            "canonical": "attack",
+            "function": "do_combat",
+        },
+        {
+            "action": "chnage class",
+            "matched": "change class",
+            "score": 92,
+            "canonical": "change class",
+            "function": "change_class",
+        },
+        {
+            "action": "attac",
+            "matched": "attack",
+            "score": 91,
+            "canonical": "attack",
+            "function": "do_combat",
+        },
+        {
+            "action": "Blocking Wall!",
+            "matched": "Blocking Wall",
+            "score": 100,
+            "canonical": "block",
+            "function": "do_combat",
+        },
+    ]
+    assert mapper.VOCABULARY_INDEX.cache_info().misses == 3
+    assert mapper.VOCABULARY_INDEX.cache_info().hits == 0
+
+
+@pytest.mark.parametrize(
+    "body",
+    [{}, {"actions": "attack"}, {"actions": ["attack", 3]}, {"actions": ["a"] * 1001}],
+)
+def test_get_matching_actions_rejects_bad_batches(body: dict) -> None:
+    """
+    Test that malformed or oversized batches are rejected
+
+    :param body: Request body
+    """
+    # Arrange
+    event = {"body": json.dumps(body)}
+
+    # Act
+    result = mapper.get_matching_actions(event, {})
+
+    # Assert
+    assert result["statusCode"] == 400
+    assert "Error" in json.loads(result["body"])
+
+
+@pytest.mark.parametrize(
+    "action,expected",
+    [
+        (
+            "enhanced attack on bob",
+            {
+                "action": "attack",
+                "matched": "attack",
+                "score": 100,
+                "enhanced": True,
+                "target": "bob",
+            },
+        ),
+        (
+            "Enhnced atack at Bob!",
+            {
+                "action": "attack",
+                "matched": "attack",
+                "score": 91,
+                "enhanced": True,
+                "target": "Bob",
+            },
+        ),
+        (
+            "block against Dark Lord",
+            {
+                "action": "block",
+                "matched": "block",
+                "score": 100,
+                "enhanced": False,
+                "target": "Dark Lord",
+            },
+        ),
+        (
+            "change my class",
+            {
+                "action": "change class",
+                "matched": "change class",
+                "score": 95,
+                "enhanced": False,
+                "target": None,
+            },
+        ),
+        (
+            "class",
+            {
+                "action": "change class",
+                "matched": "change class",
+                "score": 90,
+                "enhanced": False,
+                "target": None,
+            },
+        ),
+        (
+            "enhanced micro black hole on bob",
+            {
+                "action": "attack",
+                "matched": "Micro Black Hole",
+                "score": 100,
+                "enhanced": True,
+                "target": "bob",
+            },
+        ),
+        (
+            "warp spce",
+            {
+                "action": "dodge",
+                "matched": "Warp Space",
+                "score": 95,
+                "enhanced": False,
+                "target": None,
+            },
+        ),
+    ],
+)
+def test_parse_command(action: str, expected: dict) -> None:
+    """
+    Test that free text is parsed into a complete command
+
+    :param action: Text the player typed
+    :param expected: Expected parsed command, without the function
+    """
+    # Act
+    command = parse_command(action)
+
+    # Assert
+    assert command == {"function": ACTIONS_MAP[expected["action"]], **expected}
+
+
+@pytest.mark.parametrize("action", ["xyzzy", "hello there", "on bob"])
+def test_parse_command_without_an_action(action: str) -> None:
+    """
+    Test that text that isn't close to any action isn't taken for the nearest
+    one
+
+    :param action: Text the player typed
+    """
+    # Act
+    command = parse_command(action)
+
+    # Assert
+    assert command["function"] is None
+    assert command["action"] is None
+    assert command["score"] is None
+
+
+def test_parse_action() -> None:
+    """
+    Test the parse handler, including text with no action in it
+    """
+    # Arrange
+    good_event = {"body": json.dumps({"action": "enhanced dodge on alice"})}
+    bad_event = {"body": json.dumps({"action": "enhanced"})}
+
+    # Act
+    good_result = mapper.parse_action(good_event, {})
+    bad_result = mapper.parse_action(bad_event, {})
+
+    # Assert
+    assert good_result["statusCode"] == 200
+    assert json.loads(good_result["body"]) == {
+        "function": "do_combat",
+        "action": "dodge",
+        "matched": "dodge",
+        "score": 100,
+        "enhanced": True,
+        "target": "alice",
+    }
+    assert bad_result["statusCode"] == 400
+
+
+def test_observe_logs_fuzzy_matches(capsys) -> None:
+    """
+    Test that inputs needing a fuzzy match are logged, normalized, and exact
+    hits are not
+    """
+    # Act
+    aliases.observe("Attac!", "attack", 91, count=3)
+    aliases.observe("attack", "attack", 100)
+
+    # Assert
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1
+    assert aliases.read_observations(["INFO " + lines[0], "START RequestId"]) == {
+        "attac": 3
+    }
+
+
+def test_compact_promotes_frequent_inputs() -> None:
+    """
+    Test that compaction keeps the most frequent inputs up to the cap, decays
+    earlier counts and leaves out rare inputs and exact hits
+    """
+    # Arrange
+    index = MatchIndex(VOCABULARY)
+    observations = Counter({"attac": 10, "blok": 8, "dodg": 6, "disrup": 2, "area": 50})
+    promoted = {"chnage class": {"matched": "change class", "score": 92, "count": 14}}
+
+    # Act
+    table = aliases.compact(
+        observations, promoted, index, max_aliases=3, min_count=5, decay=0.5
+    )
+
+    # Assert
+    assert table == {
+        "attac": {"matched": "attack", "score": 91, "count": 10},
+        "blok": {"matched": "block", "score": 89, "count": 8},
+        "chnage class": {"matched": "change class", "score": 92, "count": 7},
+    }
+
+
+def test_index_resolves_promoted_aliases(tmp_path: Path) -> None:
+    """
+    Test that promoted aliases are returned without scoring, and aliases of
+    choices that no longer exist are dropped
+    """
+    # Arrange
+    path_to_file = tmp_path / "promoted_aliases.json"
+    path_to_file.write_text(
+        json.dumps(
+            {
+                "attac": {"matched": "attack", "score": 91, "count": 10},
+                "fireball": {"matched": "Fireball", "score": 90, "count": 9},
+            }
+        )
+    )
+    index = MatchIndex(VOCABULARY, aliases=aliases.load_promoted_aliases(path_to_file))
+
+    # Act
+    matched = index.match("Attac!")
+
+    # Assert
+    assert matched == ("attack", 91)
+    assert index._aliases == {"attac": ("attack", 91)}
+    assert aliases.load_promoted_aliases(tmp_path / "missing.json") == {}
+
+
+def test_promoted_aliases_match_index() -> None:
+    """
+    Test that the shipped alias table gives the same results as matching
+    """
+    # Arrange
+    index = MatchIndex(VOCABULARY)
+
+    for alias, entry in aliases.load_promoted_aliases(
+        aliases.PROMOTED_ALIASES_FILE
+    ).items():
+        # Assert
+        assert index.match(alias) == entry, alias
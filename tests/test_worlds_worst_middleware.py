@@ -0,0 +1,413 @@
+import base64
+import gzip
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+from worlds_worst_serverless.worlds_worst_combat.player_data import Player
+from worlds_worst_serverless.worlds_worst_middleware import compression
+from worlds_worst_serverless.worlds_worst_middleware.idempotency import (
+    IdempotencyStore,
+    fingerprint,
+)
+from worlds_worst_serverless.worlds_worst_middleware.middleware import (
+    HTTPError,
+    Schema,
+    SchemaError,
+    lambda_handler,
+)
+
+PLAYER_SCHEMA = Schema.from_dataclass(Player)
+
+
+@pytest.fixture
+def player() -> dict:
+    return {
+        "name": "Truckthunders",
+        "character_class": "dreamer",
+        "max_hit_points": 500,
+        "max_ex": 1000,
+        "hit_points": 500,
+        "ex": 0,
+        "status_effects": [],
+        "action": "attack",
+        "enhanced": False,
+    }
+
+
+def gateway_event(body: str) -> dict:
+    return {"body": body, "requestContext": {"requestId": "request-1"}}
+
+
+@lambda_handler(schema=Schema({"Player": PLAYER_SCHEMA}))
+def echo(request_body: dict, event: dict, context: dict) -> dict:
+    if request_body["Player"]["name"] == "teapot":
+        raise HTTPError(418, "I'm a teapot")
+    return request_body
+
+
+def test_player_schema_accepts_players(player: dict) -> None:
+    """
+    Test that the schema made from Player accepts players with and without the
+    fields that have defaults
+
+    :param player: Player dict without the defaulted fields
+    """
+    # Arrange
+    full_player = dict(player, auth_token="", context="home", target="", history=[])
+
+    # Act
+    PLAYER_SCHEMA.validate(player)
+    PLAYER_SCHEMA.validate(full_player)
+
+    # Assert
+    assert PLAYER_SCHEMA.required == {
+        "name",
+        "character_class",
+        "max_hit_points",
+        "max_ex",
+        "hit_points",
+        "ex",
+        "status_effects",
+        "action",
+        "enhanced",
+    }
+
+
+@pytest.mark.parametrize(
+    "change,error",
+    [
+        ({"hit_points": "500"}, "body.hit_points must be an integer"),
+        ({"hit_points": True}, "body.hit_points must be an integer"),
+        ({"enhanced": 0}, "body.enhanced must be a boolean"),
+        ({"status_effects": None}, "body.status_effects must be an array"),
+        ({"nickname": "Truck"}, "body has unexpected key nickname"),
+        ({"name": None}, "body.name must be a string"),
+    ],
+)
+def test_player_schema_rejects_bad_players(
+    player: dict, change: dict, error: str
+) -> None:
+    """
+    Test that wrong types and unknown keys are rejected with a readable error
+
+    :param player: Valid player dict
+    :param change: What to break in it
+    :param error: Expected error message
+    """
+    # Arrange
+    player.update(change)
+
+    # Act
+    with pytest.raises(SchemaError) as raised:
+        PLAYER_SCHEMA.validate(player)
+
+    # Assert
+    assert raised.value.status_code == 400
+    assert raised.value.error == error
+
+
+def test_handler_encodes_body(player: dict) -> None:
+    """
+    Test that a handler's returned body is sent back as JSON with the
+    precomputed headers
+
+    :param player: Valid player dict
+    """
+    # Arrange
+    event = gateway_event(json.dumps({"Player": player}))
+
+    # Act
+    first = echo(event, {})
+    second = echo(event, {})
+
+    # Assert
+    assert first["statusCode"] == 200
+    assert json.loads(first["body"]) == {"Player": player}
+    assert first["headers"] == {
+        "Access-Control-Allow-Origin": "*",
+        "Content-Type": "application/json",
+    }
+    assert first["headers"] is second["headers"]
+
+
+@pytest.mark.parametrize(
+    "body,status_code,error",
+    [
+        ("{not json", 400, "Malformed request body"),
+        ("[]", 400, "body must be an object"),
+        ('{"Player": {"name": "bob"}}', 400, "body.Player is missing"),
+        (None, 400, "body must be an object"),
+    ],
+)
+def test_handler_rejects_bad_requests(body: str, status_code: int, error: str) -> None:
+    """
+    Test that requests that can't be decoded or don't match the schema get a
+    400 without running the handler
+
+    :param body: Raw request body
+    :param status_code: Expected status
+    :param error: Start of the expected error message
+    """
+    # Act
+    result = echo(gateway_event(body), {})
+
+    # Assert
+    assert result["statusCode"] == status_code
+    assert json.loads(result["body"])["Error"].startswith(error)
+
+
+def test_handler_maps_http_errors(player: dict) -> None:
+    """
+    Test that an HTTPError raised by the handler becomes its status
+
+    :param player: Valid player dict
+    """
+    # Arrange
+    player["name"] = "teapot"
+
+    # Act
+    result = echo(gateway_event(json.dumps({"Player": player})), {})
+
+    # Assert
+    assert result["statusCode"] == 418
+    assert json.loads(result["body"]) == {"Error": "I'm a teapot"}
+
+
+def test_invoke_api_calls_are_validated(player: dict) -> None:
+    """
+    Test that events from the Lambda Invoke API, which have no requestContext,
+    are validated like requests from API Gateway, since anyone can send an
+    event of that shape
+
+    :param player: Valid player dict
+    """
+    # Arrange
+    player["nickname"] = "Truck"
+    event = {"body": {"Player": player}}
+
+    # Act
+    invoked = echo(event, {})
+    requested = echo(gateway_event(json.dumps(event["body"])), {})
+
+    # Assert
+    assert invoked["statusCode"] == 400
+    assert requested["statusCode"] == 400
+
+
+@pytest.mark.parametrize(
+    "accept_encoding,expected",
+    [
+        ("", None),
+        ("gzip", "gzip"),
+        ("gzip;q=0", None),
+        ("deflate, gzip;q=0.5", "gzip"),
+        ("*", compression.ENCODINGS[0]),
+        ("identity", None),
+    ],
+)
+def test_choose_encoding(accept_encoding: str, expected: str) -> None:
+    """
+    Test Accept-Encoding negotiation, with q-values
+
+    :param accept_encoding: The client's Accept-Encoding header
+    :param expected: Encoding to compress with
+    """
+    # Act
+    encoding = compression.choose_encoding(accept_encoding)
+
+    # Assert
+    assert encoding == expected
+
+
+def test_compress_response() -> None:
+    """
+    Test that large bodies are gzipped and base64-encoded for clients that
+    accept gzip, and everything else is left alone
+    """
+    # Arrange
+    body = json.dumps({"message": ["Truckthunders uses attack!"] * 100})
+    response = {"statusCode": 200, "body": body, "headers": {"A": "b"}}
+    event = {"headers": {"Accept-Encoding": "gzip"}}
+
+    # Act
+    compressed = compression.compress_response(event, response)
+    again = compression.compress_response(event, response)
+    small = compression.compress_response(event, dict(response, body="{}"))
+    not_accepted = compression.compress_response({"headers": {}}, response)
+
+    # Assert
+    assert compressed["isBase64Encoded"] is True
+    assert compressed["headers"] == {
+        "A": "b",
+        "Content-Encoding": "gzip",
+        "Vary": "Accept-Encoding",
+    }
+    assert gzip.decompress(base64.b64decode(compressed["body"])) == body.encode()
+    assert again == compressed
+    assert small["body"] == "{}"
+    assert not_accepted is response
+
+
+def idempotent_handler(store: IdempotencyStore, calls: list):
+    @lambda_handler(idempotency=store)
+    def count(request_body: dict, event: dict, context: dict) -> dict:
+        calls.append(request_body)
+        if request_body.get("fail"):
+            raise HTTPError(400, "Failed")
+        return {"calls": len(calls)}
+
+    return count
+
+
+def test_idempotency_replays_responses() -> None:
+    """
+    Test that a retry with the same Idempotency-Key gets the first response
+    without running the handler, and a different request can't reuse the key
+    """
+    # Arrange
+    calls = []
+    handler = idempotent_handler(IdempotencyStore(table_name=None), calls)
+    event = {"headers": {"Idempotency-Key": "turn-1"}, "body": {"turn": 1}}
+    other_request = {"headers": {"Idempotency-Key": "turn-1"}, "body": {"turn": 2}}
+
+    # Act
+    first = handler(event, {})
+    retry = handler(event, {})
+    reused = handler(other_request, {})
+    unkeyed = handler({"body": {"turn": 1}}, {})
+
+    # Assert
+    assert retry == first
+    assert json.loads(first["body"]) == {"calls": 1}
+    assert reused["statusCode"] == 422
+    assert json.loads(unkeyed["body"]) == {"calls": 2}
+    assert len(calls) == 2
+
+
+def test_idempotency_releases_failed_requests() -> None:
+    """
+    Test that a request that failed runs again when retried
+    """
+    # Arrange
+    calls = []
+    handler = idempotent_handler(IdempotencyStore(table_name=None), calls)
+    event = {"headers": {"Idempotency-Key": "turn-1"}, "body": {"fail": True}}
+
+    # Act
+    first = handler(event, {})
+    retry = handler(event, {})
+
+    # Assert
+    assert first["statusCode"] == retry["statusCode"] == 400
+    assert len(calls) == 2
+
+
+def test_idempotency_table(mocker) -> None:
+    """
+    Test that a key claimed in the table by another container is answered
+    with the response stored there, or a 409 while it is still running
+
+    :param mocker: Pytest mock fixture
+    """
+    # Arrange
+    body = {"turn": 1}
+    response = {"statusCode": 200, "body": '{"calls": 1}', "headers": {}}
+    claimed = ClientError(
+        {"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem"
+    )
+    item = {
+        "requestId": "turn-1",
+        "fingerprint": fingerprint(body),
+        "state": "in_progress",
+        "expires_at": 2000000000,
+    }
+    table = mocker.MagicMock()
+    table.put_item.side_effect = claimed
+    table.get_item.return_value = {"Item": item}
+    calls = []
+    handler = idempotent_handler(IdempotencyStore(table_name="Idempotency"), calls)
+    mocker.patch.object(IdempotencyStore, "table", table)
+    event = {"headers": {"Idempotency-Key": "turn-1"}, "body": body}
+
+    # Act
+    running = handler(event, {})
+    item.update(state="completed", response=json.dumps(response))
+    completed = handler(event, {})
+    cached = handler(event, {})
+
+    # Assert
+    assert running["statusCode"] == 409
+    assert completed == cached == response
+    assert table.get_item.call_count == 2
+    assert calls == []
+
+
+def test_idempotency_leases_expire(mocker) -> None:
+    """
+    Test that a claim whose request never finished, as when it timed out, is
+    taken over once its lease runs out, and only an answered key is kept for
+    the full TTL
+
+    :param mocker: Pytest mock fixture
+    """
+    # Arrange
+    now = [1000.0]
+    table = mocker.MagicMock()
+    store = IdempotencyStore(
+        table_name="Idempotency", ttl=3600, lease=30, clock=lambda: now[0]
+    )
+    mocker.patch.object(IdempotencyStore, "table", table)
+    calls = []
+    handler = idempotent_handler(store, calls)
+    event = {"headers": {"Idempotency-Key": "turn-1"}, "body": {"turn": 1}}
+
+    # Act
+    store.begin("turn-1", fingerprint({"turn": 1}))
+    running = handler(event, {})
+    now[0] += 31
+    retried = handler(event, {})
+
+    # Assert
+    assert running["statusCode"] == 409
+    assert json.loads(retried["body"]) == {"calls": 1}
+    claim = table.put_item.call_args[1]
+    assert claim["Item"]["lease_expires_at"] == claim["Item"]["expires_at"] == 1061
+    assert "lease_expires_at < :now" in claim["ConditionExpression"]
+    completed = table.update_item.call_args[1]
+    assert completed["ExpressionAttributeValues"][":expires_at"] == 1031 + 3600
+
+
+@pytest.mark.parametrize(
+    "event",
+    [
+        {"source": "serverless-plugin-warmup"},
+        {"source": "aws.events", "detail-type": "Scheduled Event"},
+    ],
+)
+def test_warm_up_pings_short_circuit(event: dict) -> None:
+    """
+    Test that a warm-up ping runs the warm-up instead of the handler, and
+    reports what it built and how long it took
+
+    :param event: Warm-up event
+    """
+    # Arrange
+    calls = []
+
+    @lambda_handler(schema=Schema({"action": str}), warm_up=lambda: {"index": 3})
+    def handler(request_body: dict, event: dict, context: dict) -> str:
+        calls.append(request_body)
+        return "done"
+
+    # Act
+    result = handler(event, {})
+
+    # Assert
+    body = json.loads(result["body"])
+    assert result["statusCode"] == 200
+    assert body["warmed_up"] == "handler"
+    assert body["primed"] == {"index": 3}
+    assert body["elapsed_ms"] >= 0
+    assert calls == []
@@ -4,11 +4,13 @@ the actual worlds_worst_combat serverless arn/endpoint
 """
 
 import boto3
+import copy
 import decimal
 import json
 import pytest
 import uuid
 from dataclasses import dataclass, asdict
+from typing import Callable
 
 from unittest import mock
 from pytest_dynamodb import factories
@@ -16,6 +18,8 @@ from pytest_dynamodb import factories
 from worlds_worst_serverless.worlds_worst_operator import operator
 from worlds_worst_serverless.worlds_worst_operator import database_ops
 from worlds_worst_serverless.worlds_worst_operator import actions
+from worlds_worst_serverless.worlds_worst_operator import moves
+from worlds_worst_serverless.worlds_worst_combat.handler import player_payload
 
 my_dynamodb_proc = factories.dynamodb_proc(
     dynamodb_dir="/Users/nmathes/dynamodb_local", port=8002, delay=False
@@ -53,6 +57,8 @@ class Player:
     status_effects: list
     action: str
     enhanced: bool
+    # Actions load the player's target, the target put into dynamodb_config
+    target: str = "target_hash"
 
 
 @pytest.fixture
@@ -82,12 +88,30 @@ def mock_event(player: dict) -> dict:
         "body": {
             "Player": player,
             "playerId": "player_hash",
+            "auth_token": "player_auth",
             "action": "attack",
             "enhanced": False,
         }
     }
 
 
+@pytest.fixture(autouse=True)
+def auth_tokens(mocker: mock, monkeypatch) -> mock.MagicMock:
+    """
+    Fixture to resolve the auth tokens of the test players without a token table
+
+    :param mocker: Pytest mock fixture
+    :param monkeypatch: Pytest monkeypatch fixture
+    :return: The mock resolve_token
+    """
+    monkeypatch.setenv("TOKEN_TABLE", "Tokens")
+    tokens = {"player_auth": "player_hash", "target_auth": "target_hash"}
+    return mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.operator.resolve_token",
+        side_effect=lambda table, auth_token: tokens.get(auth_token),
+    )
+
+
 @pytest.fixture
 def dynamodb_config(dynamodb: boto3.resource, player: dict) -> boto3.resource:
     """
@@ -210,8 +234,9 @@ def test_change_class(player: dict, dynamodb_config: boto3.resource) -> None:
     :param dynamodb_config: boto3 resource with our tables
     """
     # Arrange
+    # Without a class named, the next one in abilities.json
     expected_message = [
-        "Changing class from dreamer to hacker.",
+        "Changing class from dreamer to chosen.",
         "Resetting HP, EX and status for player and target.",
     ]
     # Act
@@ -226,7 +251,7 @@ def test_change_class(player: dict, dynamodb_config: boto3.resource) -> None:
     # Assert
     assert Player(**player) == returned_player
     assert player_updates == {
-        "character_class": "hacker",
+        "character_class": "chosen",
         "hit_points": player["max_hit_points"],
         "ex": 0,
         "status_effects": [],
@@ -282,21 +307,18 @@ def test_change_class_db(player: dict, dynamodb_config: boto3.resource) -> None:
     assert updated_player_from_db["player_data"]["ex"] == 0
 
 
-def test_do_combat(mocker: mock, player: dict, dynamodb_config: boto3.resource) -> None:
+def test_do_combat(player: dict) -> None:
     """
-    Test that a good combat request gets properly sent to our lambda function
+    Test that a turn of combat is played against the target's own action
+
+    do_combat used to pick a random action for the target. The target now uses
+    the last action they chose, as players move for themselves.
 
-    :param mocker: Pytest mock fixture
     :param player: Input character dictionary
-    :param dynamodb_config: boto3 resource with our tables
     """
     # Arrange
-    mocker.patch(
-        "worlds_worst_serverless.worlds_worst_operator.actions.random.choice",
-        return_value="attack",
-    )
-
-    input_player = Player(**player)
+    input_player = actions.to_player(player)
+    target = actions.to_player(dict(player))
     expected_player_updates = {"hit_points": 400, "ex": 150}
     expected_target_updates = expected_player_updates
     expected_message = [
@@ -307,69 +329,57 @@ def test_do_combat(mocker: mock, player: dict, dynamodb_config: boto3.resource)
     ]
 
     # Act
-    updated_player, updated_target, player_updates, target_updates, message = operator.do_combat(
-        player=input_player, table=dynamodb_config
+    updated_player, updated_target, player_updates, target_updates, message = (
+        operator.do_combat(player=input_player, target=target)
     )
 
     # Assert
-    assert input_player != updated_player
+    assert updated_player.hit_points == updated_target.hit_points == 400
     assert player_updates == expected_player_updates
     assert target_updates == expected_target_updates
     assert message == expected_message
 
 
 def test_route_tasks_and_response(
-    mocker: mock, mock_event: dict, player: dict, dynamodb_config: boto3.resource
+    mocker: mock, monkeypatch, player: dict, stored_players: dict
 ) -> None:
     """
     Test that a combat action proceeds correctly and returns the right response
 
     :param mocker: Pytest mock fixture
-    :param mock_event: Mock AWS lambda event dict
+    :param monkeypatch: Pytest monkeypatch fixture
     :param player: Input character dictionary
-    :param dynamodb_config: boto3 config with our resource
+    :param stored_players: Stored player items
     """
     # Arrange
     # Mock all the things we already tested
+    monkeypatch.setenv("DYNAMODB_TABLE", "Table")
     mocker.patch(
-        "worlds_worst_serverless.worlds_worst_operator.actions.random.choice",
-        return_value="block",
-    )
-    mocker.patch(
-        "worlds_worst_serverless.worlds_worst_operator.operator.boto3.resource",
-        return_value=dynamodb_config,
+        "worlds_worst_serverless.worlds_worst_operator.operator.batch_load_players",
+        return_value=stored_players,
     )
     mocker.patch(
-        "worlds_worst_serverless.worlds_worst_operator.operator.os.environ",
-        return_value="Table",
-    )
-    mocker.patch(
-        "worlds_worst_serverless.worlds_worst_operator.actions.get_player",
-        return_value={"player_data": player},
-    )
-    mocker.patch(
-        "worlds_worst_serverless.worlds_worst_operator.database_ops.get_player",
-        return_value={"player_data": player},
-    )
-    mocker.patch(
-        "worlds_worst_serverless.worlds_worst_operator.operator.update_player",
+        "worlds_worst_serverless.worlds_worst_operator.operator"
+        ".transact_update_players",
         return_value={},
     )
 
-    # Expect player to get hit for 100 damage and get 100 ex
-    expected_player = Player(**player)
+    # Expect the target to block the attack, hitting the player for 100 damage
+    # and giving them 100 ex
+    expected_player = actions.to_player(player)
     expected_player.hit_points = 400
     expected_player.ex = 100
+    expected_player.target = "target_hash"
 
     expected_message = [
         "Truckthunders uses attack!",
-        "Truckthunders uses block!",
-        "Truckthunders wins.",
-        "Truckthunders has 500 HP left.",
+        "Crunchbucket uses block!",
+        "Crunchbucket wins.",
+        "Crunchbucket has 500 HP left.",
     ]
 
     expected_action_results = json.dumps(
-        {"Player": asdict(expected_player), "message": expected_message}
+        {"Player": player_payload(expected_player), "message": expected_message}
     )
 
     expected_response = {
@@ -379,43 +389,28 @@ def test_route_tasks_and_response(
     }
 
     # Act
-    response = operator.route_tasks_and_response(mock_event, mock_event)
+    response = operator.route_tasks_and_response(
+        turn_event("attack on target_hash"), {}
+    )
 
     # Assert
     assert response == expected_response
 
 
-def test_route_bad_id(
-    mocker: mock, mock_event: dict, dynamodb_config: boto3.resource
-) -> None:
+def test_route_bad_id(mocker: mock, monkeypatch, mock_event: dict) -> None:
     """
     Test that the operator router returns 401 Unauthorized if the player ID is wrong
 
     :param mocker: Pytest mock fixture
+    :param monkeypatch: Pytest monkeypatch fixture
     :param mock_event: Mock AWS lambda event dict
-    :param dynamodb_config: boto3 config with our resource
     """
     # Arrange
     # Mock all the things we already tested
+    monkeypatch.setenv("DYNAMODB_TABLE", "Table")
     mocker.patch(
-        "worlds_worst_serverless.worlds_worst_operator.actions.random.choice",
-        return_value="block",
-    )
-    mocker.patch(
-        "worlds_worst_serverless.worlds_worst_operator.operator.boto3.resource",
-        return_value=dynamodb_config,
-    )
-    mocker.patch(
-        "worlds_worst_serverless.worlds_worst_operator.operator.os.environ",
-        return_value="Table",
-    )
-    mocker.patch(
-        "worlds_worst_serverless.worlds_worst_operator.actions" ".get_player",
-        return_value={"Error": "Queried player does not exist."},
-    )
-    mocker.patch(
-        "worlds_worst_serverless.worlds_worst_operator.database_ops.get_player",
-        return_value={"Error": "Queried player does not exist."},
+        "worlds_worst_serverless.worlds_worst_operator.operator.batch_load_players",
+        return_value={},
     )
     mock_event["body"]["playerId"] = "wrong_key"
 
@@ -433,37 +428,37 @@ def test_route_bad_id(
     assert response == expected_response
 
 
-def test_reset_characters(
-    mock_event: dict, player: dict, dynamodb_config: boto3.resource
-) -> None:
+def test_reset_characters(mocker: mock, stored_players: dict) -> None:
     """
-    Test that a reset request loads the default players and resets the database
+    Test that a reset request restores the players in one transaction
 
-    :param mock_event: Mock AWS lambda event dict
-    :param player: Input character dictionary
-    :param dynamodb_config: boto3 config with our resource
+    :param mocker: Pytest mock fixture
+    :param stored_players: Stored player items
     """
     # Arrange
-    expected_player = Player(**player)
-
-    expected_message = []
-
-    expected_action_results = json.dumps(
-        {"Player": asdict(expected_player), "message": expected_message}
+    mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.operator.batch_load_players",
+        return_value=stored_players,
+    )
+    transact = mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.operator"
+        ".transact_update_players",
+        return_value={},
     )
-
-    expected_response = {
-        "statusCode": 200,
-        "body": expected_action_results,
-        "headers": {"Access-Control-Allow-Origin": "*"},
-    }
 
     # Act
-    response = operator.reset_characters(table=dynamodb_config)
+    response = operator.reset_characters(
+        table=mock.MagicMock(), player_tokens=list(stored_players)
+    )
     response = json.loads(response["body"])
 
     # Assert
-    assert len(response["message"]) == 8
+    assert len(response["message"]) == 2
+    transact.assert_called_once()
+    assert transact.call_args[1]["updates"]["target_hash"] == (
+        {"hit_points": 500, "ex": 0, "status_effects": []},
+        7,
+    )
 
 
 def test_route_action() -> None:
@@ -523,3 +518,580 @@ def test_route_bad_character(mocker: mock, mock_event: dict, player: dict,
     # Assert
     assert response == expected_response
 """
+
+
+@pytest.fixture
+def stored_players(player: dict) -> dict:
+    """
+    Fixture to provide two stored player items, as batch_load_players returns them
+
+    :param player: Input character; see above
+    :return: Dictionary mapping player tokens to items
+    """
+    target = dict(player, name="Crunchbucket", action="block")
+    return {
+        "player_hash": {"player_data": dict(player), "version": 3},
+        "target_hash": {"player_data": target, "version": 7},
+    }
+
+
+def turn_event(action: str) -> dict:
+    """
+    Build an event for the operator
+
+    :param action: Text the player typed
+    :return: Mock event dict
+    """
+    return {"body": json.dumps({"auth_token": "player_auth", "action": action})}
+
+
+def test_turn_reads_and_writes_once(
+    mocker: mock, monkeypatch, stored_players: dict
+) -> None:
+    """
+    Test that a turn loads both players with one read and writes both players
+    and their fight history with one transaction
+
+    :param mocker: Pytest mock fixture
+    :param monkeypatch: Pytest monkeypatch fixture
+    :param stored_players: Stored player items
+    """
+    # Arrange
+    monkeypatch.setenv("DYNAMODB_TABLE", "Table")
+    monkeypatch.setenv("HISTORY_TABLE", "History")
+    monkeypatch.setattr(operator, "HISTORY_RING_SIZE", 5)
+    batch_load = mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.operator.batch_load_players",
+        return_value=stored_players,
+    )
+    transact = mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.operator"
+        ".transact_update_players",
+        return_value={},
+    )
+
+    # Act
+    response = operator.route_tasks_and_response(
+        turn_event("enhanced atack on target_hash"), {}
+    )
+
+    # Assert
+    body = json.loads(response["body"])
+    assert response["statusCode"] == 200
+    assert body["message"][:3] == [
+        "Truckthunders uses attack!",
+        "Crunchbucket uses block!",
+        "Crunchbucket wins.",
+    ]
+    assert body["Player"]["target"] == "target_hash"
+    tokens = batch_load.call_args[1]["player_tokens"]
+    assert tokens == ["player_hash", "target_hash"]
+
+    transact.assert_called_once()
+    updates = transact.call_args[1]["updates"]
+    assert updates["player_hash"][1] == 3
+    assert updates["target_hash"][0]["ex"] == 50
+    assert updates["target_hash"][1] == 7
+    assert updates["player_hash"][0]["target"] == "target_hash"
+    history = transact.call_args[1]["extra_items"]
+    assert [item["Put"]["Item"]["playerId"] for item in history] == [
+        "player_hash",
+        "target_hash",
+    ]
+    assert {item["Put"]["TableName"] for item in history} == {"History"}
+    assert updates["target_hash"][0]["history"] == [history[1]["Put"]["Item"]]
+    assert history[0]["Put"]["Item"]["entry"]["opponent"] == "target_hash"
+    assert [item["Put"]["Item"]["entry"]["action"] for item in history] == [
+        "attack",
+        "block",
+    ]
+
+
+def test_turn_is_played_again_after_a_race(
+    mocker: mock, monkeypatch, stored_players: dict
+) -> None:
+    """
+    Test that a turn whose write lost a race is played again on fresh players
+
+    :param mocker: Pytest mock fixture
+    :param monkeypatch: Pytest monkeypatch fixture
+    :param stored_players: Stored player items
+    """
+    # Arrange
+    monkeypatch.setenv("DYNAMODB_TABLE", "Table")
+    batch_load = mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.operator.batch_load_players",
+        side_effect=lambda **kwargs: copy.deepcopy(stored_players),
+    )
+    transact = mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.operator"
+        ".transact_update_players",
+        side_effect=[database_ops.StaleVersionError("changed"), {}],
+    )
+
+    # Act
+    response = operator.route_tasks_and_response(
+        turn_event("attack on target_hash"), {}
+    )
+
+    # Assert
+    assert response["statusCode"] == 200
+    assert batch_load.call_count == 2
+    assert transact.call_count == 2
+    assert transact.call_args[1]["extra_items"] == []
+
+
+def test_turn_uses_stored_target(
+    mocker: mock, monkeypatch, stored_players: dict
+) -> None:
+    """
+    Test that a command without a target is played against the player's
+    current target, and that change class resets both players
+
+    :param mocker: Pytest mock fixture
+    :param monkeypatch: Pytest monkeypatch fixture
+    :param stored_players: Stored player items
+    """
+    # Arrange
+    monkeypatch.setenv("DYNAMODB_TABLE", "Table")
+    stored_players["player_hash"]["player_data"]["target"] = "target_hash"
+    stored_players["player_hash"]["player_data"]["hit_points"] = 100
+    mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.operator.batch_load_players",
+        return_value={"player_hash": stored_players["player_hash"]},
+    )
+    get_player = mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.operator.get_player",
+        return_value=stored_players["target_hash"],
+    )
+    transact = mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.operator"
+        ".transact_update_players",
+        return_value={},
+    )
+
+    # Act
+    response = operator.route_tasks_and_response(turn_event("change class hacker"), {})
+
+    # Assert
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["message"] == [
+        "Changing class from dreamer to hacker.",
+        "Resetting HP, EX and status for player and target.",
+    ]
+    get_player.assert_called_once_with(table=mock.ANY, player_token="target_hash")
+    assert transact.call_args[1]["updates"] == {
+        "player_hash": ({"character_class": "hacker", "hit_points": 500}, 3)
+    }
+
+
+@pytest.mark.parametrize(
+    "action,stored,expected_status",
+    [
+        ("attack on target_hash", {}, 401),
+        ("attack on nobody", {"player_hash": {"player_data": {}}}, 404),
+        ("attack on player_hash", {"player_hash": {"player_data": {}}}, 400),
+        ("attack", {"player_hash": {"player_data": {"target": ""}}}, 400),
+        ("on bob", {}, 400),
+    ],
+)
+def test_turn_errors(
+    mocker: mock, monkeypatch, action: str, stored: dict, expected_status: int
+) -> None:
+    """
+    Test that missing players, missing targets and commands without an action
+    are rejected before anything is written
+
+    :param mocker: Pytest mock fixture
+    :param monkeypatch: Pytest monkeypatch fixture
+    :param action: Text the player typed
+    :param stored: Player items batch_load_players returns
+    :param expected_status: Expected status code
+    """
+    # Arrange
+    monkeypatch.setenv("DYNAMODB_TABLE", "Table")
+    mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.operator.batch_load_players",
+        return_value=stored,
+    )
+    transact = mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.operator"
+        ".transact_update_players"
+    )
+
+    # Act
+    response = operator.route_tasks_and_response(turn_event(action), {})
+
+    # Assert
+    assert response["statusCode"] == expected_status
+    transact.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "entry_point", [operator.route_tasks_and_response, moves.submit_move]
+)
+@pytest.mark.parametrize(
+    "body",
+    [
+        # A client naming someone else's playerId
+        {"playerId": "target_hash", "action": "attack on player_hash"},
+        {"auth_token": "stolen", "action": "attack on player_hash"},
+        {"auth_token": None, "action": "attack on player_hash"},
+    ],
+)
+def test_turns_need_a_known_auth_token(
+    mocker: mock, monkeypatch, entry_point: Callable, body: dict
+) -> None:
+    """
+    Test that a turn is only played for the player an auth_token belongs to,
+    and requests without a known token are refused before any player is read
+
+    :param mocker: Pytest mock fixture
+    :param monkeypatch: Pytest monkeypatch fixture
+    :param entry_point: Operator handler taking the request
+    :param body: Request body
+    """
+    # Arrange
+    monkeypatch.setenv("DYNAMODB_TABLE", "Table")
+    monkeypatch.setenv("FIGHTS_TABLE", "Fights")
+    loads = [
+        mocker.patch(
+            f"worlds_worst_serverless.worlds_worst_operator.{module}.batch_load_players"
+        )
+        for module in ("operator", "moves")
+    ]
+
+    # Act
+    response = entry_point({"body": json.dumps(body)}, {})
+
+    # Assert
+    assert response["statusCode"] == 401
+    for load in loads:
+        load.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "entry_point", [operator.route_tasks_and_response, moves.submit_move]
+)
+@pytest.mark.parametrize(
+    "event",
+    [
+        {},
+        {"body": "not json"},
+        {"body": json.dumps(["attack"])},
+        {"body": json.dumps({"auth_token": "player_auth"})},
+        {"body": json.dumps({"auth_token": "player_auth", "action": 5})},
+        {
+            "body": json.dumps(
+                {"auth_token": "player_auth", "action": "attack", "enhanced": "yes"}
+            )
+        },
+    ],
+)
+def test_turns_need_a_valid_body(
+    mocker: mock, monkeypatch, entry_point: Callable, event: dict
+) -> None:
+    """
+    Test that missing and malformed request bodies are answered with a 400
+    before anything is read
+
+    :param mocker: Pytest mock fixture
+    :param monkeypatch: Pytest monkeypatch fixture
+    :param entry_point: Operator handler taking the request
+    :param event: Input AWS Lambda event dict
+    """
+    # Arrange
+    monkeypatch.setenv("DYNAMODB_TABLE", "Table")
+    monkeypatch.setenv("FIGHTS_TABLE", "Fights")
+    resources = [
+        mocker.patch(
+            f"worlds_worst_serverless.worlds_worst_operator.{module}.boto3.resource"
+        )
+        for module in ("operator", "moves")
+    ]
+
+    # Act
+    response = entry_point(event, {})
+
+    # Assert
+    assert response["statusCode"] == 400
+    for resource in resources:
+        resource.assert_not_called()
+
+
+@pytest.fixture
+def fights_table(mocker: mock, monkeypatch) -> mock.MagicMock:
+    """
+    Fixture to point submit_move at mock tables
+
+    :param mocker: Pytest mock fixture
+    :param monkeypatch: Pytest monkeypatch fixture
+    :return: The mock fights table
+    """
+    monkeypatch.setenv("DYNAMODB_TABLE", "Table")
+    monkeypatch.setenv("FIGHTS_TABLE", "Fights")
+    table = mock.MagicMock()
+    table.name = "Fights"
+    resource = mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.moves.boto3.resource"
+    )
+    resource.return_value.Table.side_effect = lambda name: (
+        table if name == "Fights" else mock.MagicMock()
+    )
+    return table
+
+
+def move_event(auth_token: str, action: str) -> dict:
+    """
+    Build an event for submit_move
+
+    :param auth_token: Auth token of the player moving
+    :param action: Text the player typed
+    :return: Mock event dict
+    """
+    return {"body": json.dumps({"auth_token": auth_token, "action": action})}
+
+
+def test_first_move_waits_for_opponent(
+    mocker: mock, fights_table: mock.MagicMock, stored_players: dict
+) -> None:
+    """
+    Test that the first move is sealed and answered without playing the turn
+
+    :param mocker: Pytest mock fixture
+    :param fights_table: Mock fights table
+    :param stored_players: Stored player items
+    """
+    # Arrange
+    mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.moves.batch_load_players",
+        return_value=stored_players,
+    )
+    transact = mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.moves.transact_update_players"
+    )
+    fights_table.update_item.return_value = {
+        "Attributes": {
+            "fightId": "player_hash#target_hash",
+            "turn": 0,
+            "move_player_hash": {"action": "attack", "enhanced": False},
+        }
+    }
+
+    # Act
+    response = moves.submit_move(move_event("player_auth", "atack on target_hash"), {})
+
+    # Assert
+    assert response["statusCode"] == 202
+    update = fights_table.update_item.call_args[1]
+    assert update["Key"] == {"fightId": "player_hash#target_hash"}
+    assert update["ConditionExpression"] == "attribute_not_exists(#move)"
+    assert update["ExpressionAttributeNames"]["#move"] == "move_player_hash"
+    transact.assert_not_called()
+
+
+def test_second_move_plays_turn_once(
+    mocker: mock, fights_table: mock.MagicMock, stored_players: dict
+) -> None:
+    """
+    Test that the second move plays the turn with both sealed moves, and writes
+    both players and the next turn in one transaction conditional on this turn
+
+    :param mocker: Pytest mock fixture
+    :param fights_table: Mock fights table
+    :param stored_players: Stored player items
+    """
+    # Arrange
+    mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.moves.batch_load_players",
+        return_value=stored_players,
+    )
+    transact = mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.moves.transact_update_players",
+        return_value={},
+    )
+    fights_table.update_item.return_value = {
+        "Attributes": {
+            "fightId": "player_hash#target_hash",
+            "turn": 4,
+            "move_player_hash": {"action": "attack", "enhanced": False},
+            "move_target_hash": {"action": "dodge", "enhanced": False},
+        }
+    }
+
+    # Act
+    response = moves.submit_move(move_event("target_auth", "dodge on player_hash"), {})
+
+    # Assert
+    body = json.loads(response["body"])
+    assert response["statusCode"] == 200
+    assert body["turn"] == 5
+    assert body["message"][:3] == [
+        "Truckthunders uses attack!",
+        "Crunchbucket uses dodge!",
+        "Crunchbucket wins.",
+    ]
+    transact.assert_called_once()
+    fight_update = transact.call_args[1]["extra_items"][0]["Update"]
+    assert fight_update["ExpressionAttributeValues"][":turn"] == 4
+    assert "REMOVE #left, #right" in fight_update["UpdateExpression"]
+    assert set(transact.call_args[1]["updates"]) == {"player_hash", "target_hash"}
+
+
+@pytest.mark.parametrize(
+    "update_error,reread,expected_status",
+    [
+        # The player already sealed a move this turn
+        (
+            "ConditionalCheckFailedException",
+            {
+                "fightId": "player_hash#target_hash",
+                "turn": 4,
+                "move_target_hash": {"action": "dodge", "enhanced": False},
+            },
+            409,
+        ),
+        # The turn was played by someone else while we played it
+        (None, {"fightId": "player_hash#target_hash", "turn": 5}, 409),
+    ],
+)
+def test_moves_are_not_played_twice(
+    mocker: mock,
+    fights_table: mock.MagicMock,
+    stored_players: dict,
+    update_error: str,
+    reread: dict,
+    expected_status: int,
+) -> None:
+    """
+    Test that a second move from the same player, and a turn already played
+    by another request, are refused
+
+    :param mocker: Pytest mock fixture
+    :param fights_table: Mock fights table
+    :param stored_players: Stored player items
+    :param update_error: Error code of the sealing write, if it fails
+    :param reread: Fight item read after the transaction was cancelled
+    :param expected_status: Expected status code
+    """
+    # Arrange
+    mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.moves.batch_load_players",
+        return_value=stored_players,
+    )
+    transact = mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.moves.transact_update_players",
+        side_effect=database_ops.StaleVersionError("cancelled"),
+    )
+    if update_error:
+        fights_table.update_item.side_effect = moves.ClientError(
+            {"Error": {"Code": update_error, "Message": ""}}, "UpdateItem"
+        )
+    else:
+        fights_table.update_item.return_value = {
+            "Attributes": {
+                "fightId": "player_hash#target_hash",
+                "turn": 4,
+                "move_player_hash": {"action": "attack", "enhanced": False},
+                "move_target_hash": {"action": "dodge", "enhanced": False},
+            }
+        }
+    fights_table.get_item.return_value = {"Item": reread}
+
+    # Act
+    response = moves.submit_move(move_event("target_auth", "dodge on player_hash"), {})
+
+    # Assert
+    assert response["statusCode"] == expected_status
+    assert transact.call_count == (0 if update_error else 1)
+
+
+def test_unplayed_turn_is_played_by_next_move(
+    mocker: mock, fights_table: mock.MagicMock, stored_players: dict
+) -> None:
+    """
+    Test that a turn whose moves are both sealed, but which the request sealing
+    the second move failed to play, is played by the next move from either
+    player instead of refusing it forever
+
+    :param mocker: Pytest mock fixture
+    :param fights_table: Mock fights table
+    :param stored_players: Stored player items
+    """
+    # Arrange
+    mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.moves.batch_load_players",
+        return_value=stored_players,
+    )
+    transact = mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.moves.transact_update_players",
+        return_value={},
+    )
+    fights_table.update_item.side_effect = moves.ClientError(
+        {"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}},
+        "UpdateItem",
+    )
+    fights_table.get_item.return_value = {
+        "Item": {
+            "fightId": "player_hash#target_hash",
+            "turn": 4,
+            "move_player_hash": {"action": "attack", "enhanced": False},
+            "move_target_hash": {"action": "dodge", "enhanced": False},
+        }
+    }
+
+    # Act
+    response = moves.submit_move(move_event("player_auth", "block on target_hash"), {})
+
+    # Assert
+    body = json.loads(response["body"])
+    assert response["statusCode"] == 200
+    assert body["turn"] == 5
+    # The sealed moves are played, not the one in the retry
+    assert body["message"][:2] == [
+        "Truckthunders uses attack!",
+        "Crunchbucket uses dodge!",
+    ]
+    transact.assert_called_once()
+
+
+def test_moves_for_a_played_turn_are_refused(
+    mocker: mock, fights_table: mock.MagicMock, stored_players: dict
+) -> None:
+    """
+    Test that a move naming its turn is only sealed into that turn, so a retry
+    of a move that went through isn't sealed into the next turn
+
+    :param mocker: Pytest mock fixture
+    :param fights_table: Mock fights table
+    :param stored_players: Stored player items
+    """
+    # Arrange
+    mocker.patch(
+        "worlds_worst_serverless.worlds_worst_operator.moves.batch_load_players",
+        return_value=stored_players,
+    )
+    fights_table.update_item.side_effect = moves.ClientError(
+        {"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}},
+        "UpdateItem",
+    )
+    fights_table.get_item.return_value = {
+        "Item": {"fightId": "player_hash#target_hash", "turn": 5}
+    }
+    event = {
+        "body": json.dumps(
+            {"auth_token": "player_auth", "action": "attack on target_hash", "turn": 4}
+        )
+    }
+
+    # Act
+    response = moves.submit_move(event, {})
+
+    # Assert
+    assert response["statusCode"] == 409
+    assert json.loads(response["body"]) == {"Error": "It is turn 5, not turn 4."}
+    update = fights_table.update_item.call_args[1]
+    assert update["ConditionExpression"] == (
+        "attribute_not_exists(#move) AND #turn = :turn"
+    )
+    assert update["ExpressionAttributeValues"][":turn"] == 4
@@ -0,0 +1,225 @@
+"""
+FastAPI app serving the match server over HTTP and WebSockets
+
+A fight only lives in the process that started it, so run this with a single
+worker (e.g. uvicorn worlds_worst_serverless.worlds_worst_arena.app:app) and
+route every request for a fight to the same process. Fights are checkpointed to
+FIGHTS_TABLE, or kept in memory when it isn't set. The matchmaking queue is
+saved there too when the process stops, and queued again when it starts.
+
+Players are who their auth_token says they are, resolved through the auth
+service's token index in TOKEN_TABLE, never a playerId they send.
+"""
+import asyncio
+import os
+import uuid
+from typing import Any, Dict
+
+import boto3
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import JSONResponse
+
+from worlds_worst_serverless.worlds_worst_arena.checkpoints import (
+    DynamoDBCheckpoints,
+    MemoryCheckpoints,
+)
+from worlds_worst_serverless.worlds_worst_arena.match_server import (
+    MatchServer,
+    MoveError,
+)
+from worlds_worst_serverless.worlds_worst_arena.matchmaking import (
+    DEFAULT_RATING,
+    Matchmaker,
+)
+from worlds_worst_serverless.worlds_worst_auth.async_database_ops import (
+    batch_load_players,
+    run_blocking,
+)
+from worlds_worst_serverless.worlds_worst_auth.token_index import resolve_token
+from worlds_worst_serverless.worlds_worst_operator.actions import to_player
+
+dynamodb = boto3.resource(
+    "dynamodb",
+    region_name="us-east-1",
+    endpoint_url=os.environ.get("DYNAMODB_ENDPOINT"),
+)
+
+if os.environ.get("FIGHTS_TABLE"):
+    store = DynamoDBCheckpoints(dynamodb.Table(os.environ["FIGHTS_TABLE"]))
+else:
+    store = MemoryCheckpoints()
+
+# Checkpoint of the matchmaking queue, stored alongside the fights under an ID
+# no fight can take
+QUEUE_SNAPSHOT_ID = "matchmaking-queue"
+
+server = MatchServer(store)
+matchmaker = Matchmaker(server)
+app = FastAPI(title="worlds-worst-arena")
+
+
+@app.on_event("startup")
+async def start_checkpoints() -> None:
+    snapshot = await store.load(QUEUE_SNAPSHOT_ID)
+    if snapshot is not None:
+        matchmaker.restore(snapshot)
+    await server.restore_deadlines()
+    app.state.checkpoints = asyncio.ensure_future(server.run_checkpoints())
+    app.state.deadlines = asyncio.ensure_future(server.run_deadlines())
+    app.state.matchmaking = asyncio.ensure_future(matchmaker.run_matchmaking())
+
+
+@app.on_event("shutdown")
+async def stop_checkpoints() -> None:
+    app.state.checkpoints.cancel()
+    app.state.deadlines.cancel()
+    app.state.matchmaking.cancel()
+    await server.checkpoint_dirty()
+    await store.save_many([{"fightId": QUEUE_SNAPSHOT_ID, **matchmaker.snapshot()}])
+
+
+def player_table() -> dynamodb.Table:
+    return dynamodb.Table(os.environ["DYNAMODB_TABLE"])
+
+
+async def authenticated_player(auth_token: Any) -> str:
+    """
+    Find the player an auth_token belongs to, refusing unknown or expired tokens
+    """
+    if not isinstance(auth_token, str) or not auth_token:
+        raise MoveError(401, "Send your auth_token.")
+    player_token = await run_blocking(
+        resolve_token, dynamodb.Table(os.environ["TOKEN_TABLE"]), auth_token
+    )
+    if player_token is None:
+        raise MoveError(401, "Unknown or expired auth_token, log in again.")
+    return player_token
+
+
+async def request_body(request: Request) -> Dict:
+    """
+    Decode a JSON request body, refusing anything but an object
+    """
+    try:
+        body = await request.json()
+    except ValueError as e:
+        raise MoveError(400, f"Malformed request body: {e}")
+    if not isinstance(body, dict):
+        raise MoveError(400, "The request body must be an object.")
+    return body
+
+
+@app.exception_handler(MoveError)
+async def move_error(request: Request, e: MoveError) -> JSONResponse:
+    return JSONResponse(status_code=e.status_code, content={"Error": str(e)})
+
+
+@app.post("/arena/fights")
+async def start_fight(request: Request) -> JSONResponse:
+    """
+    Start a fight between the two players in playerIds, the first with priority.
+    The player whose auth_token is sent has to be one of them.
+    """
+    body = await request_body(request)
+    player_tokens = body.get("playerIds")
+    if (
+        not isinstance(player_tokens, list)
+        or len(set(player_tokens)) != 2
+        or not all(isinstance(token, str) for token in player_tokens)
+    ):
+        raise MoveError(400, "A fight needs exactly two players.")
+    if await authenticated_player(body.get("auth_token")) not in player_tokens:
+        raise MoveError(403, "You can only start a fight you are in.")
+    fight_id = body.get("fightId") or str(uuid.uuid4())
+    if not isinstance(fight_id, str) or fight_id == QUEUE_SNAPSHOT_ID:
+        raise MoveError(400, f"{fight_id} is not a valid fightId.")
+
+    items = await batch_load_players(table=player_table(), player_tokens=player_tokens)
+    missing = [token for token in player_tokens if token not in items]
+    if missing:
+        raise MoveError(404, f"Players {missing} do not exist.")
+
+    left, right = (to_player(items[token]["player_data"]) for token in player_tokens)
+    return JSONResponse(await server.start_fight(fight_id, left, right))
+
+
+@app.post("/arena/queue")
+async def join_queue(request: Request) -> JSONResponse:
+    """
+    Queue a player and wait until they are paired and their fight has started
+    """
+    body = await request_body(request)
+    player_token = await authenticated_player(body.get("auth_token"))
+    items = await batch_load_players(table=player_table(), player_tokens=[player_token])
+    if player_token not in items:
+        raise MoveError(404, f"Player {player_token} does not exist.")
+
+    player_data = items[player_token]["player_data"]
+    rating = player_data.get("rating", DEFAULT_RATING)
+    return JSONResponse(await matchmaker.join(to_player(player_data), rating))
+
+
+@app.delete("/arena/queue")
+async def leave_queue(auth_token: str) -> JSONResponse:
+    return JSONResponse(
+        {"left": matchmaker.leave(await authenticated_player(auth_token))}
+    )
+
+
+@app.get("/arena/fights/{fight_id}")
+async def get_fight(fight_id: str) -> JSONResponse:
+    fight = await server.get_fight(fight_id)
+    return JSONResponse(fight.result())
+
+
+@app.post("/arena/fights/{fight_id}/moves")
+async def submit_move(fight_id: str, request: Request) -> JSONResponse:
+    """
+    Send a move and wait for the turn to be played
+    """
+    body = await request_body(request)
+    player_token = await authenticated_player(body.get("auth_token"))
+    if not isinstance(body.get("action"), str):
+        raise MoveError(400, "Send the action to play.")
+    result = await server.submit_move(
+        fight_id, player_token, body["action"], enhanced=body.get("enhanced") is True
+    )
+    return JSONResponse(result)
+
+
+@app.websocket("/arena/fights/{fight_id}/ws")
+async def play(websocket: WebSocket, fight_id: str, auth_token: str) -> None:
+    """
+    Play a whole fight over one connection: each message is a move, answered
+    with the turn's result once the opponent has moved too
+    """
+    try:
+        player_id = await authenticated_player(auth_token)
+    except MoveError as e:
+        print(f"Refused a connection to fight {fight_id}: {e}")
+        # Closing before accepting refuses the handshake
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    try:
+        while True:
+            move = await websocket.receive_json()
+            if not isinstance(move, dict) or not isinstance(move.get("action"), str):
+                await websocket.send_json({"Error": "Send the action to play."})
+                continue
+            try:
+                result = await server.submit_move(
+                    fight_id,
+                    player_id,
+                    move["action"],
+                    enhanced=move.get("enhanced") is True,
+                )
+            except MoveError as e:
+                await websocket.send_json({"Error": str(e)})
+                continue
+            await websocket.send_json(result)
+            if result["finished"]:
+                await websocket.close()
+                return
+    except WebSocketDisconnect:
+        print(f"{player_id} left fight {fight_id}")
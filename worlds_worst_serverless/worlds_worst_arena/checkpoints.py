@@ -0,0 +1,144 @@
+"""
+Where the match server keeps fights between checkpoints and after they end
+
+Fights are stored whole, one item per fight keyed by fightId, written in
+batches of up to 25 with BatchWriteItem. Point DYNAMODB_ENDPOINT at a local
+stand-in such as DynamoDB Local to run against it, or use MemoryCheckpoints.
+
+Players are stored without their auth_token, which only ever lives hashed in
+the auth service's token index.
+"""
+import os
+from dataclasses import asdict
+from typing import Dict, Iterable, List, Optional
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+
+from worlds_worst_serverless.worlds_worst_auth.async_database_ops import run_blocking
+from worlds_worst_serverless.worlds_worst_auth.database_ops import to_native
+from worlds_worst_serverless.worlds_worst_combat.player_data import Player
+
+# Most items BatchWriteItem takes at once
+BATCH_SIZE = 25
+
+dynamodb = boto3.resource(
+    "dynamodb",
+    region_name="us-east-1",
+    endpoint_url=os.environ.get("DYNAMODB_ENDPOINT"),
+)
+
+
+def player_state(player: Player) -> Dict:
+    """
+    Turn a player into what a checkpoint stores of them
+
+    :param player: The player
+    :return: Player dict, without the auth_token
+    """
+    state = asdict(player)
+    del state["auth_token"]
+    return state
+
+
+class DynamoDBCheckpoints:
+    """
+    Fight checkpoints in a DynamoDB table keyed by fightId
+    """
+
+    def __init__(self, table: dynamodb.Table):
+        """
+        :param table: DynamoDB table object
+        """
+        self.table = table
+
+    async def save_many(self, fights: Iterable[Dict]) -> None:
+        """
+        Store fights, replacing their previous checkpoints
+
+        :param fights: Fight states, each with a fightId
+        """
+        await run_blocking(self._save_many, list(fights))
+
+    def _save_many(self, fights: List[Dict]) -> None:
+        # batch_writer groups the puts into batches and resends unprocessed items
+        with self.table.batch_writer(overwrite_by_pkeys=["fightId"]) as batch:
+            for fight in fights:
+                batch.put_item(Item=fight)
+
+    async def load(self, fight_id: str) -> Optional[Dict]:
+        """
+        Read a fight's last checkpoint
+
+        :param fight_id: ID of the fight
+        :return: Fight state, or None if the fight was never checkpointed
+        """
+        response = await run_blocking(
+            self.table.get_item, Key={"fightId": fight_id}, ConsistentRead=True
+        )
+        item = response.get("Item")
+        return to_native(item) if item is not None else None
+
+    async def pending_deadlines(self) -> Dict[str, int]:
+        """
+        Read the turn deadlines of every fight waiting on a move. This scans the
+        table, so it is only meant for starting up.
+
+        :return: Dictionary mapping fight IDs to deadlines in epoch milliseconds
+        """
+        return await run_blocking(self._pending_deadlines)
+
+    def _pending_deadlines(self) -> Dict[str, int]:
+        scan_kwargs = dict(
+            FilterExpression=Attr("deadline_ms").attribute_type("N"),
+            ProjectionExpression="fightId, deadline_ms",
+        )
+        deadlines = dict()
+        while True:
+            response = self.table.scan(**scan_kwargs)
+            for item in response["Items"]:
+                deadlines[item["fightId"]] = int(item["deadline_ms"])
+            if "LastEvaluatedKey" not in response:
+                return deadlines
+            scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+class MemoryCheckpoints:
+    """
+    Fight checkpoints in a dictionary, for tests and local runs
+    """
+
+    def __init__(self):
+        self.fights = dict()
+        self.writes = 0
+
+    async def save_many(self, fights: Iterable[Dict]) -> None:
+        """
+        Store fights, replacing their previous checkpoints
+
+        :param fights: Fight states, each with a fightId
+        """
+        for fight in fights:
+            self.fights[fight["fightId"]] = fight
+            self.writes += 1
+
+    async def load(self, fight_id: str) -> Optional[Dict]:
+        """
+        Read a fight's last checkpoint
+
+        :param fight_id: ID of the fight
+        :return: Fight state, or None if the fight was never checkpointed
+        """
+        return self.fights.get(fight_id)
+
+    async def pending_deadlines(self) -> Dict[str, int]:
+        """
+        Read the turn deadlines of every fight waiting on a move
+
+        :return: Dictionary mapping fight IDs to deadlines in epoch milliseconds
+        """
+        return {
+            fight_id: fight["deadline_ms"]
+            for fight_id, fight in self.fights.items()
+            if fight.get("deadline_ms")
+        }
@@ -0,0 +1,444 @@
+"""
+Keeps live fights in memory and plays their turns as soon as both moves are in
+
+Each fight lives in one process for as long as it is active. Players send their
+moves over HTTP or a WebSocket (see app), the text is matched with the mapper's
+parser and the turn is resolved with the combat engine, all without touching
+DynamoDB. Fights that changed are checkpointed together every
+CHECKPOINT_INTERVAL seconds and immediately when someone dies. Fights nobody
+has played for IDLE_TIMEOUT seconds are dropped from memory once checkpointed,
+and loaded back from their checkpoint when a move arrives for them.
+
+Once one player has moved, the other has TURN_TIMEOUT seconds to answer before
+a default action is played for them. Turn deadlines are kept in a timer wheel
+and checkpointed with their fights.
+"""
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    from timer_wheel import TimerWheel
+except ImportError:
+    from .timer_wheel import TimerWheel
+
+from worlds_worst_serverless.worlds_worst_arena.checkpoints import player_state
+from worlds_worst_serverless.worlds_worst_combat.combat_engine import resolve_turn
+from worlds_worst_serverless.worlds_worst_combat.player_data import Player
+from worlds_worst_serverless.worlds_worst_mapper.command_parser import parse_command
+from worlds_worst_serverless.worlds_worst_operator.actions import to_player
+
+CHECKPOINT_INTERVAL = 5.0
+IDLE_TIMEOUT = 300.0
+TURN_TIMEOUT = 30.0
+
+
+class MoveError(Exception):
+    """
+    Raised when a move can't be played, with the HTTP status code to answer with
+    """
+
+    def __init__(self, status_code: int, error: str):
+        super().__init__(error)
+        self.status_code = status_code
+
+
+def repeat_last_action(player: Player) -> Tuple[str, bool]:
+    """
+    Default action policy: a player who doesn't answer in time plays the last
+    action they chose again, unenhanced
+
+    :param player: Player who ran out of time
+    :return: (action, enhanced)
+    """
+    return player.action, False
+
+
+class Fight:
+    """
+    Class to hold a live fight between two players
+    """
+
+    # Thousands of these live in one process
+    __slots__ = (
+        "fight_id",
+        "tokens",
+        "players",
+        "turn",
+        "moves",
+        "message",
+        "finished",
+        "dirty",
+        "last_active",
+        "resolved",
+        "deadline",
+    )
+
+    def __init__(
+        self,
+        fight_id: str,
+        players: Dict[str, Player],
+        turn: int = 0,
+        moves: Optional[Dict[str, Tuple[str, bool]]] = None,
+        message: Optional[List[str]] = None,
+        finished: bool = False,
+        deadline: Optional[float] = None,
+    ):
+        """
+        :param fight_id: ID of the fight
+        :param players: The two players by player token, the first one has
+            priority on ties
+        :param turn: Number of turns played
+        :param moves: Moves sent for the next turn, player token -> (action,
+            enhanced)
+        :param message: What happened in the last turn
+        :param finished: Whether someone died
+        :param deadline: time.time() the pending moves must be in by, or None if
+            nobody has moved this turn
+        """
+        self.fight_id = fight_id
+        self.tokens = tuple(players)
+        self.players = players
+        self.turn = turn
+        self.moves = moves if moves is not None else dict()
+        self.message = message if message is not None else []
+        self.finished = finished
+        self.dirty = True
+        self.last_active = time.monotonic()
+        # Completed with the turn's result when the pending moves are played
+        self.resolved = None
+        self.deadline = deadline
+
+    def to_state(self) -> Dict:
+        """
+        Function to turn the fight into a checkpoint
+
+        :return: Fight state, as stored by the checkpoint stores
+        """
+        return {
+            "fightId": self.fight_id,
+            "players": [player_state(self.players[token]) for token in self.tokens],
+            "tokens": list(self.tokens),
+            "turn": self.turn,
+            "moves": {
+                token: {"action": action, "enhanced": enhanced}
+                for token, (action, enhanced) in self.moves.items()
+            },
+            "message": self.message,
+            "finished": self.finished,
+            # DynamoDB doesn't take floats
+            "deadline_ms": int(self.deadline * 1000) if self.deadline else None,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "Fight":
+        """
+        Function to rebuild a fight from its checkpoint
+
+        :param state: Fight state, from to_state
+        :return: Fight
+        """
+        fight = cls(
+            fight_id=state["fightId"],
+            players={
+                token: to_player(player_data)
+                for token, player_data in zip(state["tokens"], state["players"])
+            },
+            turn=state["turn"],
+            moves={
+                token: (move["action"], move["enhanced"])
+                for token, move in state["moves"].items()
+            },
+            message=state["message"],
+            finished=state["finished"],
+            deadline=state["deadline_ms"] / 1000 if state.get("deadline_ms") else None,
+        )
+        fight.dirty = False
+        return fight
+
+    def result(self) -> Dict:
+        """
+        Function to describe where the fight stands, for both players
+
+        :return: Turn number, both players' HP, EX and status, the last turn's
+            messages and whether the fight is over
+        """
+        return {
+            "fightId": self.fight_id,
+            "turn": self.turn,
+            "players": {
+                token: {
+                    "hit_points": player.hit_points,
+                    "ex": player.ex,
+                    "status_effects": player.status_effects,
+                }
+                for token, player in self.players.items()
+            },
+            "message": self.message,
+            "finished": self.finished,
+        }
+
+
+class MatchServer:
+    """
+    Class to run live fights in memory, checkpointing them now and then
+    """
+
+    def __init__(
+        self,
+        store,
+        checkpoint_interval: float = CHECKPOINT_INTERVAL,
+        idle_timeout: float = IDLE_TIMEOUT,
+        turn_timeout: float = TURN_TIMEOUT,
+        default_action: Callable[[Player], Tuple[str, bool]] = repeat_last_action,
+    ):
+        """
+        :param store: Checkpoint store, see checkpoints
+        :param checkpoint_interval: Seconds between checkpoints of changed fights
+        :param idle_timeout: Seconds before a fight nobody plays leaves memory
+        :param turn_timeout: Seconds a player has to answer their opponent's move
+        :param default_action: Policy choosing the move of a player who ran out
+            of time
+        """
+        self.store = store
+        self.checkpoint_interval = checkpoint_interval
+        self.idle_timeout = idle_timeout
+        self.turn_timeout = turn_timeout
+        self.default_action = default_action
+        self.deadlines = TimerWheel()
+        self.fights = dict()
+        self._restoring = dict()
+
+    async def start_fight(self, fight_id: str, left: Player, right: Player) -> Dict:
+        """
+        Function to start a fight between two players
+
+        :param fight_id: ID of the new fight
+        :param left: Player with priority on ties, named by their player token
+        :param right: The other player, named by their player token
+        :return: The fight's result so far
+        """
+        if left.name == right.name:
+            raise MoveError(400, "You can't fight yourself.")
+        if fight_id in self.fights or await self.store.load(fight_id) is not None:
+            raise MoveError(409, f"Fight {fight_id} already exists.")
+
+        left.target, right.target = right.name, left.name
+        fight = Fight(fight_id, {left.name: left, right.name: right})
+        self.fights[fight_id] = fight
+        return fight.result()
+
+    async def get_fight(self, fight_id: str) -> Fight:
+        """
+        Function to find a live fight, loading it from its checkpoint if it was
+        dropped from memory
+
+        :param fight_id: ID of the fight
+        :return: Fight
+        """
+        fight = self.fights.get(fight_id)
+        if fight is not None:
+            return fight
+
+        # Moves arriving together for an evicted fight share one load
+        restoring = self._restoring.get(fight_id)
+        if restoring is None:
+            restoring = asyncio.ensure_future(self.store.load(fight_id))
+            self._restoring[fight_id] = restoring
+            restoring.add_done_callback(lambda _: self._restoring.pop(fight_id, None))
+        state = await asyncio.shield(restoring)
+
+        fight = self.fights.get(fight_id)
+        if fight is not None:
+            return fight
+        # The store can hold other things than fights, e.g. the matchmaking
+        # queue's snapshot, and only fights have players
+        if state is None or "tokens" not in state:
+            raise MoveError(404, f"Fight {fight_id} does not exist.")
+
+        fight = Fight.from_state(state)
+        if not fight.finished:
+            self.fights[fight_id] = fight
+            if fight.deadline is not None:
+                self.deadlines.schedule(fight_id, fight.deadline)
+        return fight
+
+    async def submit_move(
+        self, fight_id: str, player_token: str, text: str, enhanced: bool = False
+    ) -> Dict:
+        """
+        Function to send a player's move, waiting until their opponent's move is
+        in and the turn is played
+
+        :param fight_id: ID of the fight
+        :param player_token: Player ID token of the player moving
+        :param text: Text the player typed
+        :param enhanced: Whether the request asked for an enhanced action
+        :return: The fight's result after the turn
+        """
+        fight = await self.get_fight(fight_id)
+        if player_token not in fight.players:
+            raise MoveError(403, f"{player_token} is not in fight {fight_id}.")
+        if fight.finished:
+            raise MoveError(409, f"Fight {fight_id} is over.")
+
+        command = parse_command(text)
+        if command["function"] != "do_combat":
+            raise MoveError(400, f"No combat action found in {text!r}")
+        if player_token in fight.moves:
+            raise MoveError(409, f"{player_token} already moved this turn.")
+
+        fight.moves[player_token] = (command["action"], command["enhanced"] or enhanced)
+        fight.dirty = True
+        fight.last_active = time.monotonic()
+        if fight.deadline is None:
+            # The clock starts for the other player
+            fight.deadline = time.time() + self.turn_timeout
+            self.deadlines.schedule(fight_id, fight.deadline)
+
+        if fight.resolved is None:
+            fight.resolved = asyncio.get_event_loop().create_future()
+        resolved = fight.resolved
+        if len(fight.moves) == len(fight.tokens):
+            await self._play_turn(fight)
+        return await asyncio.shield(resolved)
+
+    async def expire_turn(self, fight_id: str) -> Optional[Dict]:
+        """
+        Function to play a turn whose deadline passed, with the default action
+        for whoever didn't move
+
+        :param fight_id: ID of the fight
+        :return: The fight's result after the turn, or None if there was no
+            turn to play
+        """
+        try:
+            fight = await self.get_fight(fight_id)
+        except MoveError:
+            return None
+        if fight.finished or not fight.moves:
+            return None
+
+        timed_out = [token for token in fight.tokens if token not in fight.moves]
+        for token in timed_out:
+            fight.moves[token] = self.default_action(fight.players[token])
+        if fight.resolved is None:
+            fight.resolved = asyncio.get_event_loop().create_future()
+        resolved = fight.resolved
+        await self._play_turn(fight, timed_out)
+        return resolved.result()
+
+    async def _play_turn(self, fight: Fight, timed_out: List[str] = ()) -> None:
+        """
+        Function to play the pending moves of a fight and hand both players the
+        result
+
+        :param fight: Fight with both moves in
+        :param timed_out: Player tokens of the players who ran out of time
+        """
+        self.deadlines.cancel(fight.fight_id)
+        fight.deadline = None
+
+        left, right = (fight.players[token] for token in fight.tokens)
+        for player in (left, right):
+            player.action, player.enhanced = fight.moves[player.name]
+
+        left, right, message = resolve_turn(left, right)
+        fight.message = [f"{token} ran out of time." for token in timed_out] + message
+        fight.players = {left.name: left, right.name: right}
+        fight.moves = dict()
+        fight.turn += 1
+        fight.finished = left.hit_points <= 0 or right.hit_points <= 0
+
+        resolved, fight.resolved = fight.resolved, None
+        result = fight.result()
+        resolved.set_result(result)
+
+        if fight.finished:
+            # Don't risk losing how a fight ended to a crash before the next tick
+            try:
+                await self.store.save_many([fight.to_state()])
+            except Exception as e:
+                # Still dirty, so the next checkpoint saves it before it's dropped
+                print(f"Could not checkpoint finished fight {fight.fight_id}: {e}")
+            else:
+                fight.dirty = False
+                self.fights.pop(fight.fight_id, None)
+
+    async def checkpoint_dirty(self) -> int:
+        """
+        Function to checkpoint every fight that changed since its last checkpoint
+
+        :return: Number of fights checkpointed
+        """
+        dirty = [fight for fight in self.fights.values() if fight.dirty]
+        states = []
+        for fight in dirty:
+            fight.dirty = False
+            states.append(fight.to_state())
+        try:
+            if states:
+                await self.store.save_many(states)
+        except Exception:
+            for fight in dirty:
+                fight.dirty = True
+            raise
+        return len(states)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """
+        Function to drop checkpointed fights nobody has played for a while
+
+        :param now: time.monotonic() to compare against
+        :return: Number of fights dropped
+        """
+        now = time.monotonic() if now is None else now
+        idle = [
+            fight_id
+            for fight_id, fight in self.fights.items()
+            if not fight.dirty
+            and fight.resolved is None
+            and now - fight.last_active > self.idle_timeout
+        ]
+        for fight_id in idle:
+            del self.fights[fight_id]
+        return len(idle)
+
+    async def restore_deadlines(self) -> int:
+        """
+        Function to schedule the turn deadlines of checkpointed fights again,
+        e.g. after a restart
+
+        :return: Number of deadlines scheduled
+        """
+        pending = await self.store.pending_deadlines()
+        for fight_id, deadline_ms in pending.items():
+            self.deadlines.schedule(fight_id, deadline_ms / 1000)
+        return len(pending)
+
+    async def run_deadlines(self) -> None:
+        """
+        Function to play every turn whose deadline passed, forever
+        """
+        while True:
+            await asyncio.sleep(self.deadlines.tick)
+            for fight_id in self.deadlines.advance():
+                try:
+                    await self.expire_turn(fight_id)
+                except Exception as e:
+                    print(f"Could not play expired turn of {fight_id}: {e}")
+
+    async def run_checkpoints(self) -> None:
+        """
+        Function to checkpoint changed fights and drop idle ones, forever
+        """
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                saved = await self.checkpoint_dirty()
+            except Exception as e:
+                print(f"Checkpoint failed, trying again next time: {e}")
+                continue
+            evicted = self.evict_idle()
+            if saved or evicted:
+                print(f"Checkpointed {saved} fights, dropped {evicted} idle fights")
@@ -0,0 +1,380 @@
+"""
+Finds opponents of a similar rating for queued players
+
+Queued players are kept in buckets of BUCKET_WIDTH rating points, each sorted
+by rating, with a sorted list of the buckets in use. A player's closest rated
+opponents are their neighbours in that order, found with a bisect in their
+bucket and, at its edges, a bisect over the buckets, so pairing someone costs
+O(log n) however many players are queued.
+
+A pair only forms when both players' windows accept the difference in their
+ratings. Windows start at INITIAL_WINDOW points and widen by WIDEN_PER_SECOND
+for every second a player waits, up to MAX_WINDOW, so nobody waits forever for
+an exact match. Matched pairs go straight to the match server as new fights.
+"""
+import asyncio
+import bisect
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from worlds_worst_serverless.worlds_worst_arena.checkpoints import player_state
+from worlds_worst_serverless.worlds_worst_combat.player_data import Player
+from worlds_worst_serverless.worlds_worst_operator.actions import to_player
+
+DEFAULT_RATING = 1000
+BUCKET_WIDTH = 100
+
+# Rating points a player accepts an opponent to be off by
+INITIAL_WINDOW = 50
+WIDEN_PER_SECOND = 10
+MAX_WINDOW = 500
+
+MATCH_INTERVAL = 1.0
+
+Pair = Tuple[str, str]
+
+
+class QueueEntry:
+    """
+    Class to hold a queued player
+    """
+
+    __slots__ = ("player_token", "rating", "joined_at", "key")
+
+    def __init__(self, player_token: str, rating: int, joined_at: float, seq: int):
+        """
+        :param player_token: Player ID token of the queued player
+        :param rating: Their rating
+        :param joined_at: time.monotonic() when they joined
+        :param seq: Join order, to break rating ties
+        """
+        self.player_token = player_token
+        self.rating = rating
+        self.joined_at = joined_at
+        self.key = (rating, seq)
+
+
+class MatchQueue:
+    """
+    Class to queue players and pair them by rating
+    """
+
+    def __init__(
+        self,
+        bucket_width: int = BUCKET_WIDTH,
+        initial_window: int = INITIAL_WINDOW,
+        widen_per_second: float = WIDEN_PER_SECOND,
+        max_window: int = MAX_WINDOW,
+    ):
+        """
+        :param bucket_width: Rating points per bucket
+        :param initial_window: Rating difference accepted on joining
+        :param widen_per_second: How much the window widens per second waited
+        :param max_window: Widest window
+        """
+        self.bucket_width = bucket_width
+        self.initial_window = initial_window
+        self.widen_per_second = widen_per_second
+        self.max_window = max_window
+        # Oldest first, since dicts keep insertion order
+        self._entries = dict()
+        self._buckets = dict()
+        self._bucket_ids = []
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, player_token: str) -> bool:
+        return player_token in self._entries
+
+    def window(self, entry: QueueEntry, now: float) -> float:
+        """
+        Function to find how far off an opponent's rating a player accepts
+
+        :param entry: The queued player
+        :param now: time.monotonic() to measure their wait against
+        :return: Rating points
+        """
+        waited = max(0.0, now - entry.joined_at)
+        return min(
+            self.max_window, self.initial_window + waited * self.widen_per_second
+        )
+
+    def join(
+        self, player_token: str, rating: int, now: Optional[float] = None
+    ) -> Optional[Pair]:
+        """
+        Function to queue a player, pairing them at once if an opponent in their
+        window is waiting
+
+        :param player_token: Player ID token of the player
+        :param rating: Their rating
+        :param now: time.monotonic() when they joined
+        :return: The pair, or None if they are waiting
+        """
+        now = time.monotonic() if now is None else now
+        if player_token in self._entries:
+            return None
+
+        self._seq += 1
+        entry = QueueEntry(player_token, rating, now, self._seq)
+        self._insert(entry)
+        return self._pair(entry, now)
+
+    def leave(self, player_token: str) -> bool:
+        """
+        Function to take a player out of the queue
+
+        :param player_token: Player ID token of the player
+        :return: Whether they were queued
+        """
+        entry = self._entries.get(player_token)
+        if entry is None:
+            return False
+        self._remove(entry)
+        return True
+
+    def match(self, now: Optional[float] = None) -> List[Pair]:
+        """
+        Function to pair every queued player whose window now reaches an opponent,
+        those who waited longest first
+
+        :param now: time.monotonic() to measure waits against
+        :return: The pairs, each taken out of the queue
+        """
+        now = time.monotonic() if now is None else now
+        pairs = []
+        for entry in list(self._entries.values()):
+            if entry.player_token in self._entries:
+                pair = self._pair(entry, now)
+                if pair is not None:
+                    pairs.append(pair)
+        return pairs
+
+    def snapshot(self, now: Optional[float] = None) -> List[Dict]:
+        """
+        Function to save the queue, with waits rather than clock times since
+        time.monotonic() means nothing in another process
+
+        :param now: time.monotonic() to measure waits against
+        :return: Queued players, oldest first
+        """
+        now = time.monotonic() if now is None else now
+        return [
+            {
+                "playerId": entry.player_token,
+                "rating": entry.rating,
+                "waited_ms": int((now - entry.joined_at) * 1000),
+            }
+            for entry in self._entries.values()
+        ]
+
+    def restore(self, snapshot: List[Dict], now: Optional[float] = None) -> None:
+        """
+        Function to queue the players of a snapshot again, keeping their waits
+
+        :param snapshot: Queued players, from snapshot
+        :param now: time.monotonic() to measure waits against
+        """
+        now = time.monotonic() if now is None else now
+        for queued in snapshot:
+            if queued["playerId"] in self._entries:
+                continue
+            self._seq += 1
+            joined_at = now - queued["waited_ms"] / 1000
+            self._insert(
+                QueueEntry(queued["playerId"], queued["rating"], joined_at, self._seq)
+            )
+
+    def _insert(self, entry: QueueEntry) -> None:
+        bucket_id = entry.rating // self.bucket_width
+        bucket = self._buckets.get(bucket_id)
+        if bucket is None:
+            bucket = self._buckets[bucket_id] = []
+            bisect.insort(self._bucket_ids, bucket_id)
+        bisect.insort(bucket, (entry.key, entry.player_token))
+        self._entries[entry.player_token] = entry
+
+    def _remove(self, entry: QueueEntry) -> None:
+        bucket_id = entry.rating // self.bucket_width
+        bucket = self._buckets[bucket_id]
+        del bucket[bisect.bisect_left(bucket, (entry.key, entry.player_token))]
+        if not bucket:
+            del self._buckets[bucket_id]
+            del self._bucket_ids[bisect.bisect_left(self._bucket_ids, bucket_id)]
+        del self._entries[entry.player_token]
+
+    def _neighbours(self, entry: QueueEntry) -> List[QueueEntry]:
+        """
+        Function to find the queued players rated just below and just above a
+        player, the only candidates for their closest opponent
+
+        :param entry: The queued player
+        :return: Up to two queued players
+        """
+        bucket_id = entry.rating // self.bucket_width
+        bucket = self._buckets[bucket_id]
+        position = bisect.bisect_left(bucket, (entry.key, entry.player_token))
+        neighbours = []
+
+        if position > 0:
+            neighbours.append(bucket[position - 1][1])
+        else:
+            below = bisect.bisect_left(self._bucket_ids, bucket_id)
+            if below > 0:
+                neighbours.append(self._buckets[self._bucket_ids[below - 1]][-1][1])
+
+        if position + 1 < len(bucket):
+            neighbours.append(bucket[position + 1][1])
+        else:
+            above = bisect.bisect_right(self._bucket_ids, bucket_id)
+            if above < len(self._bucket_ids):
+                neighbours.append(self._buckets[self._bucket_ids[above]][0][1])
+
+        return [self._entries[player_token] for player_token in neighbours]
+
+    def _pair(self, entry: QueueEntry, now: float) -> Optional[Pair]:
+        """
+        Function to pair a player with their closest rated opponent, if both
+        their windows accept the difference
+
+        :param entry: The queued player
+        :param now: time.monotonic() to measure waits against
+        :return: The pair, taken out of the queue, or None
+        """
+        window = self.window(entry, now)
+        candidates = sorted(
+            self._neighbours(entry),
+            key=lambda other: abs(other.rating - entry.rating),
+        )
+        for other in candidates:
+            difference = abs(other.rating - entry.rating)
+            if difference <= window and difference <= self.window(other, now):
+                self._remove(entry)
+                self._remove(other)
+                # Whoever waited longest gets priority on ties
+                if (other.joined_at, other.key[1]) < (entry.joined_at, entry.key[1]):
+                    return other.player_token, entry.player_token
+                return entry.player_token, other.player_token
+        return None
+
+
+class Matchmaker:
+    """
+    Class to queue players for fights and start a fight on the match server for
+    every pair the queue finds
+    """
+
+    def __init__(self, server, queue: Optional[MatchQueue] = None):
+        """
+        :param server: MatchServer the fights are played on
+        :param queue: Queue to pair players with
+        """
+        self.server = server
+        self.queue = queue if queue is not None else MatchQueue()
+        self.players = dict()
+        self._waiters = dict()
+        # Fights of players who were paired while nobody was waiting for them
+        self._unclaimed = dict()
+
+    async def join(self, player: Player, rating: int = DEFAULT_RATING) -> Dict:
+        """
+        Function to queue a player, waiting until they are paired and their
+        fight has started
+
+        :param player: The player, named by their player token
+        :param rating: Their rating
+        :return: Their fight's result so far
+        """
+        player_token = player.name
+        if player_token in self._unclaimed:
+            return self._unclaimed.pop(player_token)
+
+        waiter = self._waiters.get(player_token)
+        if waiter is None:
+            waiter = asyncio.get_event_loop().create_future()
+            self._waiters[player_token] = waiter
+        self.players.setdefault(player_token, player)
+
+        pair = self.queue.join(player_token, rating)
+        if pair is not None:
+            await self._start_fight(pair)
+        return await asyncio.shield(waiter)
+
+    def leave(self, player_token: str) -> bool:
+        """
+        Function to take a player out of the queue
+
+        :param player_token: Player ID token of the player
+        :return: Whether they were queued
+        """
+        self.players.pop(player_token, None)
+        waiter = self._waiters.pop(player_token, None)
+        if waiter is not None:
+            waiter.cancel()
+        return self.queue.leave(player_token)
+
+    async def _start_fight(self, pair: Pair) -> None:
+        left, right = (self.players.pop(player_token) for player_token in pair)
+        result = await self.server.start_fight(str(uuid.uuid4()), left, right)
+        for player_token in pair:
+            waiter = self._waiters.pop(player_token, None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(result)
+            else:
+                self._unclaimed[player_token] = result
+
+    async def match(self) -> int:
+        """
+        Function to start a fight for every pair the queue finds
+
+        :return: Number of fights started
+        """
+        pairs = self.queue.match()
+        for pair in pairs:
+            await self._start_fight(pair)
+        return len(pairs)
+
+    async def run_matchmaking(self, interval: float = MATCH_INTERVAL) -> None:
+        """
+        Function to pair players whose windows widened, forever
+
+        :param interval: Seconds between rounds
+        """
+        while True:
+            await asyncio.sleep(interval)
+            started = await self.match()
+            if started:
+                print(f"Started {started} fights, {len(self.queue)} players queued")
+
+    def snapshot(self) -> Dict:
+        """
+        Function to save the queue and its players
+
+        :return: Queue snapshot, as stored by the checkpoint stores
+        """
+        return {
+            "queue": self.queue.snapshot(),
+            "players": {
+                player_token: player_state(player)
+                for player_token, player in self.players.items()
+            },
+        }
+
+    def restore(self, snapshot: Dict) -> None:
+        """
+        Function to queue the players of a snapshot again
+
+        :param snapshot: Queue snapshot, from snapshot
+        """
+        for player_token, player_data in snapshot["players"].items():
+            self.players.setdefault(player_token, to_player(player_data))
+        self.queue.restore(
+            [
+                queued
+                for queued in snapshot["queue"]
+                if queued["playerId"] in self.players
+            ]
+        )
@@ -0,0 +1,170 @@
+"""
+Hierarchical timer wheel for turn deadlines
+
+Time is cut into ticks of TICK seconds. The first wheel has a slot for each of
+the next 2 ** SLOT_BITS ticks; every wheel above it has a slot for as many of
+the slots below. A timer goes into the lowest wheel whose range reaches its deadline, so
+scheduling and cancelling are a dictionary insert and delete whatever the
+number of timers. Each time a wheel's slot comes round, its timers move down to
+the wheel below, until they expire from the first one.
+
+Deadlines are wall clock times (time.time()), so they mean the same thing after
+a restart.
+"""
+import time
+from typing import Dict, Hashable, List, Optional
+
+TICK = 0.1
+# 64 slots and 4 wheels reach 64 ** 4 ticks, almost 20 days at 0.1s a tick
+SLOT_BITS = 6
+LEVELS = 4
+
+
+class TimerWheel:
+    """
+    Class to hold deadlines by key, and find the ones that expired
+    """
+
+    def __init__(
+        self,
+        tick: float = TICK,
+        slot_bits: int = SLOT_BITS,
+        levels: int = LEVELS,
+        now: Optional[float] = None,
+    ):
+        """
+        :param tick: Seconds per tick, the precision of deadlines
+        :param slot_bits: log2 of the slots per wheel
+        :param levels: Number of wheels
+        :param now: time.time() to start the wheel at
+        """
+        self.tick = tick
+        self.slot_bits = slot_bits
+        self.levels = levels
+        self._mask = (1 << slot_bits) - 1
+        self._span = 1 << (slot_bits * levels)
+        self._wheels = [[dict() for _ in range(1 << slot_bits)] for _ in range(levels)]
+        # key -> (deadline, wheel, slot)
+        self._timers = dict()
+        self._now_tick = self._to_tick(time.time() if now is None else now)
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._timers
+
+    def _to_tick(self, moment: float) -> int:
+        return int(moment / self.tick)
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """
+        Function to set a key's deadline, replacing any it had
+
+        :param key: What the deadline is for, e.g. a fight ID
+        :param deadline: time.time() it expires at
+        """
+        self.cancel(key)
+        self._place(key, deadline)
+
+    def cancel(self, key: Hashable) -> bool:
+        """
+        Function to drop a key's deadline
+
+        :param key: What the deadline is for
+        :return: Whether it had one
+        """
+        timer = self._timers.pop(key, None)
+        if timer is None:
+            return False
+        _, level, slot = timer
+        del self._wheels[level][slot][key]
+        return True
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        """
+        Function to look up a key's deadline
+
+        :param key: What the deadline is for
+        :return: time.time() it expires at, or None if it has none
+        """
+        timer = self._timers.get(key)
+        return timer[0] if timer is not None else None
+
+    def advance(self, now: Optional[float] = None) -> List[Hashable]:
+        """
+        Function to move the wheel on to now, collecting what expired on the way
+
+        :param now: time.time() to move to
+        :return: Keys whose deadlines passed, earliest tick first
+        """
+        target_tick = self._to_tick(time.time() if now is None else now)
+        expired = []
+        while self._now_tick < target_tick:
+            if not self._timers:
+                # Nothing to cascade or expire, skip straight there
+                self._now_tick = target_tick
+                break
+
+            self._now_tick += 1
+            for level in range(1, self.levels):
+                if self._now_tick & ((1 << (self.slot_bits * level)) - 1):
+                    break
+                self._cascade(level)
+
+            slot = self._wheels[0][self._now_tick & self._mask]
+            for key, deadline in list(slot.items()):
+                del slot[key]
+                del self._timers[key]
+                if self._to_tick(deadline) > self._now_tick:
+                    # Was further out than the wheels reach, place it again
+                    self._place(key, deadline)
+                else:
+                    expired.append(key)
+        return expired
+
+    def deadlines(self) -> Dict[Hashable, float]:
+        """
+        Function to list every deadline, e.g. to checkpoint them
+
+        :return: Dictionary mapping keys to deadlines
+        """
+        return {key: deadline for key, (deadline, _, _) in self._timers.items()}
+
+    def _cascade(self, level: int) -> None:
+        """
+        Function to move the timers in a wheel's current slot down a wheel
+
+        :param level: Wheel whose slot came round
+        """
+        index = (self._now_tick >> (self.slot_bits * level)) & self._mask
+        slot = self._wheels[level][index]
+        self._wheels[level][index] = dict()
+        for key, deadline in slot.items():
+            del self._timers[key]
+            # The current tick's first-wheel slot is still to be expired
+            self._place(key, deadline, earliest_tick=self._now_tick)
+
+    def _place(
+        self, key: Hashable, deadline: float, earliest_tick: Optional[int] = None
+    ) -> None:
+        """
+        Function to put a timer in the lowest wheel whose range reaches it
+
+        :param key: What the deadline is for
+        :param deadline: time.time() it expires at
+        :param earliest_tick: Soonest tick it can expire at, by default the next
+        """
+        if earliest_tick is None:
+            earliest_tick = self._now_tick + 1
+        deadline_tick = max(self._to_tick(deadline), earliest_tick)
+        deadline_tick = min(deadline_tick, self._now_tick + self._span - 1)
+        delta = deadline_tick - self._now_tick
+
+        level = 0
+        while level < self.levels - 1 and delta >> (self.slot_bits * (level + 1)):
+            level += 1
+        slot = (deadline_tick >> (self.slot_bits * level)) & self._mask
+
+        self._wheels[level][slot][key] = deadline
+        self._timers[key] = (deadline, level, slot)
@@ -0,0 +1,135 @@
+"""
+Asyncio versions of the database_ops data-access functions
+
+boto3 only makes blocking calls, so every call here runs the matching
+database_ops function on a bounded thread pool. Awaiting several of them with
+asyncio.gather sends the DynamoDB requests concurrently, e.g. loading both
+players of a fight while the auth check and the history write are in flight.
+
+Point DYNAMODB_ENDPOINT at a local stand-in such as DynamoDB Local to run
+against it in tests and benchmarks.
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import database_ops
+except ImportError:
+    from . import database_ops
+
+# Bounds how many DynamoDB calls one process makes at once
+MAX_CONCURRENCY = int(os.environ.get("DYNAMODB_MAX_CONCURRENCY", 16))
+
+_executor = ThreadPoolExecutor(
+    max_workers=MAX_CONCURRENCY, thread_name_prefix="dynamodb"
+)
+
+
+async def run_blocking(function: Callable, *args: Any, **kwargs: Any) -> Any:
+    """
+    Run a blocking data-access call on the DynamoDB thread pool
+
+    :param function: The blocking function to call
+    :return: Whatever the function returns
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        _executor, functools.partial(function, *args, **kwargs)
+    )
+
+
+async def load_player(
+    table: database_ops.dynamodb.Table, player_token: str, use_cache: bool = True
+) -> Optional[Dict]:
+    """
+    Async version of database_ops.load_player
+    """
+    # Cache hits don't need a thread
+    if use_cache:
+        item = database_ops.player_cache.get(
+            database_ops._cache_key(table, player_token)
+        )
+        if item is not None:
+            return item
+
+    return await run_blocking(
+        database_ops.load_player,
+        table=table,
+        player_token=player_token,
+        use_cache=use_cache,
+    )
+
+
+async def put_item(table: database_ops.dynamodb.Table, item: Dict, **kwargs) -> Dict:
+    """
+    Async version of Table.put_item
+    """
+    return await run_blocking(table.put_item, Item=item, **kwargs)
+
+
+async def update_player(
+    table: database_ops.dynamodb.Table,
+    player_token: str,
+    update_map: Dict,
+    expected_version: Optional[int] = None,
+) -> Dict:
+    """
+    Async version of database_ops.update_player
+    """
+    return await run_blocking(
+        database_ops.update_player,
+        table=table,
+        player_token=player_token,
+        update_map=update_map,
+        expected_version=expected_version,
+    )
+
+
+async def save_player(
+    table: database_ops.dynamodb.Table,
+    player_token: str,
+    before: Dict,
+    after: Dict,
+    expected_version: Optional[int] = None,
+) -> Optional[Dict]:
+    """
+    Async version of database_ops.save_player
+    """
+    return await run_blocking(
+        database_ops.save_player,
+        table=table,
+        player_token=player_token,
+        before=before,
+        after=after,
+        expected_version=expected_version,
+    )
+
+
+async def batch_load_players(
+    table: database_ops.dynamodb.Table, player_tokens: List[str]
+) -> Dict[str, Dict]:
+    """
+    Async version of database_ops.batch_load_players
+    """
+    return await run_blocking(
+        database_ops.batch_load_players, table=table, player_tokens=player_tokens
+    )
+
+
+async def transact_update_players(
+    table: database_ops.dynamodb.Table,
+    updates: Dict[str, Tuple[Dict, Optional[int]]],
+    extra_items: Optional[List[Dict]] = None,
+) -> Dict:
+    """
+    Async version of database_ops.transact_update_players
+    """
+    return await run_blocking(
+        database_ops.transact_update_players,
+        table=table,
+        updates=updates,
+        extra_items=extra_items,
+    )
@@ -3,7 +3,6 @@ try:
 except ImportError:
     pass
 
-import json
 import os
 
 from typing import Dict, Any
@@ -11,53 +10,91 @@ from typing import Dict, Any
 import boto3
 
 try:
-    from database_ops import update_player, get_player, create_new_player
+    from database_ops import update_player, load_player, create_new_player
+    from token_index import index_token, revoke_token
+    from token_verifier import InvalidTokenError, signing_keys, verify_token
+    from middleware import HTTPError, Schema, lambda_handler
 except ImportError:
-    from .database_ops import update_player, get_player, create_new_player
+    from .database_ops import update_player, load_player, create_new_player
+    from .token_index import index_token, revoke_token
+    from .token_verifier import InvalidTokenError, signing_keys, verify_token
+    from worlds_worst_serverless.worlds_worst_middleware.middleware import (
+        HTTPError,
+        Schema,
+        lambda_handler,
+    )
 
 dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
 lambda_client = boto3.client("lambda", region_name="us-east-1")
 
 LambdaDict = Dict[str, Any]
 
+AUTHENTICATE_SCHEMA = Schema({"playerId": str, "auth_token": str})
 
-def authenticate(event: LambdaDict, context: LambdaDict) -> LambdaDict:
+
+def warm_up() -> Dict[str, Any]:
+    """
+    Function to parse the signing keys and connect to the player and token
+    tables, for warm-up pings
+
+    :return: What was warmed up
+    """
+    tables = [
+        os.environ[name]
+        for name in ("DYNAMODB_TABLE", "TOKEN_TABLE")
+        if os.environ.get(name)
+    ]
+    for table_name in tables:
+        dynamodb.Table(table_name).load()
+    return {"signing_keys": len(signing_keys()), "tables": tables}
+
+
+@lambda_handler(schema=AUTHENTICATE_SCHEMA, compress=True, warm_up=warm_up)
+def authenticate(request_body: Dict, event: LambdaDict, context: LambdaDict) -> Dict:
     """
     Function to take input in the form of a Player object, along with login
     credentials and a command
 
+    :param request_body: Decoded request body
     :param event: Input AWS Lambda event dict
     :param context: Input AWS Lambda context dict
-    :return: Output AWS Lambda dict
+    :return: Response of the DynamoDB write
     """
-    # Decode the request
-    request_body = event.get("body")
-    if type(request_body) == str:
-        request_body = json.loads(request_body)
     player_name = request_body["playerId"]
     id_token = request_body["auth_token"]
 
+    # Reject bad tokens, and tokens issued to someone else, before touching
+    # the database
+    try:
+        claims = verify_token(id_token)
+    except InvalidTokenError as e:
+        raise HTTPError(401, f"Invalid auth_token: {e}")
+    if claims.get("sub") != player_name:
+        raise HTTPError(401, "auth_token was not issued to this playerId")
+
     # Set up the database access
     player_table = dynamodb.Table(os.environ["DYNAMODB_TABLE"])
+    token_table = dynamodb.Table(os.environ["TOKEN_TABLE"])
 
-    if get_player(table=player_table, player_token=player_name):
+    player = load_player(table=player_table, player_token=player_name)
+    if player:
+        old_token = player["player_data"].get("auth_token")
         update_dict = {
             "auth_token": id_token
         }
         response = update_player(
             table=player_table, player_token=player_name, update_map=update_dict
         )
-        return {
-            "statusCode": 200,
-            "body": response,
-            "headers": {"Access-Control-Allow-Origin": "*"},
-        }
+
+        # Keep the token index in step with the player's token
+        index_token(table=token_table, auth_token=id_token, player_token=player_name)
+        if old_token and old_token != id_token:
+            revoke_token(table=token_table, auth_token=old_token)
+
+        return response
     else:
         response = create_new_player(
             table=player_table, player_token=player_name, auth_token=id_token
         )
-        return {
-            "statusCode": 200,
-            "body": response,
-            "headers": {"Access-Control-Allow-Origin": "*"},
-        }
+        index_token(table=token_table, auth_token=id_token, player_token=player_name)
+        return response
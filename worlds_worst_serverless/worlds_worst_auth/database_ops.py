@@ -1,12 +1,41 @@
 import decimal
 import json
-from string import ascii_lowercase
-from typing import Dict
+import os
+from typing import Any, Dict, List, Optional, Tuple
 
 import boto3
 from botocore.exceptions import ClientError
 
-dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+try:
+    from item_cache import ItemCache
+    from player_diff import diff_player
+    from update_expressions import Increment, compile_update
+except ImportError:
+    from .item_cache import ItemCache
+    from .player_diff import diff_player
+    from .update_expressions import Increment, compile_update
+
+# DYNAMODB_ENDPOINT points at a local stand-in such as DynamoDB Local
+dynamodb = boto3.resource(
+    "dynamodb",
+    region_name="us-east-1",
+    endpoint_url=os.environ.get("DYNAMODB_ENDPOINT"),
+)
+
+# Survives between warm invocations, so a player sending several commands in a
+# row is only read from DynamoDB once
+player_cache = ItemCache(
+    max_entries=int(os.environ.get("PLAYER_CACHE_MAX_ENTRIES", 256)),
+    max_bytes=int(os.environ.get("PLAYER_CACHE_MAX_BYTES", 4 * 1024 * 1024)),
+    ttl=float(os.environ.get("PLAYER_CACHE_TTL", 30)),
+)
+
+
+class StaleVersionError(Exception):
+    """
+    Raised when a write was based on an older version of a player than the one
+    stored in DynamoDB
+    """
 
 
 # Helper class to convert a DynamoDB item to JSON.
@@ -24,6 +53,29 @@ class DecimalEncoder(json.JSONEncoder):
         return super(DecimalEncoder, self).default(o)
 
 
+def to_native(value: Any) -> Any:
+    """
+    Convert a value read from DynamoDB to plain Python types, turning Decimals
+    into ints or floats. Recurses into maps, lists and sets, so an item only
+    needs converting once as it is loaded and can then be used with Player and
+    json.dumps directly.
+
+    :param value: Value read from DynamoDB
+    :return: The value with every Decimal replaced by an int or a float
+    """
+    value_type = type(value)
+    if value_type is decimal.Decimal:
+        integer = int(value)
+        return integer if integer == value else float(value)
+    elif value_type is dict:
+        return {key: to_native(inner) for key, inner in value.items()}
+    elif value_type is list:
+        return [to_native(inner) for inner in value]
+    elif value_type is set:
+        return {to_native(inner) for inner in value}
+    return value
+
+
 def create_new_player(table: dynamodb.Table, player_token: str, auth_token: str) -> Dict:
     """
     Function to create a new player and save to DynamoDB when the authenticated
@@ -52,53 +104,237 @@ def create_new_player(table: dynamodb.Table, player_token: str, auth_token: str)
         "history": [],
     }
 
-    # Put player into DB
+    # Put player into DB, refusing to overwrite a player created in the meantime
+    item = {"playerId": player_token, "player_data": new_player_data, "version": 1}
     response = table.put_item(
-        Item={"playerId": player_token, "player_data": new_player_data}
+        Item=item, ConditionExpression="attribute_not_exists(playerId)"
     )
+    del item["playerId"]
+    player_cache.put(_cache_key(table, player_token), item, version=1)
 
     print(f"Created player {new_player_data['name']}")
     return response
 
 
-def update_player(table: dynamodb.Table, player_token: str, update_map: Dict) -> Dict:
+def update_player(
+    table: dynamodb.Table,
+    player_token: str,
+    update_map: Dict,
+    expected_version: Optional[int] = None,
+) -> Dict:
     """
     Function to update player information in DynamoDB
 
+    Every write bumps the item's version. If expected_version is given, the
+    write only goes through when the stored version still matches it.
+
     :param table: DynamoDB table object
     :param player_token: Player ID token linking player to database entry
-    :param update_map: Dictionary mapping player information to database entry info
+    :param update_map: Dictionary mapping player_data paths to new values, or to
+        Increment/Append/REMOVE operations from update_expressions
+    :param expected_version: Version of the player the update was computed from
 
     :return: Response of DynamoDB table update
     """
-    update_expression = "set "
-    attribute_values = dict()
-    alphabet = iter(ascii_lowercase)
-
-    # Construct the UpdateExpression and ExpressionAttributeValues for update
-    # Of the form:
-    #     UpdateExpression="set info.rating = :r, info.plot=:p, info.actors=:a",
-    #     ExpressionAttributeValues={
-    #         ':r': decimal.Decimal(5.5),
-    #         ':p': "Everything happens all at once.",
-    #         ':a': ["Larry", "Moe", "Curly"]
-    #     },
-    for key, value in update_map.items():
-        letter = next(alphabet)
-        update_expression += f"player_data.{key} = :{letter}, "
-        attribute_values[f":{letter}"] = value
-
-    update_expression = update_expression[:-2]
-
-    response = table.update_item(
+    update_kwargs = _player_update_kwargs(player_token, update_map, expected_version)
+    update_kwargs["ReturnValues"] = "ALL_NEW"
+
+    cache_key = _cache_key(table, player_token)
+    try:
+        response = table.update_item(**update_kwargs)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        # Our copy was stale, so refresh it before letting the caller retry
+        player_cache.invalidate(cache_key)
+        load_player(table=table, player_token=player_token, use_cache=False)
+        raise StaleVersionError(
+            f"Player {player_token} changed since version {expected_version}"
+        )
+
+    if "Attributes" in response:
+        response["Attributes"] = to_native(response["Attributes"])
+        item = dict(response["Attributes"])
+        del item["playerId"]
+        player_cache.put(cache_key, item, version=item["version"])
+    else:
+        player_cache.invalidate(cache_key)
+
+    return response
+
+
+def _player_update_kwargs(
+    player_token: str, update_map: Dict, expected_version: Optional[int]
+) -> Dict:
+    """
+    Build the arguments of an update_item call for a player
+
+    :param player_token: Player ID token linking player to database entry
+    :param update_map: Dictionary mapping player_data paths to new values or
+        operations
+    :param expected_version: Version of the player the update was computed from
+
+    :return: Keyword arguments for update_item
+    """
+    # Update map keys are relative to player_data, and every write bumps version
+    full_update_map = {f"player_data.{key}": value for key, value in update_map.items()}
+    full_update_map["version"] = Increment(1)
+    update_expression, attribute_names, attribute_values = compile_update(
+        full_update_map
+    )
+
+    update_kwargs = dict(
         Key={"playerId": player_token},
         UpdateExpression=update_expression,
+        ExpressionAttributeNames=attribute_names,
         ExpressionAttributeValues=attribute_values,
     )
+    if expected_version is not None:
+        update_kwargs["ConditionExpression"] = "#version = :expected_version"
+        attribute_names["#version"] = "version"
+        attribute_values[":expected_version"] = expected_version
+
+    return update_kwargs
+
+
+def transact_update_players(
+    table: dynamodb.Table,
+    updates: Dict[str, Tuple[Dict, Optional[int]]],
+    extra_items: Optional[List[Dict]] = None,
+) -> Dict:
+    """
+    Function to update several players in one all-or-nothing transaction
+
+    :param table: DynamoDB table object
+    :param updates: Dictionary mapping player tokens to (update map, expected
+        version) pairs, see update_player
+    :param extra_items: More TransactItems to write along with the players,
+        e.g. {"Put": {...}} for a fight history record
+
+    :return: Response of DynamoDB transaction
+    """
+    transact_items = []
+    for player_token, (update_map, expected_version) in updates.items():
+        update_kwargs = _player_update_kwargs(
+            player_token, update_map, expected_version
+        )
+        update_kwargs["TableName"] = table.name
+        transact_items.append({"Update": update_kwargs})
+    transact_items.extend(extra_items or [])
+
+    try:
+        response = table.meta.client.transact_write_items(TransactItems=transact_items)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "TransactionCanceledException":
+            raise
+        for player_token in updates:
+            player_cache.invalidate(_cache_key(table, player_token))
+        raise StaleVersionError(f"Transaction on {list(updates)} was cancelled")
+
+    # Transactions don't return the new items, so forget the old ones
+    for player_token in updates:
+        player_cache.invalidate(_cache_key(table, player_token))
 
     return response
 
 
+def save_player(
+    table: dynamodb.Table,
+    player_token: str,
+    before: Dict,
+    after: Dict,
+    expected_version: Optional[int] = None,
+) -> Optional[Dict]:
+    """
+    Function to write back only the parts of a player's data that changed
+
+    :param table: DynamoDB table object
+    :param player_token: Player ID token linking player to database entry
+    :param before: player_data as it was loaded
+    :param after: player_data after the changes
+    :param expected_version: Version of the player before was loaded from
+
+    :return: Response of DynamoDB table update, or None if nothing changed
+    """
+    update_map = diff_player(before, after)
+    if not update_map:
+        return None
+
+    return update_player(
+        table=table,
+        player_token=player_token,
+        update_map=update_map,
+        expected_version=expected_version,
+    )
+
+
+def load_player(
+    table: dynamodb.Table, player_token: str, use_cache: bool = True
+) -> Optional[Dict]:
+    """
+    Function to load a player item, going to DynamoDB only on a cache miss
+
+    :param table: DynamoDB table object
+    :param player_token: Player ID token linking player to database entry
+    :param use_cache: Whether a cached copy of the player may be returned
+
+    :return: The player item without its playerId, or None if it doesn't exist
+    """
+    cache_key = _cache_key(table, player_token)
+    if use_cache:
+        item = player_cache.get(cache_key)
+        if item is not None:
+            return item
+
+    response = table.get_item(
+        Key={"playerId": player_token}, ConsistentRead=not use_cache
+    )
+    item = response.get("Item")
+    if item is None:
+        player_cache.invalidate(cache_key)
+        return None
+
+    del item["playerId"]
+    item = to_native(item)
+    player_cache.put(cache_key, item, version=item.get("version", 0))
+    return item
+
+
+def batch_load_players(
+    table: dynamodb.Table, player_tokens: List[str]
+) -> Dict[str, Dict]:
+    """
+    Function to load several players, with one BatchGetItem for the cache misses
+
+    :param table: DynamoDB table object
+    :param player_tokens: Player ID tokens to load
+
+    :return: Dictionary mapping player tokens to items, without missing players
+    """
+    players = dict()
+    keys = []
+    for player_token in dict.fromkeys(player_tokens):
+        item = player_cache.get(_cache_key(table, player_token))
+        if item is not None:
+            players[player_token] = item
+        else:
+            keys.append({"playerId": player_token})
+
+    request_items = {table.name: {"Keys": keys}} if keys else {}
+    while request_items:
+        response = table.meta.client.batch_get_item(RequestItems=request_items)
+        for item in response["Responses"].get(table.name, []):
+            item = to_native(item)
+            player_token = item.pop("playerId")
+            player_cache.put(
+                _cache_key(table, player_token), item, version=item.get("version", 0)
+            )
+            players[player_token] = item
+        request_items = response.get("UnprocessedKeys")
+
+    return players
+
+
 def get_player(table: dynamodb.Table, player_token: str) -> bool:
     """
     Function to get player information from DynamoDB
@@ -111,18 +347,24 @@ def get_player(table: dynamodb.Table, player_token: str) -> bool:
     # Get player information from the database
     print(f"Getting 'playerId': {player_token} from DB")
     try:
-        response = table.get_item(Key={"playerId": player_token})
+        item = load_player(table=table, player_token=player_token)
     except ClientError as e:
         return e.response["Error"]["Message"]
     else:
-        try:
-            item = response["Item"]
-
-            # Try to remove the playerId from the dict
-            del (item["playerId"])
-
+        if item is not None:
             print("Retrieved Player Info.")
             return True
-        except KeyError:
+        else:
             print("Player does not exist.")
             return False
+
+
+def _cache_key(table: dynamodb.Table, player_token: str) -> tuple:
+    """
+    Key players by table as well, since the gateway talks to several tables
+
+    :param table: DynamoDB table object
+    :param player_token: Player ID token linking player to database entry
+    :return: Cache key
+    """
+    return getattr(table, "name", None), player_token
@@ -0,0 +1,114 @@
+"""
+Fight history, stored as one record per fight instead of inside the player item
+
+Records live in their own table, partitioned by playerId and sorted by the
+time of the fight, so history can grow without pushing player items toward
+DynamoDB's 400 KB item limit. Players can optionally keep a small ring buffer
+of their most recent fights in player_data.history for quick display.
+"""
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import boto3
+from boto3.dynamodb.conditions import Key
+
+dynamodb = boto3.resource(
+    "dynamodb",
+    region_name="us-east-1",
+    endpoint_url=os.environ.get("DYNAMODB_ENDPOINT"),
+)
+
+# How many recent fights to keep inside the player item, 0 to keep none
+HISTORY_RING_SIZE = int(os.environ.get("HISTORY_RING_SIZE", 0))
+
+
+def record_fight(
+    table: dynamodb.Table,
+    player_token: str,
+    entry: Dict[str, Any],
+    fought_at: Optional[int] = None,
+) -> Dict:
+    """
+    Function to store one fight in a player's history
+
+    :param table: DynamoDB fight history table object
+    :param player_token: Player ID token linking player to database entry
+    :param entry: What happened in the fight
+    :param fought_at: Time of the fight in microseconds since the epoch,
+        defaults to now
+
+    :return: The stored record
+    """
+    record = fight_record(player_token, entry, fought_at)
+    table.put_item(Item=record)
+
+    return record
+
+
+def fight_record(
+    player_token: str, entry: Dict[str, Any], fought_at: Optional[int] = None
+) -> Dict:
+    """
+    Function to build the record of one fight in a player's history, for
+    writers that store it themselves, e.g. in a transaction
+
+    :param player_token: Player ID token linking player to database entry
+    :param entry: What happened in the fight
+    :param fought_at: Time of the fight in microseconds since the epoch,
+        defaults to now
+
+    :return: The record
+    """
+    if fought_at is None:
+        fought_at = time.time_ns() // 1000
+
+    return {"playerId": player_token, "fought_at": fought_at, "entry": entry}
+
+
+def get_fight_history(
+    table: dynamodb.Table,
+    player_token: str,
+    limit: int = 20,
+    start_key: Optional[Dict] = None,
+    newest_first: bool = True,
+) -> Tuple[List[Dict], Optional[Dict]]:
+    """
+    Function to read one page of a player's fight history
+
+    :param table: DynamoDB fight history table object
+    :param player_token: Player ID token linking player to database entry
+    :param limit: Maximum number of fights to return
+    :param start_key: Key returned with the previous page, None for the first page
+    :param newest_first: Whether to return the most recent fights first
+
+    :return: The page of fight records, and the key of the next page or None if
+        this was the last page
+    """
+    query_kwargs = dict(
+        KeyConditionExpression=Key("playerId").eq(player_token),
+        ScanIndexForward=not newest_first,
+        Limit=limit,
+    )
+    if start_key is not None:
+        query_kwargs["ExclusiveStartKey"] = start_key
+
+    response = table.query(**query_kwargs)
+
+    return response.get("Items", []), response.get("LastEvaluatedKey")
+
+
+def push_recent(history: List, entry: Any, size: int = HISTORY_RING_SIZE) -> List:
+    """
+    Function to add a fight to a player's in-item ring buffer of recent fights
+
+    :param history: The player's current ring buffer, oldest fight first
+    :param entry: The fight to add
+    :param size: How many fights the ring buffer holds
+
+    :return: The new ring buffer
+    """
+    if size <= 0:
+        return []
+
+    return (list(history) + [entry])[-size:]
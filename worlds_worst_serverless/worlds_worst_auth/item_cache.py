@@ -0,0 +1,201 @@
+"""
+In-process cache for DynamoDB items, kept alive across warm Lambda invocations
+and for the lifetime of the API gateway process.
+
+Entries are bounded by count and by (estimated) size in bytes, expire after a
+TTL and are evicted least-recently-used first. Every entry carries the item's
+``version`` so an older copy of an item can never replace a newer one.
+"""
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+def estimate_size(item: Any) -> int:
+    """
+    Rough size of an item in bytes, measured as its compact JSON encoding
+
+    :param item: The item to measure
+    :return: Estimated size in bytes
+    """
+    return len(json.dumps(item, separators=(",", ":"), default=str))
+
+
+class _Entry:
+    """
+    A single cached item
+    """
+
+    __slots__ = ("item", "version", "size", "expires_at")
+
+    def __init__(self, item: Any, version: int, size: int, expires_at: float):
+        self.item = item
+        self.version = version
+        self.size = size
+        self.expires_at = expires_at
+
+
+class ItemCache:
+    """
+    LRU cache with TTL expiry, bounded by entry count and total bytes
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        max_bytes: int = 4 * 1024 * 1024,
+        ttl: float = 30.0,
+        size_of: Callable[[Any], int] = estimate_size,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param max_entries: Maximum number of cached items
+        :param max_bytes: Maximum total estimated size of cached items
+        :param ttl: Seconds an entry stays valid after it was stored
+        :param size_of: Function estimating the size of an item in bytes
+        :param clock: Monotonic clock, injectable for testing
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._size_of = size_of
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # The async data-access API uses the cache from several threads
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_writes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry.expires_at > self._clock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Get a copy of a cached item, so callers are free to mutate it
+
+        :param key: Cache key
+        :return: Copy of the cached item, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry.expires_at <= self._clock():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry.item)
+
+    def version(self, key: Hashable) -> Optional[int]:
+        """
+        Version of a live cached item, without counting a hit or a miss
+
+        :param key: Cache key
+        :return: Cached version, or None if the key is not cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= self._clock():
+                return None
+            return entry.version
+
+    def put(
+        self, key: Hashable, item: Any, version: int = 0, ttl: Optional[float] = None
+    ) -> bool:
+        """
+        Store a copy of an item, unless a newer version is already cached
+
+        :param key: Cache key
+        :param item: Item to cache
+        :param version: Version of the item
+        :param ttl: Seconds this entry stays valid, if shorter than the cache's TTL
+        :return: True if the item was stored
+        """
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current.version > version:
+                self.stale_writes += 1
+                return False
+
+            size = self._size_of(item)
+            if size > self.max_bytes:
+                self.invalidate(key)
+                return False
+
+            if current is not None:
+                self._remove(key)
+
+            if ttl is None or ttl > self.ttl:
+                ttl = self.ttl
+            self._entries[key] = _Entry(
+                item=copy.deepcopy(item),
+                version=version,
+                size=size,
+                expires_at=self._clock() + ttl,
+            )
+            self._bytes += size
+
+            while (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+            return True
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Drop an item from the cache
+
+        :param key: Cache key
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        """
+        Drop every item from the cache, keeping the counters
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Counters for tuning the cache bounds
+
+        :return: Dictionary of cache counters
+        """
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "stale_writes": self.stale_writes,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
@@ -0,0 +1,116 @@
+"""
+Works out the smallest update that turns one version of a player into another
+
+A turn usually changes a handful of fields, so writing back only those keeps
+write units and request size down, especially for players with long lists.
+"""
+from typing import Any, Dict, List, Optional
+
+try:
+    from item_cache import estimate_size
+    from update_expressions import Append, REMOVE
+except ImportError:
+    from .item_cache import estimate_size
+    from .update_expressions import Append, REMOVE
+
+
+def diff_player(before: Dict, after: Dict, prefix: str = "") -> Dict[str, Any]:
+    """
+    Build an update map covering only the attributes that changed
+
+    :param before: Player data as it was loaded
+    :param after: Player data after the turn
+    :param prefix: Path of the dicts being compared, used when recursing
+    :return: Update map for update_expressions.compile_update, empty if nothing
+        changed
+    """
+    update_map = dict()
+
+    for key, new_value in after.items():
+        path = prefix + key
+        if key not in before:
+            update_map[path] = new_value
+            continue
+
+        old_value = before[key]
+        if old_value == new_value:
+            continue
+
+        if isinstance(old_value, dict) and isinstance(new_value, dict):
+            update_map.update(diff_player(old_value, new_value, prefix=path + "."))
+        elif isinstance(old_value, list) and isinstance(new_value, list):
+            update_map.update(diff_list(old_value, new_value, path))
+        else:
+            update_map[path] = new_value
+
+    for key in before:
+        if key not in after:
+            update_map[prefix + key] = REMOVE
+
+    return update_map
+
+
+def diff_list(before: List, after: List, path: str) -> Dict[str, Any]:
+    """
+    Update a list with an append or element removals when that sends fewer
+    bytes than writing the whole list
+
+    :param before: List as it was loaded
+    :param after: List after the turn
+    :param path: Path of the list attribute
+    :return: Update map for the list
+    """
+    full_write = {path: after}
+
+    if after[: len(before)] == before:
+        delta = {path: Append(after[len(before) :])}
+    else:
+        removed = _removed_indexes(before, after)
+        if removed is None:
+            return full_write
+        delta = {f"{path}[{index}]": REMOVE for index in removed}
+
+    if _update_size(delta) < _update_size(full_write):
+        return delta
+    return full_write
+
+
+def _removed_indexes(before: List, after: List) -> Optional[List[int]]:
+    """
+    Find which elements of before were removed to get after, if after is just
+    before with some elements taken out
+
+    :param before: List as it was loaded
+    :param after: List after the turn
+    :return: Indexes of before that were removed, or None if after isn't a
+        subsequence of before
+    """
+    removed = []
+    position = 0
+    for index, element in enumerate(before):
+        if position < len(after) and after[position] == element:
+            position += 1
+        else:
+            removed.append(index)
+
+    if position != len(after):
+        return None
+    return removed
+
+
+def _update_size(update_map: Dict[str, Any]) -> int:
+    """
+    Estimate how many bytes an update map costs to send
+
+    :param update_map: Update map for update_expressions.compile_update
+    :return: Estimated size in bytes
+    """
+    size = 0
+    for path, value in update_map.items():
+        size += len(path)
+        if value is REMOVE:
+            continue
+        if isinstance(value, Append):
+            value = value.values
+        size += estimate_size(value)
+    return size
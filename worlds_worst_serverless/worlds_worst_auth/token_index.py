@@ -0,0 +1,109 @@
+"""
+Reverse index from auth tokens to the players they belong to
+
+Tokens live in their own table, keyed by a SHA-256 digest of the token so the
+raw token is never stored, with an expires_at attribute that DynamoDB's TTL
+uses to delete expired tokens. authenticate keeps the index in step with the
+tokens it writes to player_data, so any handler can turn a token into a
+playerId with one keyed read, or a cache hit, instead of trusting the client.
+"""
+import hashlib
+import os
+import time
+from typing import Dict, Optional
+
+import boto3
+
+try:
+    from item_cache import ItemCache
+except ImportError:
+    from .item_cache import ItemCache
+
+dynamodb = boto3.resource(
+    "dynamodb",
+    region_name="us-east-1",
+    endpoint_url=os.environ.get("DYNAMODB_ENDPOINT"),
+)
+
+# How long an indexed token stays valid
+TOKEN_TTL = int(os.environ.get("AUTH_TOKEN_TTL", 24 * 60 * 60))
+
+token_cache = ItemCache(
+    max_entries=int(os.environ.get("TOKEN_CACHE_MAX_ENTRIES", 1024)),
+    max_bytes=int(os.environ.get("TOKEN_CACHE_MAX_BYTES", 1024 * 1024)),
+    ttl=float(os.environ.get("TOKEN_CACHE_TTL", 300)),
+)
+
+
+def token_digest(auth_token: str) -> str:
+    """
+    Key under which a token is stored
+
+    :param auth_token: Web token ID of user
+    :return: Hex SHA-256 digest of the token
+    """
+    return hashlib.sha256(auth_token.encode("utf-8")).hexdigest()
+
+
+def index_token(
+    table: dynamodb.Table, auth_token: str, player_token: str, ttl: int = TOKEN_TTL
+) -> Dict:
+    """
+    Function to point a token at a player
+
+    :param table: DynamoDB token table object
+    :param auth_token: Web token ID of user
+    :param player_token: Player ID token linking player to database entry
+    :param ttl: Seconds until the token expires
+
+    :return: The stored token record
+    """
+    digest = token_digest(auth_token)
+    record = {
+        "token_digest": digest,
+        "playerId": player_token,
+        "expires_at": int(time.time()) + ttl,
+    }
+    table.put_item(Item=record)
+    token_cache.put(digest, player_token, ttl=ttl)
+
+    return record
+
+
+def revoke_token(table: dynamodb.Table, auth_token: str) -> None:
+    """
+    Function to remove a token from the index
+
+    :param table: DynamoDB token table object
+    :param auth_token: Web token ID of user
+    """
+    digest = token_digest(auth_token)
+    token_cache.invalidate(digest)
+    table.delete_item(Key={"token_digest": digest})
+
+
+def resolve_token(table: dynamodb.Table, auth_token: str) -> Optional[str]:
+    """
+    Function to find the player a token belongs to
+
+    :param table: DynamoDB token table object
+    :param auth_token: Web token ID of user
+
+    :return: The player's playerId, or None if the token is unknown or expired
+    """
+    digest = token_digest(auth_token)
+    player_token = token_cache.get(digest)
+    if player_token is not None:
+        return player_token
+
+    record = table.get_item(Key={"token_digest": digest}).get("Item")
+    if record is None:
+        return None
+
+    # TTL deletes happen lazily, so expired tokens can still be read for a while
+    remaining = int(record["expires_at"]) - time.time()
+    if remaining <= 0:
+        return None
+
+    token_cache.put(digest, record["playerId"], ttl=remaining)
+    return record["playerId"]
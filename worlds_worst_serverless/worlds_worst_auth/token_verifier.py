@@ -0,0 +1,156 @@
+"""
+Verifies auth tokens (JWTs) locally, without calling out to an identity provider
+
+Signing keys come from AUTH_SIGNING_KEYS, a JSON object mapping key IDs to
+secrets, or from the JSON file named by AUTH_SIGNING_KEYS_FILE. Tokens whose
+header has a "kid" are checked against that key, other tokens against every key.
+Only the HMAC algorithms (HS256, HS384, HS512) are supported, since they need
+nothing outside the standard library.
+
+Tokens must have an exp claim, so none is good forever. Parsed keys are cached
+until the configuration changes, and verified tokens are cached until they
+expire, so re-verifying a session's token is a dict lookup.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+try:
+    from item_cache import ItemCache
+except ImportError:
+    from .item_cache import ItemCache
+
+ALGORITHMS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+
+# Seconds of clock skew to allow when checking exp and nbf
+LEEWAY = int(os.environ.get("AUTH_TOKEN_LEEWAY", 30))
+
+verified_tokens = ItemCache(
+    max_entries=int(os.environ.get("VERIFIED_TOKEN_CACHE_MAX_ENTRIES", 1024)),
+    max_bytes=int(os.environ.get("VERIFIED_TOKEN_CACHE_MAX_BYTES", 1024 * 1024)),
+    ttl=float(os.environ.get("VERIFIED_TOKEN_CACHE_TTL", 3600)),
+)
+
+
+class InvalidTokenError(Exception):
+    """
+    Raised when a token is malformed, badly signed, expired, never expires or is
+    not yet valid
+    """
+
+
+def signing_keys() -> Dict[str, bytes]:
+    """
+    Function to get the configured signing keys
+
+    :return: Dictionary mapping key IDs to secrets
+    """
+    path = os.environ.get("AUTH_SIGNING_KEYS_FILE")
+    modified = os.stat(path).st_mtime if path else None
+    return _parse_signing_keys(os.environ.get("AUTH_SIGNING_KEYS"), path, modified)
+
+
+@lru_cache(maxsize=4)
+def _parse_signing_keys(
+    keys_json: Optional[str], path: Optional[str], modified: Optional[float]
+) -> Dict[str, bytes]:
+    """
+    Parse signing keys, cached by where they came from and when the file changed
+
+    :param keys_json: Contents of AUTH_SIGNING_KEYS
+    :param path: Value of AUTH_SIGNING_KEYS_FILE
+    :param modified: Modification time of the keys file
+    :return: Dictionary mapping key IDs to secrets
+    """
+    keys = dict()
+    if path:
+        with open(path) as keys_file:
+            keys.update(json.load(keys_file))
+    if keys_json:
+        keys.update(json.loads(keys_json))
+
+    return {kid: secret.encode("utf-8") for kid, secret in keys.items()}
+
+
+def verify_token(token: str) -> Dict:
+    """
+    Function to check a token's signature and lifetime
+
+    :param token: The JWT to check
+    :return: The token's claims
+    """
+    if not isinstance(token, str):
+        raise InvalidTokenError("Token must be a string")
+
+    cache_key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    claims = verified_tokens.get(cache_key)
+    if claims is not None:
+        return claims
+
+    header, claims, signing_input, signature = _split_token(token)
+
+    digest = ALGORITHMS.get(header.get("alg"))
+    if digest is None:
+        raise InvalidTokenError(f"Unsupported algorithm {header.get('alg')!r}")
+
+    keys = signing_keys()
+    if "kid" in header:
+        candidates = [keys[header["kid"]]] if header["kid"] in keys else []
+    else:
+        candidates = list(keys.values())
+
+    if not any(
+        hmac.compare_digest(hmac.new(key, signing_input, digest).digest(), signature)
+        for key in candidates
+    ):
+        raise InvalidTokenError("Bad signature")
+
+    now = time.time()
+    if "exp" not in claims:
+        raise InvalidTokenError("Token has no exp claim")
+    if now > claims["exp"] + LEEWAY:
+        raise InvalidTokenError("Token has expired")
+    if "nbf" in claims and now < claims["nbf"] - LEEWAY:
+        raise InvalidTokenError("Token is not valid yet")
+
+    verified_tokens.put(cache_key, claims, ttl=claims["exp"] + LEEWAY - now)
+    return claims
+
+
+def _split_token(token: str) -> Tuple[Dict, Dict, bytes, bytes]:
+    """
+    Split a token into its decoded parts
+
+    :param token: The JWT to split
+    :return: Header, claims, signing input and signature
+    """
+    try:
+        header_part, claims_part, signature_part = token.split(".")
+        header = json.loads(_b64decode(header_part))
+        claims = json.loads(_b64decode(claims_part))
+        signature = _b64decode(signature_part)
+    except (AttributeError, ValueError) as e:
+        raise InvalidTokenError(f"Malformed token: {e}")
+
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        raise InvalidTokenError("Malformed token")
+    for claim in ("exp", "nbf"):
+        if claim in claims and not isinstance(claims[claim], (int, float)):
+            raise InvalidTokenError(f"Malformed {claim} claim")
+
+    return header, claims, f"{header_part}.{claims_part}".encode("ascii"), signature
+
+
+def _b64decode(part: str) -> bytes:
+    """
+    Decode unpadded URL-safe base64, as used by JWTs
+
+    :param part: One part of a token
+    :return: Decoded bytes
+    """
+    return base64.urlsafe_b64decode(part + "=" * (-len(part) % 4))
@@ -0,0 +1,185 @@
+"""
+Compiles update maps into DynamoDB UpdateExpressions
+
+An update map maps attribute paths to what should happen to them:
+
+    {
+        "hit_points": 400,                         # SET to a value
+        "ex": Increment(50),                       # ex += 50
+        "status_effects": Append([["prone", 1]]),  # append to a list
+        "status_effects[0]": REMOVE,               # remove an attribute/element
+        "stats.wins": Increment(1),                # nested paths work too
+    }
+
+Every attribute name goes through ExpressionAttributeNames, so reserved words
+like "name" and "action" are safe. The expression string only depends on the
+shape of the update (its paths and operations), so compiled expressions are
+cached by shape and repeated update patterns skip the string building.
+"""
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+SET = "set"
+INCREMENT = "increment"
+APPEND = "append"
+REMOVE_OP = "remove"
+
+_PATH_SEGMENT = re.compile(r"([^.\[\]]+)((?:\[\d+\])*)")
+
+
+class Increment(NamedTuple):
+    """
+    Add amount to a number, treating a missing attribute as 0
+    """
+
+    amount: Any
+
+
+class Append(NamedTuple):
+    """
+    Append values to the end of a list, treating a missing attribute as []
+    """
+
+    values: list
+
+
+class _Remove:
+    """
+    Remove an attribute, or an element of a list
+    """
+
+    def __repr__(self) -> str:
+        return "REMOVE"
+
+
+REMOVE = _Remove()
+
+
+class CompiledUpdate(NamedTuple):
+    """
+    The parts of an update_item call that only depend on the update's shape
+    """
+
+    update_expression: str
+    attribute_names: Dict[str, str]
+    # (placeholder, index of the operation in the shape) for each bound value
+    value_slots: Tuple[Tuple[str, int], ...]
+    constant_values: Dict[str, Any]
+
+
+def operation_of(value: Any) -> str:
+    """
+    Work out which operation an update map value stands for
+
+    :param value: Value from an update map
+    :return: One of SET, INCREMENT, APPEND or REMOVE_OP
+    """
+    if value is REMOVE:
+        return REMOVE_OP
+    elif isinstance(value, Increment):
+        return INCREMENT
+    elif isinstance(value, Append):
+        return APPEND
+    return SET
+
+
+def split_path(path: str) -> List[Tuple[str, str]]:
+    """
+    Split an attribute path into (name, list indexes) segments
+
+    :param path: Attribute path such as "player_data.status_effects[0]"
+    :return: List of segments such as [("player_data", ""), ("status_effects", "[0]")]
+    """
+    segments = _PATH_SEGMENT.findall(path)
+    if not segments or ".".join(name + index for name, index in segments) != path:
+        raise ValueError(f"Invalid attribute path: {path!r}")
+    return segments
+
+
+@lru_cache(maxsize=256)
+def compile_shape(shape: Tuple[Tuple[str, str], ...]) -> CompiledUpdate:
+    """
+    Build the expression for an update shape. Results are cached by shape.
+
+    :param shape: Tuple of (attribute path, operation) pairs
+    :return: The compiled update
+    """
+    names = dict()
+    placeholders = dict()
+    set_actions = []
+    remove_actions = []
+    value_slots = []
+    constant_values = dict()
+
+    for position, (path, operation) in enumerate(shape):
+        # Reuse one name placeholder per distinct attribute name
+        parts = []
+        for name, index in split_path(path):
+            if name not in placeholders:
+                placeholders[name] = f"#n{len(placeholders)}"
+                names[placeholders[name]] = name
+            parts.append(placeholders[name] + index)
+        attribute = ".".join(parts)
+
+        if operation == REMOVE_OP:
+            remove_actions.append(attribute)
+            continue
+
+        value = f":v{position}"
+        value_slots.append((value, position))
+        if operation == SET:
+            set_actions.append(f"{attribute} = {value}")
+        elif operation == INCREMENT:
+            constant_values[":zero"] = 0
+            set_actions.append(
+                f"{attribute} = if_not_exists({attribute}, :zero) + {value}"
+            )
+        elif operation == APPEND:
+            constant_values[":empty_list"] = []
+            set_actions.append(
+                f"{attribute} = list_append("
+                f"if_not_exists({attribute}, :empty_list), {value})"
+            )
+        else:
+            raise ValueError(f"Unknown update operation: {operation!r}")
+
+    clauses = []
+    if set_actions:
+        clauses.append("SET " + ", ".join(set_actions))
+    if remove_actions:
+        clauses.append("REMOVE " + ", ".join(remove_actions))
+
+    return CompiledUpdate(
+        update_expression=" ".join(clauses),
+        attribute_names=names,
+        value_slots=tuple(value_slots),
+        constant_values=constant_values,
+    )
+
+
+def compile_update(update_map: Dict[str, Any]) -> Tuple[str, Dict, Dict]:
+    """
+    Turn an update map into the arguments of a DynamoDB update_item call
+
+    :param update_map: Dictionary mapping attribute paths to values or operations
+    :return: UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues
+    """
+    operations = list(update_map.items())
+    shape = tuple((path, operation_of(value)) for path, value in operations)
+    compiled = compile_shape(shape)
+
+    attribute_values = dict(compiled.constant_values)
+    for placeholder, position in compiled.value_slots:
+        value = operations[position][1]
+        if isinstance(value, Increment):
+            value = value.amount
+        elif isinstance(value, Append):
+            value = list(value.values)
+        attribute_values[placeholder] = value
+
+    return (
+        compiled.update_expression,
+        dict(compiled.attribute_names),
+        attribute_values,
+    )
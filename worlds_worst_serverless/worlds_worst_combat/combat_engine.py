@@ -0,0 +1,238 @@
+"""
+The rules of a combat turn, as a library so the combat handler and anything
+else running turns (like the operator) resolve them the same way
+
+The abilities and the default rules are loaded once per container. Every turn
+works on its own copy of the rules, since status effects change them.
+"""
+import copy
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from player_data import Player
+    from combat_utilities import (
+        calculate_winner,
+        check_dead,
+        apply_status,
+        find_ability,
+        apply_ability_effects,
+        apply_enhancements,
+        apply_ex,
+    )
+except ImportError:
+    from .player_data import Player
+    from .combat_utilities import (
+        calculate_winner,
+        check_dead,
+        apply_status,
+        find_ability,
+        apply_ability_effects,
+        apply_enhancements,
+        apply_ex,
+    )
+
+# The default combat rules
+RULES = {
+    "area": {"beats": ["disrupt", "dodge"], "loses": ["attack", "block"]},
+    "attack": {"beats": ["disrupt", "area"], "loses": ["block", "dodge"]},
+    "block": {"beats": ["area", "attack"], "loses": ["disrupt", "dodge"]},
+    "disrupt": {"beats": ["block", "dodge"], "loses": ["attack", "area"]},
+    "dodge": {"beats": ["attack", "block"], "loses": ["area", "disrupt"]},
+}
+
+
+def load_abilities(path_to_file: Path) -> List[Dict]:
+    """
+    Function to read the abilities data
+
+    :param path_to_file: Path to abilities.json
+    :return: List of abilities
+    """
+    with path_to_file.open() as json_file:
+        return json.load(json_file)
+
+
+ABILITIES = load_abilities(Path(__file__).parent / "abilities.json")
+
+
+def resolve_turn(
+    left_player: Player, right_player: Player, abilities: Optional[List[Dict]] = None
+) -> Tuple[Player, Player, List[str]]:
+    """
+    Function to play one turn between two players
+
+    :param left_player: Player with priority on ties
+    :param right_player: The other player
+    :param abilities: Abilities data, defaults to abilities.json
+    :return: Updated left and right players, and the series of events as messages
+    """
+    if abilities is None:
+        abilities = ABILITIES
+    rules = copy.deepcopy(RULES)
+
+    # Store the series of events
+    message = []
+
+    # Apply status effects
+    left_player, right_player, rules, message = apply_status(
+        left_player, right_player, rules, message
+    )
+
+    # Check if anyone died from added effects
+    if check_dead(left_player.hit_points, right_player.hit_points):
+        # If dead, the turn ends immediately, do not do combat
+        if left_player.hit_points <= 0:
+            message.append(f"{left_player.name} died to their status effects.")
+        else:
+            message.append(f"{right_player.name} died to their status effects.")
+        return left_player, right_player, message
+
+    # Determine the winner
+    message.append(f"{left_player.name} uses {left_player.action}!")
+    message.append(f"{right_player.name} uses {right_player.action}!")
+    outcome = calculate_winner(
+        rules=rules, left_attack=left_player.action, right_attack=right_player.action
+    )
+
+    # Do combat effects based upon the outcome
+    if outcome == "left_wins":
+        message.append(f"{left_player.name} wins.")
+        # Update EX meters
+        left_player.ex += 50
+        right_player.ex += 100
+
+        # Find the ability to use
+        ability_to_use = find_ability(
+            abilities, left_player.character_class, left_player.action
+        )
+
+        # Apply the effects
+        apply_ability_effects(
+            ability=ability_to_use, target=right_player, self=left_player
+        )
+
+        # If enhanced, apply the enhancements
+        if left_player.enhanced is True:
+            if ability_to_use["enhancements"]:
+                message.append(
+                    f"{left_player.name} enhanced {left_player.action}! "
+                    f"Inflicting {ability_to_use['enhancements'][0]['name']} on"
+                    f" {ability_to_use['enhancements'][0]['target']} for"
+                    f" {ability_to_use['enhancements'][0]['value']} turn(s)."
+                )
+                apply_enhancements(
+                    ability=ability_to_use, target=right_player, self=left_player
+                )
+            else:
+                message.append(
+                    f"{left_player.character_class}s cannot enhance "
+                    f"{left_player.action}!"
+                )
+
+    elif outcome == "right_wins":
+        message.append(f"{right_player.name} wins.")
+        # Update EX meters
+        left_player.ex += 100
+        right_player.ex += 50
+
+        # Find the ability to use
+        ability_to_use = find_ability(
+            abilities, right_player.character_class, right_player.action
+        )
+
+        # Apply the effects
+        apply_ability_effects(
+            ability=ability_to_use, target=left_player, self=right_player
+        )
+
+        # If enhanced, apply the enhancements
+        if right_player.enhanced is True:
+            if ability_to_use["enhancements"]:
+                message.append(
+                    f"{right_player.name} enhanced {right_player.action}! "
+                    f"Inflicting {ability_to_use['enhancements'][0]['name']} on"
+                    f" {ability_to_use['enhancements'][0]['target']} for"
+                    f" {ability_to_use['enhancements'][0]['value']} turn(s)."
+                )
+                apply_enhancements(
+                    ability=ability_to_use, target=left_player, self=right_player
+                )
+            else:
+                message.append(
+                    f"{right_player.character_class}s cannot enhance "
+                    f"{right_player.action}!"
+                )
+    else:
+        message.append(f"{left_player.name} and {right_player.name} tie.")
+        # Update EX meters
+        left_player.ex += 150
+        right_player.ex += 150
+
+        # Find both abilities to use
+        left_ability = find_ability(
+            abilities, left_player.character_class, left_player.action
+        )
+        right_ability = find_ability(
+            abilities, right_player.character_class, right_player.action
+        )
+        print(f"Using abilities: {right_ability}, {left_ability}")
+
+        # Apply the effects, with left getting priority
+        apply_ability_effects(
+            ability=left_ability, target=right_player, self=left_player
+        )
+        apply_ability_effects(
+            ability=right_ability, target=left_player, self=right_player
+        )
+
+        print(
+            f"After applied effects: left_player hp = {left_player.hit_points},"
+            f" right_player hp={right_player.hit_points}"
+        )
+
+        # If enhanced, apply the enhancements, with left getting priority
+        if left_player.enhanced is True:
+            if left_ability["enhancements"]:
+                message.append(
+                    f"{left_player.name} enhanced {left_player.action}! "
+                    f"Inflicting {left_ability['enhancements'][0]['name']} on"
+                    f" {left_ability['enhancements'][0]['target']} for"
+                    f" {left_ability['enhancements'][0]['value']} turn(s)."
+                )
+                apply_enhancements(
+                    ability=left_ability, target=right_player, self=left_player
+                )
+            else:
+                message.append(
+                    f"{left_player.name} tried to enhance {left_player.action}, "
+                    f"but it can't be enhanced. Nothing happened!"
+                )
+        if right_player.enhanced is True:
+            if right_ability["enhancements"]:
+                message.append(
+                    f"{right_player.name} enhanced {right_player.action}! "
+                    f"Inflicting {right_ability['enhancements'][0]['name']} on"
+                    f" {right_ability['enhancements'][0]['target']} for"
+                    f" {right_ability['enhancements'][0]['value']} turn(s)."
+                )
+                apply_enhancements(
+                    ability=right_ability, target=left_player, self=right_player
+                )
+            else:
+                message.append(
+                    f"{right_player.name} tried to enhance {right_player.action}, "
+                    f"but it can't be enhanced. Nothing happened!"
+                )
+
+    if left_player.ex == left_player.max_ex:
+        apply_ex(left_player)
+
+    if right_player.ex == right_player.max_ex:
+        apply_ex(right_player)
+
+    left_player.enhanced = False
+    right_player.enhanced = False
+
+    return left_player, right_player, message
@@ -3,251 +3,140 @@ try:
 except ImportError:
     pass
 
-import json
-
-from pathlib import Path
+import contextlib
+import io
 from dataclasses import asdict
 from typing import Dict, Any
 
 try:
     from player_data import Player
-    from combat_utilities import (
-        calculate_winner,
-        check_dead,
-        apply_status,
-        find_ability,
-        apply_ability_effects,
-        apply_enhancements,
-        apply_ex,
-    )
+    from combat_engine import ABILITIES, RULES, resolve_turn
+    from wire_format import ACTIONS, MSGPACK, binary_body, read_body, wants_binary
+    from middleware import Schema, content_headers, encode_json, lambda_handler
+    from idempotency import IdempotencyStore
 except ImportError:
     from .player_data import Player
-    from .combat_utilities import (
-        calculate_winner,
-        check_dead,
-        apply_status,
-        find_ability,
-        apply_ability_effects,
-        apply_enhancements,
-        apply_ex,
+    from .combat_engine import ABILITIES, RULES, resolve_turn
+    from .wire_format import ACTIONS, MSGPACK, binary_body, read_body, wants_binary
+    from worlds_worst_serverless.worlds_worst_middleware.middleware import (
+        Schema,
+        content_headers,
+        encode_json,
+        lambda_handler,
+    )
+    from worlds_worst_serverless.worlds_worst_middleware.idempotency import (
+        IdempotencyStore,
     )
 
 LambdaDict = Dict[str, Any]
 
+# Actions the rules don't know would only fail inside resolve_turn
+PLAYER_SCHEMA = Schema.from_dataclass(Player, action=frozenset(RULES))
+COMBAT_SCHEMA = Schema(
+    {"Player1": PLAYER_SCHEMA, "Player2": PLAYER_SCHEMA},
+    optional={"include_history": bool},
+)
+MSGPACK_HEADERS = content_headers(MSGPACK)
+# Retried turns get the first response instead of being played again
+IDEMPOTENCY = IdempotencyStore()
 
-def do_combat(event: LambdaDict, context: LambdaDict) -> LambdaDict:
+
+def player_payload(player: Player, include_history: bool = False) -> Dict:
     """
-    Function do combat
+    Function to turn a Player into the dict sent back to the client. History
+    lives in the fight history table, so it is left out unless asked for.
 
-    :param event: Input AWS Lambda event dict
-    :param context: Input AWS Lambda context dict
-    :return: Output AWS Lambda dict
+    :param player: The player to send back
+    :param include_history: Whether to include the player's recent history
+    :return: Player dict
     """
-    # Decode the request
-    request_body = event.get("body")
-    if type(request_body) == str:
-        request_body = json.loads(request_body)
-    left_player = Player(**request_body["Player1"])
-    right_player = Player(**request_body["Player2"])
+    payload = asdict(player)
+    if not include_history:
+        del payload["history"]
+    return payload
 
-    # Store the series of events
-    message = []
-
-    # Read in the abilities data
-    path_to_file = Path(__file__).parent / "abilities.json"
-    with path_to_file.open() as json_file:
-        abilities = json.load(json_file)
-
-    # Define the default combat rules
-    rules = {
-        "area": {"beats": ["disrupt", "dodge"], "loses": ["attack", "block"]},
-        "attack": {"beats": ["disrupt", "area"], "loses": ["block", "dodge"]},
-        "block": {"beats": ["area", "attack"], "loses": ["disrupt", "dodge"]},
-        "disrupt": {"beats": ["block", "dodge"], "loses": ["attack", "area"]},
-        "dodge": {"beats": ["attack", "block"], "loses": ["area", "disrupt"]},
-    }
 
-    # Apply status effects
-    left_player, right_player, rules, message = apply_status(left_player,
-                                                             right_player,
-                                                             rules,
-                                                             message)
-
-    # Check if anyone died from added effects
-    if check_dead(left_player.hit_points, right_player.hit_points):
-        # If dead, return the combat results immediately, do not do combat
-        if left_player.hit_points <= 0:
-            message.append(f"{left_player.name} died to their status effects.")
-        else:
-            message.append(f"{right_player.name} died to their status effects.")
-        combat_results = json.dumps(
-            {
-                "Player1": asdict(left_player),
-                "Player2": asdict(right_player),
-                "message": message,
-            }
-        )
-        result = {
+def encode_combat(event: LambdaDict, body: Dict) -> LambdaDict:
+    """
+    Function to encode combat results in the format the client asked for
+
+    :param event: Input AWS Lambda event dict
+    :param body: Combat results
+    :return: Output AWS Lambda dict
+    """
+    if wants_binary(event):
+        return {
             "statusCode": 200,
-            "body": combat_results,
-            "headers": {"Access-Control-Allow-Origin": "*"},
+            "body": binary_body(body),
+            "isBase64Encoded": True,
+            "headers": MSGPACK_HEADERS,
         }
-        return result
+    return encode_json(event, body)
 
-    # Determine the winner
-    message.append(f"{left_player.name} uses {left_player.action}!")
-    message.append(f"{right_player.name} uses {right_player.action}!")
-    outcome = calculate_winner(
-        rules=rules, left_attack=left_player.action, right_attack=right_player.action
-    )
 
-    # Do combat effects based upon the outcome
-    if outcome == "left_wins":
-        message.append(f"{left_player.name} wins.")
-        # Update EX meters
-        left_player.ex += 50
-        right_player.ex += 100
-
-        # Find the ability to use
-        ability_to_use = find_ability(
-            abilities, left_player.character_class, left_player.action
-        )
-
-        # Apply the effects
-        apply_ability_effects(
-            ability=ability_to_use, target=right_player, self=left_player
-        )
-
-        # If enhanced, apply the enhancements
-        if left_player.enhanced is True:
-            if ability_to_use['enhancements']:
-                message.append(
-                    f"{left_player.name} enhanced {left_player.action}! "
-                    f"Inflicting {ability_to_use['enhancements'][0]['name']} on"
-                    f" {ability_to_use['enhancements'][0]['target']} for"
-                    f" {ability_to_use['enhancements'][0]['value']} turn(s)."
-                )
-                apply_enhancements(
-                    ability=ability_to_use, target=right_player, self=left_player
-                )
-            else:
-                message.append(f"{left_player.character_class}s cannot enhance "
-                               f"{left_player.action}!")
-
-    elif outcome == "right_wins":
-        message.append(f"{right_player.name} wins.")
-        # Update EX meters
-        left_player.ex += 100
-        right_player.ex += 50
-
-        # Find the ability to use
-        ability_to_use = find_ability(
-            abilities, right_player.character_class, right_player.action
-        )
-
-        # Apply the effects
-        apply_ability_effects(
-            ability=ability_to_use, target=left_player, self=right_player
-        )
-
-        # If enhanced, apply the enhancements
-        if right_player.enhanced is True:
-            if ability_to_use['enhancements']:
-                message.append(
-                    f"{right_player.name} enhanced {right_player.action}! "
-                    f"Inflicting {ability_to_use['enhancements'][0]['name']} on"
-                    f" {ability_to_use['enhancements'][0]['target']} for"
-                    f" {ability_to_use['enhancements'][0]['value']} turn(s)."
-                )
-                apply_enhancements(
-                    ability=ability_to_use, target=left_player, self=right_player
-                )
-            else:
-                message.append(f"{right_player.character_class}s cannot enhance "
-                               f"{right_player.action}!")
-    else:
-        message.append(f"{left_player.name} and {right_player.name} tie.")
-        # Update EX meters
-        left_player.ex += 150
-        right_player.ex += 150
-
-        # Find both abilities to use
-        left_ability = find_ability(
-            abilities, left_player.character_class, left_player.action
-        )
-        right_ability = find_ability(
-            abilities, right_player.character_class, right_player.action
-        )
-        print(f"Using abilities: {right_ability}, {left_ability}")
-
-        # Apply the effects, with left getting priority
-        apply_ability_effects(
-            ability=left_ability, target=right_player, self=left_player
-        )
-        apply_ability_effects(
-            ability=right_ability, target=left_player, self=right_player
-        )
-
-        print(
-            f"After applied effects: left_player hp = {left_player.hit_points},"
-            f" right_player hp={right_player.hit_points}"
-        )
-
-        # If enhanced, apply the enhancements, with left getting priority
-        if left_player.enhanced is True:
-            if left_ability["enhancements"]:
-                message.append(
-                    f"{left_player.name} enhanced {left_player.action}! "
-                    f"Inflicting {left_ability['enhancements'][0]['name']} on"
-                    f" {left_ability['enhancements'][0]['target']} for"
-                    f" {left_ability['enhancements'][0]['value']} turn(s)."
-                )
-                apply_enhancements(
-                    ability=left_ability, target=right_player, self=left_player
-                )
-            else:
-                message.append(
-                    f"{left_player.name} tried to enhance {left_player.action}, "
-                    f"but it can't be enhanced. Nothing happened!"
-                )
-        if right_player.enhanced is True:
-            if right_ability["enhancements"]:
-                message.append(
-                    f"{right_player.name} enhanced {right_player.action}! "
-                    f"Inflicting {right_ability['enhancements'][0]['name']} on"
-                    f" {right_ability['enhancements'][0]['target']} for"
-                    f" {right_ability['enhancements'][0]['value']} turn(s)."
-                )
-                apply_enhancements(
-                    ability=right_ability, target=left_player, self=right_player
+def warm_up() -> Dict:
+    """
+    Function to run everything a first turn would, for warm-up pings: a practice
+    turn with every action, and connecting to the idempotency table
+
+    :return: What was warmed up
+    """
+    # The combat engine prints every step, which a ping doesn't need to log
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, action in enumerate(ACTIONS):
+            left, right = (
+                Player(
+                    name=name,
+                    character_class="dreamer",
+                    max_hit_points=500,
+                    max_ex=1000,
+                    hit_points=500,
+                    ex=0,
+                    status_effects=[],
+                    action=player_action,
+                    enhanced=False,
                 )
-            else:
-                message.append(
-                    f"{right_player.name} tried to enhance {right_player.action}, "
-                    f"but it can't be enhanced. Nothing happened!"
+                for name, player_action in (
+                    ("warm-up-left", action),
+                    ("warm-up-right", ACTIONS[(i + 1) % len(ACTIONS)]),
                 )
+            )
+            resolve_turn(left, right)
+        binary_body({"Player1": player_payload(left), "message": []})
+
+    return {
+        "abilities": len(ABILITIES),
+        "practice_turns": len(ACTIONS),
+        "idempotency_table": IDEMPOTENCY.warm_up(),
+    }
 
-    if left_player.ex == left_player.max_ex:
-        apply_ex(left_player)
 
-    if right_player.ex == right_player.max_ex:
-        apply_ex(right_player)
+@lambda_handler(
+    schema=COMBAT_SCHEMA,
+    decode=read_body,
+    encode=encode_combat,
+    compress=True,
+    idempotency=IDEMPOTENCY,
+    warm_up=warm_up,
+)
+def do_combat(request_body: Dict, event: LambdaDict, context: LambdaDict) -> Dict:
+    """
+    Function do combat
 
-    left_player.enhanced = False
-    right_player.enhanced = False
+    :param request_body: Both players, decoded from JSON or MessagePack
+    :param event: Input AWS Lambda event dict
+    :param context: Input AWS Lambda context dict
+    :return: Combat results
+    """
+    left_player = Player(**request_body["Player1"])
+    right_player = Player(**request_body["Player2"])
+    include_history = request_body.get("include_history", False) is True
 
-    # Return the combat results
-    combat_results = json.dumps(
-        {
-            "Player1": asdict(left_player),
-            "Player2": asdict(right_player),
-            "message": message,
-        }
-    )
+    # Play the turn
+    left_player, right_player, message = resolve_turn(left_player, right_player)
 
-    result = {
-        "statusCode": 200,
-        "body": combat_results,
-        "headers": {"Access-Control-Allow-Origin": "*"},
+    return {
+        "Player1": player_payload(left_player, include_history),
+        "Player2": player_payload(right_player, include_history),
+        "message": message,
     }
-    return result
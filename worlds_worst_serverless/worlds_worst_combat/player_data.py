@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 @dataclass
@@ -16,7 +16,9 @@ class Player:
     status_effects: list
     action: str
     enhanced: bool
-    auth_token: str
-    context: str
-    target: str
-    history: list
+    # Players stored before these were added don't have them
+    auth_token: str = ""
+    context: str = "home"
+    target: str = ""
+    # Recent fights only, full history lives in the fight history table
+    history: list = field(default_factory=list)
@@ -0,0 +1,401 @@
+"""
+Compact binary bodies for clients that ask for them, JSON for everyone else
+
+A request with a MessagePack Content-Type is read as MessagePack, and one that
+sends or accepts MessagePack gets MessagePack back, base64-encoded with
+isBase64Encoded as the Lambda proxy contract wants. Players travel as arrays in
+Player field order instead of maps, and character classes, actions and status
+effects as their index in the tables below. Names missing from a table travel
+as strings, so new ones work before they get a code.
+
+The tables are part of the wire format: only ever append to them.
+
+MessagePack is small enough to encode with the standard library, so the
+functions here don't need a package in the Lambda bundle.
+"""
+import base64
+import json
+import struct
+from dataclasses import fields
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+try:
+    from player_data import Player
+except ImportError:
+    from .player_data import Player
+
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = frozenset((MSGPACK, "application/x-msgpack", "application/vnd.msgpack"))
+
+CLASSES = (
+    "dreamer",
+    "chemist",
+    "hacker",
+    "cloistered",
+    "architect",
+    "photonic",
+    "creator",
+    "chosen",
+)
+ACTIONS = ("attack", "block", "area", "disrupt", "dodge")
+EFFECTS = (
+    "prone",
+    "disorient",
+    "haste",
+    "poison",
+    "counter_attack",
+    "counter_disrupt",
+    "pistol",
+    "rifle",
+    "shotgun",
+    "rocket_launcher",
+    "anti_attack",
+    "anti_area",
+    "lag",
+    "absorb",
+    "buff_attack",
+    "connected",
+    "enhancement_sickness",
+    "hello_world",
+)
+CODES = {
+    table: {name: code for code, name in enumerate(table)}
+    for table in (CLASSES, ACTIONS, EFFECTS)
+}
+
+PLAYER_FIELDS = tuple(player_field.name for player_field in fields(Player))
+# Body keys holding a player
+PLAYER_KEYS = ("Player", "Player1", "Player2")
+
+
+class WireFormatError(ValueError):
+    """
+    Raised when a binary body can't be decoded
+    """
+
+
+def pack(value: Any) -> bytes:
+    """
+    Function to encode a value as MessagePack
+
+    :param value: None, bools, ints, floats, strings, bytes, lists, tuples and
+        dicts of them
+    :return: MessagePack bytes
+    """
+    chunks = []
+    _pack(value, chunks)
+    return b"".join(chunks)
+
+
+def _pack(value: Any, chunks: List[bytes]) -> None:
+    if value is None:
+        chunks.append(b"\xc0")
+    elif value is True:
+        chunks.append(b"\xc3")
+    elif value is False:
+        chunks.append(b"\xc2")
+    elif isinstance(value, int):
+        if 0 <= value < 0x80:
+            chunks.append(struct.pack("B", value))
+        elif -0x20 <= value < 0:
+            chunks.append(struct.pack("b", value))
+        elif value > 0:
+            if value < 1 << 8:
+                chunks.append(struct.pack(">BB", 0xCC, value))
+            elif value < 1 << 16:
+                chunks.append(struct.pack(">BH", 0xCD, value))
+            elif value < 1 << 32:
+                chunks.append(struct.pack(">BI", 0xCE, value))
+            else:
+                chunks.append(struct.pack(">BQ", 0xCF, value))
+        else:
+            if value >= -(1 << 7):
+                chunks.append(struct.pack(">Bb", 0xD0, value))
+            elif value >= -(1 << 15):
+                chunks.append(struct.pack(">Bh", 0xD1, value))
+            elif value >= -(1 << 31):
+                chunks.append(struct.pack(">Bi", 0xD2, value))
+            else:
+                chunks.append(struct.pack(">Bq", 0xD3, value))
+    elif isinstance(value, float):
+        chunks.append(struct.pack(">Bd", 0xCB, value))
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        _pack_header(len(data), chunks, 0xA0, 32, (0xD9, 0xDA, 0xDB))
+        chunks.append(data)
+    elif isinstance(value, (bytes, bytearray)):
+        _pack_header(len(value), chunks, None, 0, (0xC4, 0xC5, 0xC6))
+        chunks.append(bytes(value))
+    elif isinstance(value, (list, tuple)):
+        _pack_header(len(value), chunks, 0x90, 16, (None, 0xDC, 0xDD))
+        for item in value:
+            _pack(item, chunks)
+    elif isinstance(value, dict):
+        _pack_header(len(value), chunks, 0x80, 16, (None, 0xDE, 0xDF))
+        for key, item in value.items():
+            _pack(key, chunks)
+            _pack(item, chunks)
+    else:
+        raise TypeError(f"Can't encode {type(value).__name__} as MessagePack")
+
+
+def _pack_header(
+    length: int,
+    chunks: List[bytes],
+    fix_tag: Optional[int],
+    fix_limit: int,
+    tags: Tuple[Optional[int], int, int],
+) -> None:
+    """
+    Function to write the type and length of a string, bytes, array or map
+
+    :param length: Number of bytes or items
+    :param chunks: Output
+    :param fix_tag: Tag of the form with the length in the tag itself, if any
+    :param fix_limit: Lengths below this fit in the tag
+    :param tags: Tags with 8, 16 and 32 bit lengths, None where there is none
+    """
+    if fix_tag is not None and length < fix_limit:
+        chunks.append(struct.pack("B", fix_tag | length))
+    elif tags[0] is not None and length < 1 << 8:
+        chunks.append(struct.pack(">BB", tags[0], length))
+    elif length < 1 << 16:
+        chunks.append(struct.pack(">BH", tags[1], length))
+    else:
+        chunks.append(struct.pack(">BI", tags[2], length))
+
+
+# Tag -> (struct format, size) of fixed size values
+_FIXED = {
+    0xCA: (">f", 4),
+    0xCB: (">d", 8),
+    0xCC: (">B", 1),
+    0xCD: (">H", 2),
+    0xCE: (">I", 4),
+    0xCF: (">Q", 8),
+    0xD0: (">b", 1),
+    0xD1: (">h", 2),
+    0xD2: (">i", 4),
+    0xD3: (">q", 8),
+}
+# Tag -> (kind, struct format of the length, its size)
+_SIZED = {
+    0xD9: ("str", ">B", 1),
+    0xDA: ("str", ">H", 2),
+    0xDB: ("str", ">I", 4),
+    0xC4: ("bin", ">B", 1),
+    0xC5: ("bin", ">H", 2),
+    0xC6: ("bin", ">I", 4),
+    0xDC: ("array", ">H", 2),
+    0xDD: ("array", ">I", 4),
+    0xDE: ("map", ">H", 2),
+    0xDF: ("map", ">I", 4),
+}
+# Deepest nesting of arrays and maps read, far past anything a body holds, so a
+# few bytes of nested arrays can't use up the stack
+MAX_DEPTH = 32
+
+
+def unpack(data: bytes) -> Any:
+    """
+    Function to decode MessagePack
+
+    :param data: MessagePack bytes holding one value
+    :return: The value, with arrays as lists and maps as dicts
+    """
+    try:
+        value, end = _unpack(data, 0)
+    except (IndexError, TypeError, struct.error, UnicodeDecodeError) as e:
+        raise WireFormatError(f"Malformed MessagePack: {e}")
+    if end != len(data):
+        raise WireFormatError(f"{len(data) - end} bytes after the MessagePack value")
+    return value
+
+
+def _unpack(data: bytes, offset: int, depth: int = 0) -> Tuple[Any, int]:
+    tag = data[offset]
+    offset += 1
+    if tag < 0x80:
+        return tag, offset
+    if tag >= 0xE0:
+        return tag - 0x100, offset
+    if 0xA0 <= tag < 0xC0:
+        return _unpack_sized("str", tag & 0x1F, data, offset, depth)
+    if 0x90 <= tag < 0xA0:
+        return _unpack_sized("array", tag & 0x0F, data, offset, depth)
+    if 0x80 <= tag < 0x90:
+        return _unpack_sized("map", tag & 0x0F, data, offset, depth)
+    if tag == 0xC0:
+        return None, offset
+    if tag in (0xC2, 0xC3):
+        return tag == 0xC3, offset
+    if tag in _FIXED:
+        fmt, size = _FIXED[tag]
+        return struct.unpack_from(fmt, data, offset)[0], offset + size
+    if tag in _SIZED:
+        kind, fmt, size = _SIZED[tag]
+        length = struct.unpack_from(fmt, data, offset)[0]
+        return _unpack_sized(kind, length, data, offset + size, depth)
+    raise WireFormatError(f"Unsupported MessagePack type 0x{tag:02x}")
+
+
+def _unpack_sized(
+    kind: str, length: int, data: bytes, offset: int, depth: int
+) -> Tuple[Any, int]:
+    if kind in ("str", "bin"):
+        end = offset + length
+        if end > len(data):
+            raise WireFormatError("MessagePack value runs past the end of the body")
+        raw = bytes(data[offset:end])
+        return (raw.decode("utf-8") if kind == "str" else raw), end
+    if depth >= MAX_DEPTH:
+        raise WireFormatError(f"MessagePack nested deeper than {MAX_DEPTH}")
+    if kind == "array":
+        items = []
+        for _ in range(length):
+            item, offset = _unpack(data, offset, depth + 1)
+            items.append(item)
+        return items, offset
+    mapping = dict()
+    for _ in range(length):
+        key, offset = _unpack(data, offset, depth + 1)
+        mapping[key], offset = _unpack(data, offset, depth + 1)
+    return mapping, offset
+
+
+def _code(name: Any, table: Tuple[str, ...]) -> Any:
+    return CODES[table].get(name, name)
+
+
+def _name(code: Any, table: Tuple[str, ...]) -> Any:
+    if isinstance(code, int) and not isinstance(code, bool):
+        if not 0 <= code < len(table):
+            raise WireFormatError(f"Unknown code {code}")
+        return table[code]
+    return code
+
+
+def encode_player(player: Mapping) -> List:
+    """
+    Function to turn a player dict into its compact array form
+
+    :param player: Player dict, e.g. from player_payload
+    :return: Player fields in Player order, with names as codes; fields the
+        dict doesn't have are left off the end, or sent as None
+    """
+    values = dict(player)
+    values["character_class"] = _code(values.get("character_class"), CLASSES)
+    values["action"] = _code(values.get("action"), ACTIONS)
+    values["status_effects"] = [
+        [_code(effect[0], EFFECTS)] + list(effect[1:])
+        for effect in values.get("status_effects") or []
+    ]
+    encoded = [values.get(name) for name in PLAYER_FIELDS]
+    while encoded and PLAYER_FIELDS[len(encoded) - 1] not in player:
+        encoded.pop()
+    return encoded
+
+
+def decode_player(encoded: List) -> Dict:
+    """
+    Function to turn a player's compact array form back into a player dict
+
+    :param encoded: Player fields in Player order, from encode_player
+    :return: Player dict
+    """
+    if not isinstance(encoded, list) or len(encoded) > len(PLAYER_FIELDS):
+        raise WireFormatError("A player must be an array of Player fields")
+    player = dict(zip(PLAYER_FIELDS, encoded))
+    if "character_class" in player:
+        player["character_class"] = _name(player["character_class"], CLASSES)
+    if "action" in player:
+        player["action"] = _name(player["action"], ACTIONS)
+    if isinstance(player.get("status_effects"), list):
+        for effect in player["status_effects"]:
+            if not isinstance(effect, list) or not effect:
+                raise WireFormatError("A status effect must be an array")
+        player["status_effects"] = [
+            [_name(effect[0], EFFECTS)] + list(effect[1:])
+            for effect in player["status_effects"]
+        ]
+    return player
+
+
+def _header(headers: Optional[Mapping[str, str]], name: str) -> str:
+    for key, value in (headers or {}).items():
+        if key.lower() == name:
+            return value or ""
+    return ""
+
+
+def _media_types(header: str) -> List[str]:
+    return [part.split(";")[0].strip().lower() for part in header.split(",")]
+
+
+def is_binary_request(event: Mapping) -> bool:
+    """
+    Function to tell whether a request's body is MessagePack
+
+    :param event: Input AWS Lambda event dict
+    :return: Whether the Content-Type is a MessagePack type
+    """
+    content_type = _header(event.get("headers"), "content-type")
+    return _media_types(content_type)[0] in MSGPACK_TYPES
+
+
+def wants_binary(event: Mapping) -> bool:
+    """
+    Function to tell whether a client should get a MessagePack body back: if
+    it accepts MessagePack, or sent MessagePack and didn't ask for anything else
+
+    :param event: Input AWS Lambda event dict
+    :return: Whether to answer with MessagePack
+    """
+    accept = _header(event.get("headers"), "accept")
+    if accept:
+        return any(media in MSGPACK_TYPES for media in _media_types(accept))
+    return is_binary_request(event)
+
+
+def read_body(event: Mapping) -> Any:
+    """
+    Function to read a request's body, whichever format it was sent in
+
+    :param event: Input AWS Lambda event dict
+    :return: The decoded body, with players as dicts
+    """
+    body = event.get("body")
+    if not is_binary_request(event):
+        if event.get("isBase64Encoded") and isinstance(body, str):
+            body = base64.b64decode(body)
+        if isinstance(body, (str, bytes)):
+            return json.loads(body)
+        return body
+
+    if event.get("isBase64Encoded"):
+        raw = base64.b64decode(body)
+    elif isinstance(body, str):
+        raw = body.encode("utf-8")
+    else:
+        raw = body or b""
+    decoded = unpack(raw)
+    if isinstance(decoded, dict):
+        for key in PLAYER_KEYS:
+            if isinstance(decoded.get(key), list):
+                decoded[key] = decode_player(decoded[key])
+    return decoded
+
+
+def binary_body(body: Dict) -> str:
+    """
+    Function to encode a response body as base64 MessagePack, with its players
+    in their compact form
+
+    :param body: Response body
+    :return: base64 text for a proxy response with isBase64Encoded
+    """
+    body = dict(body)
+    for key in PLAYER_KEYS:
+        if isinstance(body.get(key), dict):
+            body[key] = encode_player(body[key])
+    return base64.b64encode(pack(body)).decode("ascii")
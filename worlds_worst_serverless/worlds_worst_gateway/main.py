@@ -0,0 +1,72 @@
+"""
+FastAPI app serving every service's handlers from one process, so calls between
+services don't go over the network. See routes for how requests map to
+handlers, and dockerfiles/Dockerfile-API for running it under gunicorn with
+several uvicorn workers.
+"""
+import json
+
+from fastapi import FastAPI, Request, Response
+from starlette.concurrency import run_in_threadpool
+
+from worlds_worst_serverless.worlds_worst_gateway import routes
+
+app = FastAPI(title="worlds-worst-serverless")
+
+
+def _route(name: str):
+    """
+    Build the endpoint for one function's HTTP route
+
+    :param name: Key of routes.FUNCTIONS
+    :return: Endpoint coroutine
+    """
+
+    async def endpoint(request: Request) -> Response:
+        event = routes.build_event(
+            request.method,
+            request.url.path,
+            request.headers,
+            request.query_params,
+            await request.body(),
+        )
+        # Handlers block on boto3, so keep them off the event loop
+        status, headers, body = await run_in_threadpool(routes.call_route, name, event)
+        return Response(content=body, status_code=status, headers=headers)
+
+    endpoint.__name__ = name
+    return endpoint
+
+
+for function_name, (path, _) in routes.FUNCTIONS.items():
+    app.add_api_route(path, _route(function_name), methods=["POST"])
+
+
+@app.post(routes.INVOKE_PATH)
+async def invoke(function_name: str, request: Request) -> Response:
+    """
+    Lambda Invoke API, for boto3 Lambda clients created with endpoint_url, on
+    internal addresses only
+    """
+    client_host = request.client.host if request.client else None
+    if not routes.invoke_allowed(client_host):
+        return Response(
+            content=json.dumps({"Message": "The Invoke API is internal only"}),
+            status_code=403,
+            headers={"X-Amzn-ErrorType": "AccessDeniedException"},
+            media_type="application/json",
+        )
+
+    name = routes.resolve_function(function_name)
+    if name is None:
+        return Response(
+            content=json.dumps({"Message": f"Function not found: {function_name}"}),
+            status_code=404,
+            headers={"X-Amzn-ErrorType": "ResourceNotFoundException"},
+            media_type="application/json",
+        )
+
+    status, headers, body = await run_in_threadpool(
+        routes.invoke, name, await request.body()
+    )
+    return Response(content=body, status_code=status, headers=headers)
@@ -0,0 +1,202 @@
+"""
+Routes of the API gateway, which runs every service's Lambda handler in process
+
+Each route is a handler imported straight from its service, at the same path
+and method as in that service's serverless.yml. HTTP requests are turned into
+the API Gateway proxy events the handlers already parse, and their proxy
+responses back into HTTP responses, so the same handlers run unchanged behind
+API Gateway and behind the gateway.
+
+Handlers can also be called with a raw Lambda event at the Lambda Invoke API's
+path, so a boto3 Lambda client pointed at the gateway with endpoint_url calls
+the handler in process instead of over the network. Raw events skip everything
+API Gateway would check, so that path only answers INVOKE_CLIENTS: loopback
+unless INVOKE_ALLOWED_CLIENTS names other internal addresses.
+"""
+import base64
+import json
+import os
+import time
+import traceback
+import uuid
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from worlds_worst_serverless.worlds_worst_auth.authenticator import authenticate
+from worlds_worst_serverless.worlds_worst_combat.handler import do_combat
+from worlds_worst_serverless.worlds_worst_mapper.mapper import (
+    get_matching_action,
+    get_matching_actions,
+    parse_action,
+)
+from worlds_worst_serverless.worlds_worst_operator.moves import submit_move
+from worlds_worst_serverless.worlds_worst_operator.operator import (
+    route_tasks_and_response,
+)
+
+LambdaDict = Dict[str, Any]
+
+# Function name (as in serverless.yml) -> (HTTP path, handler), all POST
+FUNCTIONS = {
+    "map": ("/mapper", get_matching_action),
+    "map_batch": ("/mapper/batch", get_matching_actions),
+    "parse": ("/mapper/parse", parse_action),
+    "authenticate": ("/authenticate", authenticate),
+    "combat": ("/combat", do_combat),
+    "operator": ("/operator", route_tasks_and_response),
+    "move": ("/operator/move", submit_move),
+}
+ROUTES = {path: name for name, (path, _) in FUNCTIONS.items()}
+
+INVOKE_PATH = "/2015-03-31/functions/{function_name}/invocations"
+# Client addresses allowed to call INVOKE_PATH
+INVOKE_CLIENTS = frozenset(
+    os.environ.get("INVOKE_ALLOWED_CLIENTS", "127.0.0.1,::1").split(",")
+)
+
+# Lambda's default timeout for these functions, for get_remaining_time_in_millis
+TIMEOUT_SECONDS = 30
+
+
+class GatewayContext:
+    """
+    Stand-in for the Lambda context object, with the attributes handlers use
+    """
+
+    def __init__(self, function_name: str, timeout: float = TIMEOUT_SECONDS):
+        """
+        :param function_name: Name of the function being invoked
+        :param timeout: Seconds the invocation may run for
+        """
+        self.function_name = function_name
+        self.aws_request_id = str(uuid.uuid4())
+        self._deadline = time.monotonic() + timeout
+
+    def get_remaining_time_in_millis(self) -> int:
+        """
+        Milliseconds left before the invocation would time out
+        """
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+def invoke_allowed(client_host: Optional[str]) -> bool:
+    """
+    Function to tell whether a client may call the Lambda Invoke API path
+
+    :param client_host: Address the request came from, if known
+    :return: Whether it is one of INVOKE_CLIENTS
+    """
+    return client_host in INVOKE_CLIENTS
+
+
+def resolve_function(function_name: str) -> Optional[str]:
+    """
+    Function to find the handler for a Lambda function name, which may be the
+    deployed name (e.g. worlds-worst-mapper-dev-map) or its ARN
+
+    :param function_name: FunctionName as passed to the Lambda Invoke API
+    :return: Key of FUNCTIONS, or None if there is no such function
+    """
+    name = function_name.split(":function:")[-1].split(":")[0]
+    for key in FUNCTIONS:
+        if name == key or name.endswith(f"-{key}"):
+            return key
+    return None
+
+
+def build_event(
+    method: str,
+    path: str,
+    headers: Mapping[str, str],
+    query: Mapping[str, str],
+    body: bytes,
+) -> LambdaDict:
+    """
+    Function to turn an HTTP request into an API Gateway proxy event
+
+    :param method: HTTP method
+    :param path: Request path
+    :param headers: Request headers
+    :param query: Query string parameters
+    :param body: Raw request body
+    :return: Lambda event dict
+    """
+    try:
+        decoded_body, is_base64 = body.decode("utf-8"), False
+    except UnicodeDecodeError:
+        decoded_body, is_base64 = base64.b64encode(body).decode("ascii"), True
+
+    return {
+        "resource": path,
+        "path": path,
+        "httpMethod": method,
+        "headers": dict(headers),
+        "queryStringParameters": dict(query) or None,
+        "pathParameters": None,
+        "requestContext": {
+            "requestId": str(uuid.uuid4()),
+            "httpMethod": method,
+            "path": path,
+            "stage": "gateway",
+        },
+        "body": decoded_body or None,
+        "isBase64Encoded": is_base64,
+    }
+
+
+def parse_result(result: LambdaDict) -> Tuple[int, Dict[str, str], bytes]:
+    """
+    Function to turn a handler's proxy response into an HTTP response
+
+    :param result: Lambda proxy response dict
+    :return: (status code, headers, body)
+    """
+    headers = {key: str(value) for key, value in (result.get("headers") or {}).items()}
+    body = result.get("body", "")
+    if result.get("isBase64Encoded"):
+        return result["statusCode"], headers, base64.b64decode(body)
+
+    if not isinstance(body, str):
+        # API Gateway would reject this, but some handlers return dicts
+        body = json.dumps(body, default=str)
+        headers.setdefault("Content-Type", "application/json")
+    return result["statusCode"], headers, body.encode("utf-8")
+
+
+def call_route(name: str, event: LambdaDict) -> Tuple[int, Dict[str, str], bytes]:
+    """
+    Function to run a handler for an HTTP request, answering unhandled errors
+    the way API Gateway does
+
+    :param name: Key of FUNCTIONS
+    :param event: Lambda event dict
+    :return: (status code, headers, body)
+    """
+    _, handler = FUNCTIONS[name]
+    try:
+        result = handler(event, GatewayContext(name))
+    except Exception:
+        traceback.print_exc()
+        body = json.dumps({"message": "Internal server error"})
+        return 502, {"Content-Type": "application/json"}, body.encode("utf-8")
+    return parse_result(result)
+
+
+def invoke(name: str, payload: bytes) -> Tuple[int, Dict[str, str], bytes]:
+    """
+    Function to run a handler for a Lambda Invoke API request, answering the
+    way the Invoke API does
+
+    :param name: Key of FUNCTIONS
+    :param payload: Raw JSON Lambda event
+    :return: (status code, headers, body)
+    """
+    _, handler = FUNCTIONS[name]
+    headers = {"Content-Type": "application/json"}
+    try:
+        event = json.loads(payload) if payload else {}
+        result = handler(event, GatewayContext(name))
+    except Exception as e:
+        traceback.print_exc()
+        headers["X-Amz-Function-Error"] = "Unhandled"
+        result = {"errorMessage": str(e), "errorType": type(e).__name__}
+    return 200, headers, json.dumps(result, default=str).encode("utf-8")
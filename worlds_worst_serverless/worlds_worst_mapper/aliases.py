@@ -0,0 +1,185 @@
+"""
+Exact-match aliases promoted from the mapper's own traffic
+
+Most inputs the mapper fuzzy-matches are the same few misspellings ("attac",
+"dodg", "blok") over and over. The mapper logs every input it couldn't match
+exactly as an observation line in CloudWatch. An offline compaction job counts
+them and promotes the most frequent into promoted_aliases.json, which ships
+with the function and resolves those inputs with one dictionary lookup.
+
+The table holds at most MAX_ALIASES entries. Counts from earlier compactions
+are decayed before new observations are added, and the least frequent entries
+are evicted first, so the table follows what players type now.
+
+Compact exported log lines (e.g. from aws logs filter-log-events) with
+
+    python -m worlds_worst_serverless.worlds_worst_mapper.aliases logs.txt
+"""
+import argparse
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+
+try:
+    from guidelines import VOCABULARY
+    from match_index import MatchIndex, normalize
+except ImportError:
+    from .guidelines import VOCABULARY
+    from .match_index import MatchIndex, normalize
+
+OBSERVATION_PREFIX = "MAPPER_OBSERVATION"
+PROMOTED_ALIASES_FILE = Path(__file__).parent / "promoted_aliases.json"
+
+# Largest promoted table, fewest sightings to be promoted and how much earlier
+# counts are worth at each compaction
+MAX_ALIASES = 2000
+MIN_COUNT = 5
+DECAY = 0.5
+
+AliasTable = Dict[str, Dict[str, object]]
+
+
+def observe(command: str, matched: str, score: int, count: int = 1) -> None:
+    """
+    Function to log an input the mapper had to fuzzy-match, for compaction
+
+    :param command: Text the player typed
+    :param matched: Vocabulary entry it resolved to
+    :param score: Match score
+    :param count: Number of times it was sent, e.g. in one batch
+    """
+    normal = normalize(command)
+    if score == 100 or not normal:
+        return
+
+    observation = {
+        "input": normal,
+        "matched": matched,
+        "score": score,
+        "count": count,
+    }
+    print(f"{OBSERVATION_PREFIX} {json.dumps(observation)}")
+
+
+def read_observations(lines: Iterable[str]) -> Counter:
+    """
+    Function to count the normalized inputs in observation log lines, ignoring
+    every other line
+
+    :param lines: Log lines, each observation anywhere on its line
+    :return: Counter of normalized inputs
+    """
+    counts = Counter()
+    for line in lines:
+        _, prefix, observation = line.partition(OBSERVATION_PREFIX)
+        if not prefix:
+            continue
+        try:
+            observation = json.loads(observation)
+            counts[observation["input"]] += int(observation.get("count", 1))
+        except (ValueError, KeyError, TypeError):
+            print(f"Skipping malformed observation: {line.strip()}")
+    return counts
+
+
+def compact(
+    observations: Counter,
+    promoted: AliasTable,
+    index: MatchIndex,
+    max_aliases: int = MAX_ALIASES,
+    min_count: int = MIN_COUNT,
+    decay: float = DECAY,
+) -> AliasTable:
+    """
+    Function to merge new observations into the promoted alias table
+
+    Inputs are resolved again with the index rather than trusting the logged
+    match, so the table always agrees with the current vocabulary.
+
+    :param observations: Counter of normalized inputs
+    :param promoted: Current promoted alias table
+    :param index: Index over the vocabulary, without aliases
+    :param max_aliases: Most entries to keep
+    :param min_count: Fewest sightings for an input to be kept
+    :param decay: Factor applied to the current table's counts
+    :return: New promoted alias table, most frequent first
+    """
+    counts = Counter()
+    for alias, entry in promoted.items():
+        counts[alias] = int(entry["count"] * decay)
+    counts.update(observations)
+
+    table = dict()
+    for alias, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+        if len(table) == max_aliases or count < min_count:
+            break
+        matched, score = index.match(alias)
+        if score == 100:
+            # Already an exact hit, no need to promote it
+            continue
+        table[alias] = {"matched": matched, "score": score, "count": count}
+    return table
+
+
+def load_promoted_aliases(path_to_file: Path) -> Dict[str, Tuple[str, int]]:
+    """
+    Function to load the promoted alias table for MatchIndex
+
+    :param path_to_file: Path to promoted_aliases.json
+    :return: Dictionary mapping normalized inputs to (matched, score)
+    """
+    if not path_to_file.exists():
+        return dict()
+
+    with path_to_file.open() as json_file:
+        promoted = json.load(json_file)
+
+    return {
+        alias: (entry["matched"], entry["score"]) for alias, entry in promoted.items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("logs", nargs="*", help="Log files, or stdin if none")
+    parser.add_argument("--output", type=Path, default=PROMOTED_ALIASES_FILE)
+    parser.add_argument("--max-aliases", type=int, default=MAX_ALIASES)
+    parser.add_argument("--min-count", type=int, default=MIN_COUNT)
+    parser.add_argument("--decay", type=float, default=DECAY)
+    args = parser.parse_args()
+
+    observations = Counter()
+    for path in args.logs or ["-"]:
+        if path == "-":
+            observations.update(read_observations(sys.stdin))
+        else:
+            with open(path) as log_file:
+                observations.update(read_observations(log_file))
+
+    promoted = dict()
+    if args.output.exists():
+        with args.output.open() as json_file:
+            promoted = json.load(json_file)
+
+    table = compact(
+        observations,
+        promoted,
+        MatchIndex(VOCABULARY),
+        max_aliases=args.max_aliases,
+        min_count=args.min_count,
+        decay=args.decay,
+    )
+    with args.output.open("w") as json_file:
+        json.dump(table, json_file, indent=2)
+        json_file.write("\n")
+
+    print(
+        f"Promoted {len(table)} aliases from {sum(observations.values())} "
+        f"observations of {len(observations)} inputs"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Parses free text like "enhanced attack on bob" into a complete combat command
+
+Words after a preposition like "on" or "at" name the target. Every other word
+is matched on its own against one precompiled index of the words that make up
+ACTIONS_MAP keys plus the words that mean "enhanced". What's left is matched
+as a whole against the vocabulary of actions and ability names, falling back
+to the action the recognised words spell out (e.g. "change my class").
+"""
+import string
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from aliases import PROMOTED_ALIASES_FILE, load_promoted_aliases
+    from guidelines import ACTIONS_MAP, VOCABULARY
+    from match_index import MatchIndex, normalize
+except ImportError:
+    from .aliases import PROMOTED_ALIASES_FILE, load_promoted_aliases
+    from .guidelines import ACTIONS_MAP, VOCABULARY
+    from .match_index import MatchIndex, normalize
+
+ENHANCE_WORDS = ("enhanced", "enhance", "empowered")
+TARGET_WORDS = frozenset(("on", "at", "against", "vs", "versus"))
+FILLER_WORDS = frozenset(
+    ("a", "an", "and", "do", "i", "it", "my", "now", "please", "the", "to", "use")
+)
+
+# Lowest score for a word to count as a known word, or for the whole phrase to
+# count as a command at all, and shortest word to try
+WORD_SCORE = 80
+MIN_WORD_LENGTH = 3
+
+# Lowest score for the whole phrase to beat the action its words spell out
+PHRASE_SCORE = 90
+
+# Both indexes are built once per container and reused by every request
+ACTION_WORDS = tuple(
+    dict.fromkeys(word for action in ACTIONS_MAP for word in action.split())
+)
+WORD_INDEX = MatchIndex(ACTION_WORDS + ENHANCE_WORDS)
+
+# Whole commands, for the mapper and for the parser's phrases, with the
+# misspellings promoted from earlier traffic
+VOCABULARY_INDEX = MatchIndex(
+    VOCABULARY, aliases=load_promoted_aliases(PROMOTED_ALIASES_FILE)
+)
+
+
+def parse_command(text: str) -> Dict[str, Any]:
+    """
+    Function to parse free text into a combat command
+
+    :param text: Text the player typed
+    :return: Dictionary with the function to execute, the canonical action from
+        ACTIONS_MAP, the vocabulary entry that matched, its match score, the
+        enhanced flag and the target name. function, action, matched and score
+        are None if no action was found, target is None if no target was named.
+    """
+    words = text.split()
+    target = None
+    for i, word in enumerate(words):
+        if normalize(word) in TARGET_WORDS:
+            target = " ".join(words[i + 1 :]).strip(string.punctuation) or None
+            words = words[:i]
+            break
+
+    enhanced = False
+    action_words = []
+    scores = []
+    phrase_words = []
+    for word in words:
+        normal = normalize(word)
+        if not normal:
+            continue
+
+        matched, score = _match_word(normal)
+        if matched in ENHANCE_WORDS:
+            enhanced = True
+            continue
+
+        phrase_words.append(normal)
+        if matched is not None and matched not in action_words:
+            action_words.append(matched)
+            scores.append(score)
+
+    spelled_action = " ".join(action_words)
+    if phrase_words:
+        matched, score = VOCABULARY_INDEX.match(" ".join(phrase_words))
+        if score < PHRASE_SCORE and spelled_action in ACTIONS_MAP:
+            matched, score = spelled_action, min(scores)
+        if score < WORD_SCORE:
+            # Everything is close to something, e.g. "xyzzy" to dodge
+            matched, score = None, None
+    else:
+        matched, score = None, None
+
+    action = VOCABULARY.get(matched)
+    return {
+        "function": ACTIONS_MAP.get(action),
+        "action": action,
+        "matched": matched,
+        "score": score,
+        "enhanced": enhanced,
+        "target": target,
+    }
+
+
+def _match_word(normal: str) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Match one normalized word against the known words
+
+    :param normal: Normalized word
+    :return: (known word, score), or (None, None) if the word isn't close
+        enough to any known word
+    """
+    if len(normal) < MIN_WORD_LENGTH or normal in FILLER_WORDS:
+        return None, None
+
+    matched, score = WORD_INDEX.match(normal)
+    if score < WORD_SCORE:
+        return None, None
+    return matched, score
@@ -0,0 +1,340 @@
+"""
+Standard-library port of the fuzzywuzzy scoring the mapper uses
+
+The mapper used to ship fuzzywuzzy and python-Levenshtein as a zipped
+requirement that had to be extracted to /tmp on every cold start. This module
+reimplements the scorers it needs with nothing but the standard library, and
+gives the same scores as the versions in poetry.lock (fuzzywuzzy 0.17 with
+python-Levenshtein 0.12):
+
+- ratio and the token scores use the insertion/deletion edit distance, which
+  comes from a bit-parallel longest common subsequence, fast enough in pure
+  Python for short commands.
+- partial_ratio lines strings up using the matching blocks of the same
+  Levenshtein alignment python-Levenshtein 0.12 picks.
+
+Newer python-Levenshtein releases are built on rapidfuzz and pick a different
+alignment among equally cheap ones. Over every action and ability name with
+misspelled, reordered and padded queries, partial_ratio differed from 0.27 by
+up to 29 points and weighted_ratio by up to 17. The best match changed for 1
+of 1394 queries, and its score for 22 more, all of them scoring 60 or less.
+Scores of 96 and above come from ratio alone and never differ.
+"""
+import re
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+_NON_WORD = re.compile(r"(?ui)\W")
+# fuzzywuzzy's force_ascii only drops the Latin-1 range, not all of Unicode
+_LATIN_1 = {code: None for code in range(128, 256)}
+
+
+def full_process(text: str, force_ascii: bool = False) -> str:
+    """
+    Lowercase text and replace everything but letters and numbers with spaces
+
+    :param text: Text to process
+    :param force_ascii: Drop characters in the Latin-1 range first
+    :return: Processed text
+    """
+    if force_ascii:
+        text = text.translate(_LATIN_1)
+    return _NON_WORD.sub(" ", text).lower().strip()
+
+
+def process_query(query: str) -> str:
+    """
+    Process a query the way process.extractOne does
+
+    :param query: Query to process
+    :return: Processed query
+    """
+    return full_process(full_process(query), force_ascii=True)
+
+
+def process_choice(choice: str) -> str:
+    """
+    Process a choice the way process.extractOne does
+
+    :param choice: Choice to process
+    :return: Processed choice
+    """
+    return full_process(choice, force_ascii=True)
+
+
+def lcs_length(s1: str, s2: str) -> int:
+    """
+    Length of the longest common subsequence of two strings, computed a whole
+    column at a time with the bits of an integer (Allison-Dix / Hyyro)
+
+    :param s1: First string
+    :param s2: Second string
+    :return: Length of the longest common subsequence
+    """
+    if not s1 or not s2:
+        return 0
+
+    matches = dict()
+    for i, char in enumerate(s1):
+        matches[char] = matches.get(char, 0) | 1 << i
+
+    all_ones = (1 << len(s1)) - 1
+    row = all_ones
+    for char in s2:
+        matched = row & matches.get(char, 0)
+        row = (row + matched) | (row - matched)
+    return len(s1) - bin(row & all_ones).count("1")
+
+
+def indel_distance(s1: str, s2: str) -> int:
+    """
+    Number of single character insertions and deletions between two strings
+
+    :param s1: First string
+    :param s2: Second string
+    :return: Edit distance
+    """
+    return len(s1) + len(s2) - 2 * lcs_length(s1, s2)
+
+
+def _similarity(s1: str, s2: str) -> float:
+    """
+    Similarity between 0 and 1, the same as python-Levenshtein's ratio
+    """
+    total = len(s1) + len(s2)
+    if total == 0:
+        return 1.0
+    return 2 * lcs_length(s1, s2) / total
+
+
+def _round(score: float) -> int:
+    """
+    Round a score the way fuzzywuzzy does
+    """
+    return int(round(score))
+
+
+def ratio(s1: str, s2: str) -> int:
+    """
+    Similarity of two strings, from 0 to 100
+
+    :param s1: First string
+    :param s2: Second string
+    :return: Score
+    """
+    if s1 == s2:
+        return 100
+    if not s1 or not s2:
+        return 0
+    return _round(100 * _similarity(s1, s2))
+
+
+# The token scores often compare the same strings again, e.g. single words
+@lru_cache(maxsize=1024)
+def partial_ratio(s1: str, s2: str) -> int:
+    """
+    Similarity of the shorter string to its best matching window of the longer
+    one, from 0 to 100. Windows start where a matching block of the two
+    strings lines them up.
+
+    :param s1: First string
+    :param s2: Second string
+    :return: Score
+    """
+    if s1 == s2:
+        return 100
+    if not s1 or not s2:
+        return 0
+
+    if len(s1) <= len(s2):
+        shorter, longer = s1, s2
+    else:
+        shorter, longer = s2, s1
+
+    best = 0.0
+    for short_start, long_start, _ in matching_blocks(shorter, longer):
+        start = max(0, long_start - short_start)
+        score = _similarity(shorter, longer[start : start + len(shorter)])
+        if score > 0.995:
+            return 100
+        best = max(best, score)
+    return _round(100 * best)
+
+
+def matching_blocks(s1: str, s2: str) -> List[Tuple[int, int, int]]:
+    """
+    Runs of characters kept by python-Levenshtein 0.12's alignment of two
+    strings, followed by (len(s1), len(s2), 0) like difflib's
+
+    The alignment is a cheapest Levenshtein edit script, found by walking the
+    cost matrix back from the end, keeping to the current direction and then
+    preferring matches, substitutions, insertions and deletions in that order.
+
+    :param s1: First string
+    :param s2: Second string
+    :return: List of (start in s1, start in s2, length)
+    """
+    # A common prefix and suffix are always kept
+    prefix = 0
+    while prefix < min(len(s1), len(s2)) and s1[prefix] == s2[prefix]:
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < min(len(s1), len(s2)) - prefix
+        and s1[len(s1) - 1 - suffix] == s2[len(s2) - 1 - suffix]
+    ):
+        suffix += 1
+    middle1 = s1[prefix : len(s1) - suffix]
+    middle2 = s2[prefix : len(s2) - suffix]
+
+    costs = [list(range(len(middle2) + 1))]
+    for i, char1 in enumerate(middle1, 1):
+        previous = costs[-1]
+        row = [i]
+        cost = i
+        for diagonal, up, char2 in zip(previous, previous[1:], middle2):
+            # Cheapest of insertion, substitution (or match) and deletion
+            cost += 1
+            if diagonal + (char1 != char2) < cost:
+                cost = diagonal + (char1 != char2)
+            if up + 1 < cost:
+                cost = up + 1
+            row.append(cost)
+        costs.append(row)
+
+    kept = []
+    i, j = len(middle1), len(middle2)
+    direction = 0
+    while i or j:
+        cost = costs[i][j]
+        if direction < 0 and j and cost == costs[i][j - 1] + 1:
+            j -= 1
+        elif direction > 0 and i and cost == costs[i - 1][j] + 1:
+            i -= 1
+        elif (
+            i and j and cost == costs[i - 1][j - 1] and middle1[i - 1] == middle2[j - 1]
+        ):
+            i, j = i - 1, j - 1
+            kept.append((i, j))
+            direction = 0
+        elif i and j and cost == costs[i - 1][j - 1] + 1:
+            i, j = i - 1, j - 1
+            direction = 0
+        elif j and cost == costs[i][j - 1] + 1:
+            j -= 1
+            direction = -1
+        else:
+            i -= 1
+            direction = 1
+
+    pairs = [(k, k) for k in range(prefix)]
+    pairs += [(i + prefix, j + prefix) for i, j in reversed(kept)]
+    pairs += [(len(s1) - suffix + k, len(s2) - suffix + k) for k in range(suffix)]
+
+    blocks = []
+    for i, j in pairs:
+        if (
+            blocks
+            and blocks[-1][0] + blocks[-1][2] == i
+            and blocks[-1][1] + blocks[-1][2] == j
+        ):
+            blocks[-1][2] += 1
+        else:
+            blocks.append([i, j, 1])
+    return [tuple(block) for block in blocks] + [(len(s1), len(s2), 0)]
+
+
+def _sorted_tokens(text: str) -> str:
+    return " ".join(sorted(text.split()))
+
+
+def token_sort_ratio(p1: str, p2: str, partial: bool = False) -> int:
+    """
+    Similarity of two processed strings with their words sorted
+
+    :param p1: First processed string
+    :param p2: Second processed string
+    :param partial: Compare with partial_ratio instead of ratio
+    :return: Score
+    """
+    ratio_function = partial_ratio if partial else ratio
+    return ratio_function(_sorted_tokens(p1), _sorted_tokens(p2))
+
+
+def token_set_ratio(p1: str, p2: str, partial: bool = False) -> int:
+    """
+    Similarity of two processed strings' words, comparing the words they share
+    with the words each of them adds
+
+    :param p1: First processed string
+    :param p2: Second processed string
+    :param partial: Compare with partial_ratio instead of ratio
+    :return: Score
+    """
+    if p1 == p2:
+        return 100
+    if not p1 or not p2:
+        return 0
+
+    tokens1 = set(p1.split())
+    tokens2 = set(p2.split())
+    shared = " ".join(sorted(tokens1 & tokens2))
+    combined_1to2 = (shared + " " + " ".join(sorted(tokens1 - tokens2))).strip()
+    combined_2to1 = (shared + " " + " ".join(sorted(tokens2 - tokens1))).strip()
+
+    ratio_function = partial_ratio if partial else ratio
+    return max(
+        ratio_function(shared, combined_1to2),
+        ratio_function(shared, combined_2to1),
+        ratio_function(combined_1to2, combined_2to1),
+    )
+
+
+def weighted_ratio(p1: str, p2: str) -> int:
+    """
+    Best of several scores, weighted like fuzz.WRatio: partial scores only
+    count for strings of quite different lengths, and are scaled down along
+    with the token scores so only a full match scores 100
+
+    :param p1: First processed string
+    :param p2: Second processed string
+    :return: Score
+    """
+    if not p1 or not p2:
+        return 0
+
+    best = ratio(p1, p2)
+    length_ratio = max(len(p1), len(p2)) / min(len(p1), len(p2))
+    partial = length_ratio >= 1.5
+    partial_scale = 0.9 if partial else 1.0
+    if length_ratio > 8:
+        partial_scale = 0.6
+
+    # Every score is at most 100 before scaling, so skip any that can't win
+    if partial and 100 * partial_scale > best:
+        best = max(best, partial_ratio(p1, p2) * partial_scale)
+    token_scale = 0.95 * partial_scale
+    if 100 * token_scale > best:
+        best = max(best, token_sort_ratio(p1, p2, partial) * token_scale)
+    if 100 * token_scale > best:
+        best = max(best, token_set_ratio(p1, p2, partial) * token_scale)
+    return _round(best)
+
+
+def extract_one(query: str, choices: Iterable[str]) -> Optional[Tuple[str, int]]:
+    """
+    Find the best matching choice for a query
+
+    :param query: Text to match
+    :param choices: Strings to match against
+    :return: (first best scoring choice, score), or None if there are no choices
+    """
+    processed_query = process_query(query)
+    best = None
+    for choice in choices:
+        score = weighted_ratio(processed_query, process_choice(choice))
+        if best is None or score > best[1]:
+            best = (choice, score)
+            if score == 100:
+                break
+    return best
@@ -1,3 +1,7 @@
+import json
+from pathlib import Path
+from typing import Dict
+
 ACTIONS_MAP = {
     "attack": "do_combat",
     "area": "do_combat",
@@ -7,3 +11,25 @@ ACTIONS_MAP = {
     "change character": "change_class",
     "change class": "change_class",
 }
+
+
+def load_ability_aliases(path_to_file: Path) -> Dict[str, str]:
+    """
+    Function to map every ability name to its type, e.g. "Warp Space" to "dodge"
+
+    :param path_to_file: Path to abilities.json
+    :return: Dictionary mapping ability names to ACTIONS_MAP keys
+    """
+    with path_to_file.open() as json_file:
+        abilities = json.load(json_file)
+
+    return {ability["name"]: ability["type"] for ability in abilities}
+
+
+# A copy of worlds_worst_combat/abilities.json, since the mapper deploys on its own
+ABILITY_ALIASES = load_ability_aliases(Path(__file__).parent / "abilities.json")
+
+# Everything a player can type, mapped to the ACTIONS_MAP key it stands for
+VOCABULARY = {action: action for action in ACTIONS_MAP}
+for alias, action in ABILITY_ALIASES.items():
+    VOCABULARY.setdefault(alias, action)
@@ -1,48 +1,147 @@
+import os
+from collections import Counter
+from typing import Dict, Any, Iterable, List
+
 try:
-    import unzip_requirements
+    from aliases import observe
+    from command_parser import VOCABULARY_INDEX, parse_command
+    from guidelines import ACTIONS_MAP, VOCABULARY
+    from middleware import HTTPError, Schema, lambda_handler
 except ImportError:
-    pass
+    from .aliases import observe
+    from .command_parser import VOCABULARY_INDEX, parse_command
+    from .guidelines import ACTIONS_MAP, VOCABULARY
+    from worlds_worst_serverless.worlds_worst_middleware.middleware import (
+        HTTPError,
+        Schema,
+        lambda_handler,
+    )
 
-import json
-from typing import Dict, Any
+LambdaDict = Dict[str, Any]
 
-from fuzzywuzzy import process
+ACTION_SCHEMA = Schema({"action": str})
+ACTIONS_SCHEMA = Schema({"actions": list})
 
+# Largest batch accepted over HTTP; offline jobs call match_commands directly
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 1000))
 
-try:
-    from guidelines import ACTIONS_MAP
-except ImportError:
-    from .guidelines import ACTIONS_MAP
 
-LambdaDict = Dict[str, Any]
+def warm_up() -> Dict[str, Any]:
+    """
+    Function to run a command through the matcher and parser, for warm-up pings,
+    without observing it as player traffic
+
+    :return: What was warmed up
+    """
+    command = parse_command("enhanced attack on warm-up")
+    return {"vocabulary": len(VOCABULARY), "parsed": command["function"]}
 
 
-def get_matching_action(event: LambdaDict, context: LambdaDict) -> LambdaDict:
+@lambda_handler(schema=ACTION_SCHEMA, warm_up=warm_up)
+def get_matching_action(
+    request_body: Dict, event: LambdaDict, context: LambdaDict
+) -> str:
     """
-    Function to receive an action and find the closest matching action in
-    the COMMON_ACTIONS_MAP dictionary.
+    Function to receive an action and find the closest matching action or
+    ability name in the VOCABULARY dictionary.
 
+    :param request_body: Decoded request body
     :param event: Input AWS Lambda event dict
     :param context: Input AWS Lambda context dict
     :return: Function name corresponding to the best matching action
     """
-    # Decode the request
-    request_body = event.get("body")
-    if type(request_body) == str:
-        request_body = json.loads(request_body)
     command_to_match = request_body["action"]
 
-    possible_actions = ACTIONS_MAP.keys()
+    matched_action = VOCABULARY_INDEX.match(command_to_match)
+    observe(command_to_match, *matched_action)
+
+    function_to_execute = ACTIONS_MAP[VOCABULARY[matched_action[0]]]
 
-    matched_action = process.extractOne(command_to_match, possible_actions)
+    print(f"Sending response: {function_to_execute}")
+    return function_to_execute
 
-    function_to_execute = ACTIONS_MAP[matched_action[0]]
 
-    result = {
-        "statusCode": 200,
-        "body": function_to_execute,
-        "headers": {"Access-Control-Allow-Origin": "*"},
+def match_command(command: str) -> Dict[str, Any]:
+    """
+    Function to match one command against the actions and ability names
+
+    :param command: Text the player typed
+    :return: Dictionary with the command, the matched vocabulary entry, its
+        score, the canonical action from ACTIONS_MAP and the function to execute
+    """
+    matched, score = VOCABULARY_INDEX.match(command)
+    return {
+        "action": command,
+        "matched": matched,
+        "score": score,
+        "canonical": VOCABULARY[matched],
+        "function": ACTIONS_MAP[VOCABULARY[matched]],
     }
 
-    print(f"Sending response: {result}")
-    return result
+
+def match_commands(commands: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    Function to match many commands, matching and logging each distinct command
+    only once
+
+    :param commands: Commands to match
+    :return: List of match_command results, in the same order as commands
+    """
+    matches = dict()
+    counts = Counter()
+    results = []
+    for command in commands:
+        if command not in matches:
+            matches[command] = match_command(command)
+        counts[command] += 1
+        results.append(matches[command])
+
+    for command, count in counts.items():
+        observe(command, matches[command]["matched"], matches[command]["score"], count)
+    return results
+
+
+@lambda_handler(schema=ACTIONS_SCHEMA, warm_up=warm_up)
+def get_matching_actions(
+    request_body: Dict, event: LambdaDict, context: LambdaDict
+) -> List[Dict[str, Any]]:
+    """
+    Function to receive a list of actions and find the closest matching
+    action for each of them.
+
+    :param request_body: Decoded request body
+    :param event: Input AWS Lambda event dict
+    :param context: Input AWS Lambda context dict
+    :return: List of matches, one per action, in the order they were sent
+    """
+    commands_to_match = request_body.get("actions")
+
+    if not isinstance(commands_to_match, list) or not all(
+        isinstance(command, str) for command in commands_to_match
+    ):
+        raise HTTPError(400, "actions must be a list of strings")
+    if len(commands_to_match) > MAX_BATCH_SIZE:
+        raise HTTPError(400, f"At most {MAX_BATCH_SIZE} actions can be matched at once")
+
+    print(f"Sending response: {len(commands_to_match)} matches")
+    return match_commands(commands_to_match)
+
+
+@lambda_handler(schema=ACTION_SCHEMA, warm_up=warm_up)
+def parse_action(request_body: Dict, event: LambdaDict, context: LambdaDict) -> Dict:
+    """
+    Function to receive an action and parse it into everything combat needs:
+    the function to execute, the canonical action, whether it's enhanced and
+    who it targets.
+
+    :param request_body: Decoded request body
+    :param event: Input AWS Lambda event dict
+    :param context: Input AWS Lambda context dict
+    :return: Parsed command
+    """
+    command = parse_command(request_body["action"])
+    if command["action"] is None:
+        raise HTTPError(400, f"No action found in {request_body['action']!r}")
+
+    print(f"Sending response: {command}")
+    return command
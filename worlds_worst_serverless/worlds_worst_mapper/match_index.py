@@ -0,0 +1,223 @@
+"""
+Precomputed fuzzy-match index over the mapper's vocabulary
+
+Matches queries like
+
+    fuzzy.extract_one(query, choices)
+
+but does the expensive parts once, when the index is built, instead of on
+every request, and only scores a few likely choices:
+
+- choices are normalized once, so scoring doesn't re-process each of them
+- normalized queries that exactly match a choice or a known alias (a
+  frequent misspelling, with the match it resolved to) return straight away
+- an inverted index of character trigrams finds the choices that share text
+  with the query; near-exact matches are found among them exactly
+- otherwise only the choices sharing the most trigrams get scored
+- recent queries are answered from an LRU cache
+
+Exact and near-exact matches (scoring NEAR_EXACT_SCORE or more) are always
+the ones extract_one finds, as is every match in a vocabulary of up to
+max_candidates choices. Below that score in bigger vocabularies, a choice
+sharing few trigrams with the query can be skipped even if it would score best.
+"""
+import math
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    from fuzzy import process_choice, process_query, weighted_ratio
+except ImportError:
+    from .fuzzy import process_choice, process_query, weighted_ratio
+
+# A weighted ratio this high can only come from the plain ratio of the two
+# strings (token and partial scores are capped at 95), which bounds the edit
+# distance of every choice that could score as high. See _near_exact.
+NEAR_EXACT_SCORE = 96
+
+normalize = process_query
+
+
+def trigrams(text: str) -> Counter:
+    """
+    Character trigrams of text padded with a space at either end, so a string
+    of n characters has n trigrams
+
+    :param text: Normalized text
+    :return: Counter of trigrams
+    """
+    padded = f" {text} "
+    return Counter(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+class NGramIndex:
+    """
+    Inverted index from character trigrams to the words containing them
+    """
+
+    def __init__(self, words: Iterable[str]):
+        """
+        :param words: Words to index, referred to by their position
+        """
+        self.sizes = []
+        self._postings = defaultdict(list)
+        for word_id, word in enumerate(words):
+            grams = trigrams(word)
+            self.sizes.append(sum(grams.values()))
+            for gram, count in grams.items():
+                self._postings[gram].append((word_id, count))
+
+    def shared(self, text: str) -> Dict[int, int]:
+        """
+        Count the trigrams every word shares with text, touching only words
+        that share at least one
+
+        :param text: Normalized text
+        :return: Dictionary mapping word positions to shared trigram counts
+        """
+        shared = defaultdict(int)
+        for gram, count in trigrams(text).items():
+            for word_id, word_count in self._postings.get(gram, ()):
+                shared[word_id] += min(count, word_count)
+        return shared
+
+
+class MatchIndex:
+    """
+    Fuzzy matcher over a fixed list of choices
+    """
+
+    def __init__(
+        self,
+        choices: Iterable[str],
+        cache_size: int = 4096,
+        max_candidates: int = 64,
+        aliases: Optional[Dict[str, Tuple[str, int]]] = None,
+    ):
+        """
+        :param choices: Strings queries get matched against
+        :param cache_size: Number of recent queries to remember
+        :param max_candidates: Most choices to score for a query without a
+            near-exact match. Vocabularies up to this size are scored in full,
+            which the default keeps true of the mapper's VOCABULARY
+        :param aliases: Normalized queries mapped to their (choice, score),
+            returned without scoring. Aliases of unknown choices are dropped.
+        """
+        self.choices = list(choices)
+        self.max_candidates = max_candidates
+
+        # Normalized choice -> first choice with that normalization, which is
+        # the one extract_one picks when scores tie
+        self._by_normal = dict()
+        for choice in self.choices:
+            self._by_normal.setdefault(process_choice(choice), choice)
+        self._normals = list(self._by_normal)
+        self._ngrams = NGramIndex(self._normals)
+
+        known = set(self.choices)
+        self._aliases = {
+            alias: (choice, score)
+            for alias, (choice, score) in (aliases or dict()).items()
+            if choice in known
+        }
+
+        self.match = lru_cache(maxsize=cache_size)(self._match)
+
+    def _match(self, query: str) -> Optional[Tuple[str, int]]:
+        """
+        Find the best matching choice for a query
+
+        :param query: Text to match
+        :return: (best matching choice, score out of 100), or None if there
+            are no choices
+        """
+        if not self._normals:
+            return None
+
+        normal = normalize(query)
+        if normal in self._by_normal:
+            # Exact hit after normalization
+            return self._by_normal[normal], 100
+        if normal in self._aliases:
+            return self._aliases[normal]
+
+        shared = self._ngrams.shared(normal) if normal else dict()
+        near_exact = self._near_exact(normal, shared)
+        if near_exact is not None:
+            return near_exact
+
+        best_id, best_score = None, -1
+        for choice_id in self._candidates(normal, shared):
+            score = weighted_ratio(normal, self._normals[choice_id])
+            if score > best_score:
+                best_id, best_score = choice_id, score
+        return self._by_normal[self._normals[best_id]], best_score
+
+    def _near_exact(
+        self, normal: str, shared: Dict[int, int]
+    ) -> Optional[Tuple[str, int]]:
+        """
+        Look for a choice that scores at least NEAR_EXACT_SCORE
+
+        A rounded ratio of 96 needs an indel distance of at most 4.5% of the
+        two strings' combined length, which keeps it within 0.0943 * len(query).
+        Each insertion or deletion changes at most 3 trigrams, so every choice
+        that could score that high shares at least len(query) - 3 * radius of
+        the query's trigrams, and nothing else can score better.
+
+        :param normal: Normalized query
+        :param shared: Trigrams each choice shares with the query
+        :return: (best matching choice, score), or None if no choice is that close
+        """
+        radius = math.floor(0.0943 * len(normal))
+        if radius == 0:
+            return None
+
+        min_shared = len(normal) - 3 * radius
+        best = None
+        for choice_id in sorted(shared):
+            candidate = self._normals[choice_id]
+            if (
+                shared[choice_id] < min_shared
+                or abs(len(candidate) - len(normal)) > radius
+            ):
+                continue
+            score = weighted_ratio(normal, candidate)
+            if score >= NEAR_EXACT_SCORE and (best is None or score > best[1]):
+                best = (candidate, score)
+
+        if best is None:
+            return None
+        return self._by_normal[best[0]], best[1]
+
+    def _candidates(self, normal: str, shared: Dict[int, int]) -> List[int]:
+        """
+        Choices worth scoring: all of them in a small vocabulary, otherwise
+        those sharing the largest fraction of the shorter string's trigrams, or
+        the first few if none share any
+
+        :param normal: Normalized query
+        :param shared: Trigrams each choice shares with the query
+        :return: Positions of the choices to score, in order
+        """
+        if not shared or len(self._normals) <= self.max_candidates:
+            return list(range(min(self.max_candidates, len(self._normals))))
+
+        size = len(normal)
+        sizes = self._ngrams.sizes
+        ranked = sorted(
+            shared,
+            key=lambda choice_id: (
+                -shared[choice_id] / min(size, sizes[choice_id]),
+                -shared[choice_id],
+                choice_id,
+            ),
+        )
+        return sorted(ranked[: self.max_candidates])
+
+    def cache_info(self):
+        """
+        Hit and miss counts of the recent query cache
+        """
+        return self.match.cache_info()
@@ -0,0 +1,146 @@
+"""
+gzip and brotli compression of response bodies, negotiated with Accept-Encoding
+
+Only bodies of at least COMPRESS_MIN_BYTES are compressed: below that the
+compressed body plus its headers is barely smaller, if at all. Compressed
+bodies are binary, so they are sent base64-encoded with isBase64Encoded, as
+Lambda proxy integration requires, and API Gateway has to treat every media
+type as binary (binaryMediaTypes: '*/*') to decode them again.
+
+brotli is used when the brotli package is installed and the client accepts it,
+and gzip otherwise. The gzip compressor is set up once, the first time a body
+is compressed, and each response compresses with a copy of it, so cold starts
+that never compress don't pay for it and warm invocations skip the setup.
+"""
+import base64
+import functools
+import os
+import zlib
+from typing import Any, Dict, Mapping, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+LambdaDict = Dict[str, Any]
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+# Fast levels: a turn's response is small, and we pay for the CPU too
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 3))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 4))
+
+# In order of preference when the client accepts both equally
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# 16 + 15 window bits writes a gzip header and trailer instead of zlib's
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+_gzip_compressor = None
+
+
+def header(event: Mapping, name: str) -> str:
+    """
+    Function to read a request header, whatever its case
+
+    :param event: Input AWS Lambda event dict
+    :param name: Lower case header name
+    :return: The header's value, or "" if it wasn't sent
+    """
+    for key, value in (event.get("headers") or {}).items():
+        if key.lower() == name:
+            return value or ""
+    return ""
+
+
+@functools.lru_cache(maxsize=64)
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Function to pick the encoding to compress with from an Accept-Encoding
+    header, honouring q-values
+
+    :param accept_encoding: The client's Accept-Encoding header
+    :return: "br", "gzip", or None to send the body as it is
+    """
+    weights = dict()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip()] = weight
+
+    best, best_weight = None, 0.0
+    for coding in ENCODINGS:
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def gzip_compress(data: bytes) -> bytes:
+    """
+    Function to gzip a body with a copy of the shared compressor
+
+    :param data: The body
+    :return: gzip bytes
+    """
+    global _gzip_compressor
+    if _gzip_compressor is None:
+        _gzip_compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, GZIP_WBITS)
+    compressor = _gzip_compressor.copy()
+    return compressor.compress(data) + compressor.flush()
+
+
+def brotli_compress(data: bytes) -> bytes:
+    return brotli.compress(data, quality=BROTLI_QUALITY)
+
+
+COMPRESSORS = {"gzip": gzip_compress, "br": brotli_compress}
+
+
+@functools.lru_cache(maxsize=None)
+def _encoded_headers(headers: tuple, encoding: str) -> Dict[str, str]:
+    return {**dict(headers), "Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+
+
+def compress_response(
+    event: Mapping, response: LambdaDict, min_bytes: int = COMPRESS_MIN_BYTES
+) -> LambdaDict:
+    """
+    Function to compress a proxy response's body, if the client accepts it and
+    it is big enough to be worth it
+
+    :param event: Input AWS Lambda event dict
+    :param response: Output AWS Lambda dict
+    :param min_bytes: Smallest body to compress
+    :return: The response, compressed or as it was
+    """
+    body = response.get("body")
+    if not isinstance(body, str) or len(body) < min_bytes:
+        return response
+    headers = response.get("headers") or {}
+    if "Content-Encoding" in headers:
+        return response
+    encoding = choose_encoding(header(event, "accept-encoding"))
+    if encoding is None:
+        return response
+
+    if response.get("isBase64Encoded"):
+        data = base64.b64decode(body)
+    else:
+        data = body.encode("utf-8")
+    compressed = COMPRESSORS[encoding](data)
+    if len(compressed) >= len(data):
+        return response
+
+    return {
+        **response,
+        "body": base64.b64encode(compressed).decode("ascii"),
+        "isBase64Encoded": True,
+        "headers": _encoded_headers(tuple(headers.items()), encoding),
+    }
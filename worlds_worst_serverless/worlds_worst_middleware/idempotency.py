@@ -0,0 +1,286 @@
+"""
+Idempotent requests: a retry carrying the same Idempotency-Key header gets the
+response of the first request, without the handler running again
+
+The first request with a key claims it with a conditional put into
+IDEMPOTENCY_TABLE. Once it succeeds, its response is stored under the key.
+Retries find the claim, and either get the stored response or, if the first
+request is still running, a 409 to retry later. The claimed keys are also kept
+in an in-process LRU, so retries that land on the same warm container skip
+DynamoDB altogether. Keys expire after IDEMPOTENCY_TTL seconds, with DynamoDB's
+TTL on expires_at cleaning up the table.
+
+A claim only holds for IDEMPOTENCY_LEASE seconds, about the function's timeout,
+until the response is stored. A request that timed out never releases its key,
+so once its lease runs out a retry takes the key over and runs the request
+again, rather than getting a 409 until the key expires.
+
+Each key is tied to a hash of the request body, so reusing a key for a
+different request is answered with a 422 rather than someone else's response.
+Only successful responses are stored: if the handler fails, the key is
+released so a retry runs it again.
+
+Without IDEMPOTENCY_TABLE only the LRU is used, which is enough for the
+gateway. Point DYNAMODB_ENDPOINT at DynamoDB Local to use a local table.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Mapping, Optional
+
+import boto3
+from botocore.exceptions import ClientError
+
+try:
+    from compression import header
+    from middleware import HTTPError
+except ImportError:
+    from .compression import header
+    from .middleware import HTTPError
+
+LambdaDict = Dict[str, Any]
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+IDEMPOTENCY_TABLE = os.environ.get("IDEMPOTENCY_TABLE")
+IDEMPOTENCY_TTL = int(os.environ.get("IDEMPOTENCY_TTL", 24 * 60 * 60))
+IDEMPOTENCY_LEASE = int(os.environ.get("IDEMPOTENCY_LEASE", 30))
+LRU_SIZE = int(os.environ.get("IDEMPOTENCY_LRU_SIZE", 1024))
+
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+
+
+def fingerprint(body: Any) -> str:
+    """
+    Function to hash a request body, to tell a retry from a different request
+    that reuses its key
+
+    :param body: Decoded request body
+    :return: Hex digest
+    """
+    encoded = json.dumps(body, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Class to claim request keys and remember the responses to them
+    """
+
+    def __init__(
+        self,
+        table_name: Optional[str] = IDEMPOTENCY_TABLE,
+        lru_size: int = LRU_SIZE,
+        ttl: int = IDEMPOTENCY_TTL,
+        lease: int = IDEMPOTENCY_LEASE,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        :param table_name: DynamoDB table to claim keys in, None for the LRU only
+        :param lru_size: Keys to remember in process
+        :param ttl: Seconds a key is remembered for once answered
+        :param lease: Seconds a claim holds while its request runs
+        :param clock: Wall clock, as DynamoDB's TTL uses, injectable for testing
+        """
+        self.table_name = table_name
+        self.lru_size = lru_size
+        self.ttl = ttl
+        self.lease = lease
+        self.clock = clock
+        # key -> (fingerprint, response or None while in progress, expires_at)
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._table = None
+
+    @property
+    def table(self) -> Any:
+        """
+        The DynamoDB table, connected on first use so handlers that never see a
+        key don't pay for a client
+        """
+        if self._table is None and self.table_name is not None:
+            dynamodb = boto3.resource(
+                "dynamodb",
+                region_name="us-east-1",
+                endpoint_url=os.environ.get("DYNAMODB_ENDPOINT"),
+            )
+            self._table = dynamodb.Table(self.table_name)
+        return self._table
+
+    def warm_up(self) -> bool:
+        """
+        Function to connect to the table ahead of the first keyed request
+
+        :return: Whether there is a table
+        """
+        if self.table is None:
+            return False
+        self.table.load()
+        return True
+
+    def run(
+        self, event: Mapping, body: Any, call: Callable[[], LambdaDict]
+    ) -> LambdaDict:
+        """
+        Function to answer a request once per Idempotency-Key
+
+        :param event: Input AWS Lambda event dict
+        :param body: Decoded request body
+        :param call: Function running the handler and returning its response
+        :return: The response, stored or fresh
+        """
+        key = header(event, IDEMPOTENCY_HEADER)
+        if not key:
+            return call()
+
+        body_hash = fingerprint(body)
+        stored = self.begin(key, body_hash)
+        if stored is not None:
+            print(f"Replaying response to request {key}")
+            return stored
+
+        try:
+            response = call()
+        except BaseException:
+            self.release(key)
+            raise
+        if 200 <= response.get("statusCode", 500) < 300:
+            self.complete(key, body_hash, response)
+        else:
+            self.release(key)
+        return response
+
+    def begin(self, key: str, body_hash: str) -> Optional[LambdaDict]:
+        """
+        Function to claim a key for a request
+
+        :param key: The request's Idempotency-Key
+        :param body_hash: fingerprint of its body
+        :return: The stored response if the key was already answered, or None
+            if this request claimed it and should run
+        """
+        now = self.clock()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None and entry[2] > now:
+                self._lru.move_to_end(key)
+                return self._check(key, body_hash, entry[0], entry[1])
+            self._remember(key, (body_hash, None, now + self.lease))
+
+        if self.table is None:
+            return None
+
+        lease_expires_at = int(now + self.lease)
+        try:
+            self.table.put_item(
+                Item={
+                    "requestId": key,
+                    "fingerprint": body_hash,
+                    "state": IN_PROGRESS,
+                    "lease_expires_at": lease_expires_at,
+                    "expires_at": lease_expires_at,
+                },
+                # TTL deletes expired items late, so treat them as gone already,
+                # and take over claims whose request ran out of time
+                ConditionExpression=(
+                    "attribute_not_exists(requestId) OR expires_at < :now "
+                    "OR (#state = :in_progress AND lease_expires_at < :now)"
+                ),
+                ExpressionAttributeNames={"#state": "state"},
+                ExpressionAttributeValues={
+                    ":now": int(now),
+                    ":in_progress": IN_PROGRESS,
+                },
+            )
+            return None
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                self._forget(key)
+                raise
+
+        item = self.table.get_item(Key={"requestId": key}, ConsistentRead=True).get(
+            "Item", {}
+        )
+        response = None
+        if item.get("state") == COMPLETED:
+            response = json.loads(item["response"])
+            with self._lock:
+                self._remember(
+                    key, (item["fingerprint"], response, int(item["expires_at"]))
+                )
+        else:
+            # Someone else is running it, so this request doesn't own the key
+            self._forget(key)
+        return self._check(key, body_hash, item.get("fingerprint", body_hash), response)
+
+    def complete(self, key: str, body_hash: str, response: LambdaDict) -> None:
+        """
+        Function to store the response to a claimed key
+
+        :param key: The request's Idempotency-Key
+        :param body_hash: fingerprint of its body
+        :param response: The response to replay to retries
+        """
+        expires_at = self.clock() + self.ttl
+        with self._lock:
+            self._remember(key, (body_hash, response, expires_at))
+        if self.table is not None:
+            # Only now is the key kept for the full TTL
+            self.table.update_item(
+                Key={"requestId": key},
+                UpdateExpression=(
+                    "SET #state = :completed, #response = :response, "
+                    "expires_at = :expires_at REMOVE lease_expires_at"
+                ),
+                ExpressionAttributeNames={"#state": "state", "#response": "response"},
+                ExpressionAttributeValues={
+                    ":completed": COMPLETED,
+                    ":response": json.dumps(response),
+                    ":expires_at": int(expires_at),
+                },
+            )
+
+    def release(self, key: str) -> None:
+        """
+        Function to give up a claimed key, so a retry runs the request again
+
+        :param key: The request's Idempotency-Key
+        """
+        self._forget(key)
+        if self.table is not None:
+            try:
+                self.table.delete_item(
+                    Key={"requestId": key},
+                    ConditionExpression="#state = :in_progress",
+                    ExpressionAttributeNames={"#state": "state"},
+                    ExpressionAttributeValues={":in_progress": IN_PROGRESS},
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+
+    def _check(
+        self,
+        key: str,
+        body_hash: str,
+        stored_hash: str,
+        response: Optional[LambdaDict],
+    ) -> LambdaDict:
+        if stored_hash != body_hash:
+            raise HTTPError(422, f"Idempotency-Key {key} was used for another request")
+        if response is None:
+            raise HTTPError(409, f"Request {key} is still being processed, retry later")
+        return response
+
+    def _remember(self, key: str, entry: tuple) -> None:
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            self._lru.pop(key, None)
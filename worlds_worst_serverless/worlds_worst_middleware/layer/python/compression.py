@@ -0,0 +1 @@
+../../compression.py
\ No newline at end of file
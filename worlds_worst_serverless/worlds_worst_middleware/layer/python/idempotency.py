@@ -0,0 +1 @@
+../../idempotency.py
\ No newline at end of file
@@ -0,0 +1 @@
+../../middleware.py
\ No newline at end of file
@@ -0,0 +1,363 @@
+"""
+Middleware shared by the Lambda handlers of every service
+
+A handler wrapped with lambda_handler gets the request body already decoded and
+checked against its Schema, and returns just the response body, which is
+encoded with headers built once at import. Bodies that can't be decoded or
+don't match the schema are answered with a 400, and handlers raise HTTPError
+for any other 4xx, so malformed input never gets as far as a KeyError or
+TypeError inside the handler. Handlers can also have large responses
+compressed, see compression, and retries answered without running again, see
+idempotency.
+
+Every request is validated, whether it came from API Gateway or straight
+through the Lambda Invoke API: nothing in an event says reliably who sent it.
+
+Scheduled warm-up pings are answered before any of that, after running the
+handler's warm_up function to build whatever its first real request would
+otherwise pay for. Under provisioned concurrency warm_up also runs while the
+function initializes.
+
+The services are deployed separately, so this module is deployed as a Lambda
+layer (see serverless.yml here) and imported flat as middleware.
+"""
+import base64
+import functools
+import json
+import os
+import time
+from collections.abc import Hashable
+from dataclasses import MISSING, fields
+from typing import Any, Callable, Dict, Mapping, Optional
+
+try:
+    from compression import compress_response
+except ImportError:
+    from .compression import compress_response
+
+LambdaDict = Dict[str, Any]
+
+HEADERS = {"Access-Control-Allow-Origin": "*"}
+
+
+@functools.lru_cache(maxsize=None)
+def content_headers(content_type: str) -> Dict[str, str]:
+    """
+    Function to get the response headers for a Content-Type, built once per type.
+    The same dict is returned every time, so don't change it.
+
+    :param content_type: Media type of the response body
+    :return: Response headers
+    """
+    return {**HEADERS, "Content-Type": content_type}
+
+
+JSON_HEADERS = content_headers("application/json")
+
+
+class HTTPError(Exception):
+    """
+    Raised by a handler to answer with an error status instead of a body
+    """
+
+    def __init__(self, status_code: int, error: str):
+        """
+        :param status_code: HTTP status of the response
+        :param error: Message sent back to the client
+        """
+        super().__init__(error)
+        self.status_code = status_code
+        self.error = error
+
+
+class SchemaError(HTTPError):
+    """
+    Raised when a request body doesn't match its schema
+    """
+
+    def __init__(self, error: str):
+        super().__init__(400, error)
+
+
+Check = Callable[[Any, str], None]
+
+JSON_NAMES = {
+    str: "a string",
+    int: "an integer",
+    float: "a number",
+    bool: "a boolean",
+    list: "an array",
+    dict: "an object",
+}
+
+
+class Schema:
+    """
+    Class to check a decoded body against the keys and types a handler expects
+
+    The checks are compiled once, when the schema is made, into one function per
+    key, so validating a request is a single pass over its keys.
+    """
+
+    def __init__(
+        self,
+        required: Mapping[str, Any],
+        optional: Optional[Mapping[str, Any]] = None,
+        allow_extra: bool = True,
+    ):
+        """
+        :param required: Keys the body must have, mapped to their type, a tuple
+            of types, a frozenset of the values allowed, or a Schema for nested
+            objects
+        :param optional: Keys the body may have, mapped the same way
+        :param allow_extra: Whether keys not named here are allowed
+        """
+        optional = optional or dict()
+        self.required = frozenset(required)
+        self.allow_extra = allow_extra
+        self._checks = {key: _compile(spec) for key, spec in required.items()}
+        self._checks.update({key: _compile(spec) for key, spec in optional.items()})
+
+    @classmethod
+    def from_dataclass(cls, dataclass: type, **specs: Any) -> "Schema":
+        """
+        Function to make the schema of a dataclass's fields, with the fields that
+        have defaults optional and no other keys allowed, the same keys
+        dataclass(**body) accepts
+
+        :param dataclass: The dataclass, e.g. Player
+        :param specs: Checks to make instead of a field's type, by field name
+        :return: Schema of its fields
+        """
+        required = dict()
+        optional = dict()
+        for dataclass_field in fields(dataclass):
+            if dataclass_field.name in specs:
+                spec = specs[dataclass_field.name]
+            elif isinstance(dataclass_field.type, type):
+                spec = dataclass_field.type
+            else:
+                spec = object
+            if dataclass_field.default is MISSING and (
+                dataclass_field.default_factory is MISSING
+            ):
+                required[dataclass_field.name] = spec
+            else:
+                optional[dataclass_field.name] = spec
+        return cls(required, optional, allow_extra=False)
+
+    def validate(self, body: Any, path: str = "body") -> None:
+        """
+        Function to check a body against the schema
+
+        :param body: Decoded request body
+        :param path: Where the body is in the request, for error messages
+        """
+        if not isinstance(body, dict):
+            raise SchemaError(f"{path} must be an object")
+
+        missing = self.required.difference(body)
+        if missing:
+            raise SchemaError(f"{path} is missing {', '.join(sorted(missing))}")
+
+        checks = self._checks
+        for key, value in body.items():
+            check = checks.get(key)
+            if check is not None:
+                check(value, f"{path}.{key}")
+            elif not self.allow_extra:
+                raise SchemaError(f"{path} has unexpected key {key}")
+
+
+def _compile(spec: Any) -> Check:
+    """
+    Function to turn a schema entry into the function that checks it
+
+    :param spec: A type, a tuple of types, a frozenset of values, or a Schema
+    :return: Function taking the value and its path, raising SchemaError
+    """
+    if isinstance(spec, Schema):
+        return spec.validate
+    if spec is object:
+        return lambda value, path: None
+    if isinstance(spec, frozenset):
+        allowed = ", ".join(sorted(map(str, spec)))
+
+        def check_value(value: Any, path: str) -> None:
+            if not isinstance(value, Hashable) or value not in spec:
+                raise SchemaError(f"{path} must be one of {allowed}")
+
+        return check_value
+
+    types = spec if isinstance(spec, tuple) else (spec,)
+    # JSON has no integers that are also booleans
+    reject_bool = bool not in types
+    expected = " or ".join(sorted(JSON_NAMES.get(t, t.__name__) for t in types))
+
+    def check(value: Any, path: str) -> None:
+        if not isinstance(value, types) or (reject_bool and isinstance(value, bool)):
+            raise SchemaError(f"{path} must be {expected}")
+
+    return check
+
+
+def decode_json(event: Mapping) -> Any:
+    """
+    Function to decode a JSON request body. Bodies sent through the Lambda
+    Invoke API may already be decoded.
+
+    :param event: Input AWS Lambda event dict
+    :return: The decoded body
+    """
+    body = event.get("body")
+    if event.get("isBase64Encoded") and isinstance(body, str):
+        body = base64.b64decode(body)
+    if isinstance(body, (str, bytes)):
+        return json.loads(body)
+    return body
+
+
+def encode_json(event: Mapping, body: Any, status_code: int = 200) -> LambdaDict:
+    """
+    Function to encode a response body. Strings are sent as they are, anything
+    else as JSON.
+
+    :param event: Input AWS Lambda event dict
+    :param body: Response body
+    :param status_code: HTTP status of the response
+    :return: Output AWS Lambda dict
+    """
+    if isinstance(body, str):
+        return {"statusCode": status_code, "body": body, "headers": HEADERS}
+    return {
+        "statusCode": status_code,
+        "body": json.dumps(body, default=str),
+        "headers": JSON_HEADERS,
+    }
+
+
+def error_response(status_code: int, error: str) -> LambdaDict:
+    """
+    Function to make an error response
+
+    :param status_code: HTTP status of the response
+    :param error: Message sent back to the client
+    :return: Output AWS Lambda dict
+    """
+    result = {
+        "statusCode": status_code,
+        "body": json.dumps({"Error": error}),
+        "headers": JSON_HEADERS,
+    }
+    print(f"Sending response: {result}")
+    return result
+
+
+# Sources of warm-up pings: serverless-plugin-warmup, and EventBridge schedules
+WARM_UP_SOURCES = frozenset(("serverless-plugin-warmup", "aws.events"))
+
+
+def is_warm_up(event: Mapping) -> bool:
+    """
+    Function to tell whether an event is a scheduled ping to keep the function
+    warm rather than a request
+
+    :param event: Input AWS Lambda event dict
+    :return: Whether to only warm up
+    """
+    return event.get("source") in WARM_UP_SOURCES
+
+
+def run_warm_up(name: str, warm_up: Optional[Callable[[], Dict]]) -> LambdaDict:
+    """
+    Function to run a handler's warm-up and report how long it took
+
+    :param name: Name of the handler
+    :param warm_up: Function building what the handler's first request would,
+        returning what it built
+    :return: Output AWS Lambda dict
+    """
+    start = time.perf_counter()
+    primed = warm_up() if warm_up is not None else dict()
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+    print(f"Warmed up {name} in {elapsed_ms} ms: {primed}")
+    return {
+        "statusCode": 200,
+        "body": json.dumps(
+            {"warmed_up": name, "elapsed_ms": elapsed_ms, "primed": primed},
+            default=str,
+        ),
+        "headers": JSON_HEADERS,
+    }
+
+
+Handler = Callable[[Any, LambdaDict, Any], Any]
+
+
+def lambda_handler(
+    schema: Optional[Schema] = None,
+    decode: Callable[[Mapping], Any] = decode_json,
+    encode: Callable[[Mapping, Any], LambdaDict] = encode_json,
+    compress: bool = False,
+    idempotency: Optional[Any] = None,
+    warm_up: Optional[Callable[[], Dict]] = None,
+) -> Callable[[Handler], Callable[[LambdaDict, Any], LambdaDict]]:
+    """
+    Function to make a Lambda handler out of a function taking the decoded body
+
+    The wrapped function is called as handler(body, event, context) and returns
+    the response body, or raises HTTPError.
+
+    :param schema: Schema to check request bodies against, None to check nothing
+    :param decode: Function to decode the body of an event
+    :param encode: Function to turn the event and a response body into the
+        Lambda response
+    :param compress: Whether to compress large responses for clients that accept
+        it, which needs binaryMediaTypes: '*/*' in serverless.yml
+    :param idempotency: IdempotencyStore to answer retries with the first
+        response, for requests sent with an Idempotency-Key
+    :param warm_up: Function building everything the handler's first request
+        would, run for warm-up pings, returning what it built
+    :return: Decorator making the Lambda handler
+    """
+
+    def decorator(handler: Handler) -> Callable[[LambdaDict, Any], LambdaDict]:
+        if warm_up is not None and (
+            os.environ.get("AWS_LAMBDA_INITIALIZATION_TYPE")
+            == "provisioned-concurrency"
+        ):
+            # Provisioned instances initialize long before their first request
+            run_warm_up(handler.__name__, warm_up)
+
+        @functools.wraps(handler)
+        def wrapped(event: LambdaDict, context: Any) -> LambdaDict:
+            if is_warm_up(event):
+                return run_warm_up(handler.__name__, warm_up)
+
+            try:
+                body = decode(event)
+            except ValueError as e:
+                # Covers bad JSON, bad base64 and bad MessagePack alike
+                return error_response(400, f"Malformed request body: {e}")
+
+            try:
+                if schema is not None:
+                    schema.validate(body)
+                if idempotency is None:
+                    result = encode(event, handler(body, event, context))
+                else:
+                    result = idempotency.run(
+                        event,
+                        body,
+                        lambda: encode(event, handler(body, event, context)),
+                    )
+            except HTTPError as e:
+                return error_response(e.status_code, e.error)
+
+            if compress:
+                result = compress_response(event, result)
+            return result
+
+        return wrapped
+
+    return decorator
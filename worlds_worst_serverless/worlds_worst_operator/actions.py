@@ -0,0 +1,120 @@
+"""
+What each kind of command does to the player and their target
+
+Every action takes both players, already loaded, and returns them along with
+the player_data changes to write back and the messages for the player.
+do_combat returns the players as the turn left them, while change_class leaves
+them as they were and only returns the changes. Nothing here writes to
+DynamoDB; the operator writes both players in one transaction afterwards.
+"""
+from dataclasses import asdict, fields
+from typing import Dict, List, Optional, Tuple
+
+# Package imports only: database_ops can't be imported flat, see there
+from .database_ops import dynamodb, get_player
+from ..worlds_worst_auth.player_diff import diff_player
+from ..worlds_worst_combat.combat_engine import ABILITIES, resolve_turn
+from ..worlds_worst_combat.player_data import Player
+
+ActionResult = Tuple[Player, Player, Dict, Dict, List[str]]
+
+# Character classes in the order abilities.json lists them
+CLASSES = tuple(dict.fromkeys(ability["class"] for ability in ABILITIES))
+
+PLAYER_FIELDS = frozenset(player_field.name for player_field in fields(Player))
+
+
+def to_player(player_data: Dict) -> Player:
+    """
+    Function to build a Player from stored player_data, ignoring anything
+    Player doesn't know about
+
+    :param player_data: The player_data of a player item
+    :return: Player
+    """
+    return Player(
+        **{key: value for key, value in player_data.items() if key in PLAYER_FIELDS}
+    )
+
+
+def load_target(player: Player, table: dynamodb.Table) -> Player:
+    """
+    Function to load a player's current target, for actions called on their own
+
+    :param player: Player whose target to load
+    :param table: DynamoDB table object
+    :return: The target
+    """
+    if not player.target:
+        raise LookupError(f"{player.name} has no target")
+    item = get_player(table=table, player_token=player.target)
+    if "Error" in item:
+        raise LookupError(f"Target {player.target!r}: {item['Error']}")
+    return to_player(item["player_data"])
+
+
+def do_combat(
+    player: Player, table: dynamodb.Table = None, target: Optional[Player] = None
+) -> ActionResult:
+    """
+    Function to play one turn of combat against the target, who uses the last
+    action they chose
+
+    :param player: Player taking the turn, with the action they chose
+    :param table: DynamoDB table object, to load the target if not given
+    :param target: The player's target
+    :return: Updated player and target, their changes and the combat messages
+    """
+    if target is None:
+        target = load_target(player, table)
+
+    player_before = asdict(player)
+    target_before = asdict(target)
+    player, target, message = resolve_turn(player, target)
+    message.append(f"{target.name} has {target.hit_points} HP left.")
+
+    player_updates = diff_player(player_before, asdict(player))
+    target_updates = diff_player(target_before, asdict(target))
+    return player, target, player_updates, target_updates, message
+
+
+def change_class(
+    player: Player, table: dynamodb.Table = None, target: Optional[Player] = None
+) -> ActionResult:
+    """
+    Function to change the player's class to the one named in their action, or
+    to the next one if none is named, and start both players over
+
+    :param player: Player changing class
+    :param table: DynamoDB table object, to load the target if not given
+    :param target: The player's target
+    :return: The player and target as they were, their changes and the messages
+    """
+    if target is None:
+        target = load_target(player, table)
+
+    named = [word for word in player.action.lower().split() if word in CLASSES]
+    if named:
+        new_class = named[-1]
+    elif player.character_class in CLASSES:
+        current = CLASSES.index(player.character_class)
+        new_class = CLASSES[(current + 1) % len(CLASSES)]
+    else:
+        new_class = CLASSES[0]
+
+    message = [
+        f"Changing class from {player.character_class} to {new_class}.",
+        "Resetting HP, EX and status for player and target.",
+    ]
+    player_updates = {
+        "character_class": new_class,
+        "hit_points": player.max_hit_points,
+        "ex": 0,
+        "status_effects": [],
+    }
+    target_updates = {
+        "hit_points": target.max_hit_points,
+        "ex": 0,
+        "status_effects": [],
+    }
+    return player, target, player_updates, target_updates, message
@@ -0,0 +1,44 @@
+"""
+Player storage for the operator
+
+The operator shares the auth service's player table, so it uses the same data
+access functions: one cache, one update compiler and one item layout.
+"""
+from typing import Dict
+
+from botocore.exceptions import ClientError
+
+# Relative only: imported flat, this module would shadow the one it wraps
+from ..worlds_worst_auth.database_ops import (
+    DecimalEncoder,
+    StaleVersionError,
+    batch_load_players,
+    dynamodb,
+    load_player,
+    to_native,
+    transact_update_players,
+    update_player,
+)
+
+
+def get_player(table: dynamodb.Table, player_token: str) -> Dict:
+    """
+    Function to get player information from DynamoDB
+
+    :param table: DynamoDB table object
+    :param player_token: Player ID token linking player to database entry
+
+    :return: Dictionary containing player information, or an error message
+    """
+    print(f"Getting 'playerId': {player_token} from DB")
+    try:
+        item = load_player(table=table, player_token=player_token)
+    except ClientError as e:
+        return {"Error": e.response["Error"]["Message"]}
+
+    if item is None:
+        print("Player does not exist.")
+        return {"Error": "Queried player does not exist."}
+
+    print("Retrieved Player Info.")
+    return item
@@ -0,0 +1,333 @@
+"""
+Simultaneous moves: each player sends only their own move, and the turn is
+played as soon as both are in
+
+A fight between two players is one item in FIGHTS_TABLE, keyed by both player
+tokens. A move is sealed into it with a conditional UpdateItem that fails if
+the player already moved this turn, and returns the whole item. The request
+whose write returns both moves plays the turn, so nobody polls for their
+opponent's move. It writes both players, clears the moves and bumps the fight's
+turn in one transaction, conditional on the turn it played, so a turn is never
+played twice even when a request is retried. If that request fails, the turn
+isn't lost: any later move from either player finds both moves still in and
+plays the turn instead.
+
+A request may name the turn it is a move for, which every response gives. A
+move for a turn that was already played, such as a retry of a request that
+went through, is then refused instead of sealed into the next turn.
+
+As with the operator, the player moving is the one their auth_token belongs to.
+
+The player who moved first gets the turn's result with their next move, as
+last_result.
+"""
+import json
+import os
+from dataclasses import asdict
+from typing import Any, Dict, Optional
+
+import boto3
+from botocore.exceptions import ClientError
+
+# Package imports only: database_ops can't be imported flat, see there, and a
+# flat "operator" is the stdlib module
+from .actions import to_player
+from .database_ops import StaleVersionError, batch_load_players, get_player
+from .database_ops import to_native, transact_update_players
+from .operator import HEADERS, MAX_ATTEMPTS, error_response, history_items
+from .operator import authenticated_player, encode_response
+from ..worlds_worst_auth.player_diff import diff_player
+from ..worlds_worst_combat.combat_engine import resolve_turn
+from ..worlds_worst_combat.handler import player_payload
+from ..worlds_worst_mapper.command_parser import parse_command
+from ..worlds_worst_middleware.middleware import Schema, lambda_handler
+
+LambdaDict = Dict[str, Any]
+
+MOVE_SCHEMA = Schema(
+    {"action": str},
+    {"auth_token": object, "enhanced": bool, "target": str, "turn": int},
+)
+
+
+def fight_key(player_token: str, target_token: str) -> str:
+    """
+    Function to name the fight between two players, the same whoever asks
+
+    :param player_token: Player ID token of one player
+    :param target_token: Player ID token of the other
+    :return: Fight ID
+    """
+    return "#".join(sorted((player_token, target_token)))
+
+
+def move_attribute(player_token: str) -> str:
+    return f"move_{player_token}"
+
+
+def seal_move(
+    fights_table: Any,
+    fight_id: str,
+    player_token: str,
+    move: Dict,
+    turn: Optional[int] = None,
+) -> Optional[Dict]:
+    """
+    Function to store a player's move for the current turn, unless they already
+    sent one
+
+    :param fights_table: DynamoDB fights table object
+    :param fight_id: ID of the fight, from fight_key
+    :param player_token: Player ID token of the player moving
+    :param move: Their action and enhanced flag
+    :param turn: The turn the move is for, or None for whichever is current
+    :return: The fight item with the move in it, or None if they already moved
+        or it isn't that turn
+    """
+    condition = "attribute_not_exists(#move)"
+    values = {":move": move, ":zero": 0}
+    if turn is not None:
+        # A new fight has no turn yet, and starts at turn 0
+        if turn:
+            condition += " AND #turn = :turn"
+        else:
+            condition += " AND (attribute_not_exists(#turn) OR #turn = :turn)"
+        values[":turn"] = turn
+    try:
+        response = fights_table.update_item(
+            Key={"fightId": fight_id},
+            UpdateExpression="SET #move = :move, #turn = if_not_exists(#turn, :zero)",
+            ConditionExpression=condition,
+            ExpressionAttributeNames={
+                "#move": move_attribute(player_token),
+                "#turn": "turn",
+            },
+            ExpressionAttributeValues=values,
+            ReturnValues="ALL_NEW",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return None
+    return to_native(response["Attributes"])
+
+
+def load_fight(fights_table: Any, fight_id: str) -> Dict:
+    """
+    Function to read a fight as it is now
+
+    :param fights_table: DynamoDB fights table object
+    :param fight_id: ID of the fight, from fight_key
+    :return: The fight item, empty if there is none
+    """
+    return to_native(
+        fights_table.get_item(Key={"fightId": fight_id}, ConsistentRead=True).get(
+            "Item", {}
+        )
+    )
+
+
+@lambda_handler(schema=MOVE_SCHEMA, encode=encode_response)
+def submit_move(
+    request_body: Dict, event: LambdaDict, context: LambdaDict
+) -> LambdaDict:
+    """
+    Function to take one player's move against their target, playing the turn
+    if the target already moved
+
+    :param request_body: Decoded request body
+    :param event: Input AWS Lambda event dict
+    :param context: Input AWS Lambda context dict
+    :return: Output AWS Lambda dict
+    """
+    dynamodb = boto3.resource(
+        "dynamodb",
+        region_name="us-east-1",
+        endpoint_url=os.environ.get("DYNAMODB_ENDPOINT"),
+    )
+    player_token = authenticated_player(dynamodb, request_body)
+    if player_token is None:
+        return error_response(401, "Unknown or expired auth_token, log in again.")
+
+    command = parse_command(request_body["action"])
+    if command["function"] != "do_combat":
+        return error_response(
+            400, f"No combat action found in {request_body['action']!r}"
+        )
+
+    turn = request_body.get("turn")
+    if turn is not None and turn < 0:
+        return error_response(400, "turn must be a turn number.")
+
+    table = dynamodb.Table(os.environ["DYNAMODB_TABLE"])
+    fights_table = dynamodb.Table(os.environ["FIGHTS_TABLE"])
+    history_table_name = os.environ.get("HISTORY_TABLE")
+
+    target_token = command["target"] or request_body.get("target")
+    if not target_token:
+        player_item = get_player(table=table, player_token=player_token)
+        if "Error" in player_item:
+            return error_response(401, player_item["Error"])
+        target_token = player_item["player_data"].get("target")
+        if not target_token:
+            return error_response(400, "Name a target, like 'attack on bob'.")
+    if target_token == player_token:
+        return error_response(400, "You can't target yourself.")
+
+    items = batch_load_players(table=table, player_tokens=[player_token, target_token])
+    if player_token not in items:
+        return error_response(401, "Player does not exist in database")
+    if target_token not in items:
+        return error_response(404, f"Target {target_token} does not exist.")
+
+    fight_id = fight_key(player_token, target_token)
+    move = {
+        "action": command["action"],
+        "enhanced": command["enhanced"] or request_body.get("enhanced") is True,
+    }
+    fight = seal_move(fights_table, fight_id, player_token, move, turn)
+    if fight is None:
+        fight = load_fight(fights_table, fight_id)
+        current_turn = fight.get("turn", 0)
+        if turn is not None and turn != current_turn:
+            return error_response(409, f"It is turn {current_turn}, not turn {turn}.")
+        if move_attribute(player_token) not in fight:
+            return error_response(409, "This turn was just played, move again.")
+        if move_attribute(target_token) not in fight:
+            return error_response(409, "You already moved this turn.")
+        # Both moves are in, but the request that sealed the second one didn't
+        # play the turn, so play it here rather than leave the fight stuck
+        print(f"Playing turn {current_turn} of {fight_id} left unplayed")
+    elif move_attribute(target_token) not in fight:
+        return {
+            "statusCode": 202,
+            "body": json.dumps(
+                {
+                    "message": [f"Waiting for {target_token} to move."],
+                    "turn": fight["turn"],
+                    "last_result": fight.get("last_result"),
+                }
+            ),
+            "headers": HEADERS,
+        }
+
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            result = play_sealed_turn(
+                table=table,
+                fights_table=fights_table,
+                history_table_name=history_table_name,
+                fight=fight,
+                items=items,
+                player_token=player_token,
+                target_token=target_token,
+            )
+            break
+        except StaleVersionError as e:
+            print(f"Attempt {attempt + 1} lost a race: {e}")
+            fight = load_fight(fights_table, fight_id)
+            if move_attribute(target_token) not in fight:
+                # Someone else played this turn, e.g. a retry of this request
+                return error_response(409, "This turn was already played.")
+            items = batch_load_players(
+                table=table, player_tokens=[player_token, target_token]
+            )
+    else:
+        return error_response(409, "Players changed during the turn, try again.")
+
+    return {
+        "statusCode": 200,
+        "body": json.dumps(
+            {
+                "Player": player_payload(result[player_token]),
+                "message": result["message"],
+                "turn": fight["turn"] + 1,
+            }
+        ),
+        "headers": HEADERS,
+    }
+
+
+def play_sealed_turn(
+    table: Any,
+    fights_table: Any,
+    history_table_name: Optional[str],
+    fight: Dict,
+    items: Dict[str, Dict],
+    player_token: str,
+    target_token: str,
+) -> Dict:
+    """
+    Function to play a turn whose moves are both sealed, and write it back in
+    one transaction
+
+    :param table: DynamoDB player table object
+    :param fights_table: DynamoDB fights table object
+    :param history_table_name: Fight history table, or None to keep no history
+    :param fight: The fight item, with both moves
+    :param items: Both player items, from batch_load_players
+    :param player_token: Player ID token of the player whose request plays it
+    :param target_token: Player ID token of their target
+    :return: Dictionary mapping both player tokens to their updated Player, and
+        "message" to the turn's messages
+    """
+    # The same player has priority on ties whoever moves second
+    left_token, right_token = sorted((player_token, target_token))
+    players = dict()
+    before = dict()
+    chosen = dict()
+    for token in (left_token, right_token):
+        player = to_player(items[token]["player_data"])
+        before[token] = asdict(player)
+        move = fight[move_attribute(token)]
+        player.action, player.enhanced = move["action"], move["enhanced"]
+        player.target = right_token if token == left_token else left_token
+        players[token] = player
+        chosen[token] = move["action"]
+
+    left, right, message = resolve_turn(players[left_token], players[right_token])
+    fighters = {left_token: left, right_token: right}
+    history = history_items(
+        history_table_name,
+        {player_token: fighters[player_token], target_token: fighters[target_token]},
+        chosen,
+        message,
+    )
+
+    updates = dict()
+    for token, player in ((left_token, left), (right_token, right)):
+        update_map = diff_player(before[token], asdict(player))
+        if update_map:
+            updates[token] = (update_map, items[token].get("version"))
+
+    # Clear the moves and move to the next turn, unless this turn was played
+    last_result = {"turn": fight["turn"] + 1, "message": message}
+    fight_update = {
+        "Update": {
+            "TableName": fights_table.name,
+            "Key": {"fightId": fight["fightId"]},
+            "UpdateExpression": (
+                "SET #turn = #turn + :one, #last = :last REMOVE #left, #right"
+            ),
+            "ConditionExpression": (
+                "#turn = :turn AND attribute_exists(#left) "
+                "AND attribute_exists(#right)"
+            ),
+            "ExpressionAttributeNames": {
+                "#turn": "turn",
+                "#last": "last_result",
+                "#left": move_attribute(left_token),
+                "#right": move_attribute(right_token),
+            },
+            "ExpressionAttributeValues": {
+                ":one": 1,
+                ":turn": fight["turn"],
+                ":last": last_result,
+            },
+        }
+    }
+    transact_update_players(
+        table=table, updates=updates, extra_items=[fight_update] + history
+    )
+
+    return {left_token: left, right_token: right, "message": message}
@@ -0,0 +1,322 @@
+"""
+Runs a whole turn in one invocation: match the command, load both players,
+play the action and write both players back
+
+The mapper's parser and the combat engine are called as libraries instead of
+as Lambda functions. Both players are read with one BatchGetItem (or not at
+all, when the auth service's player cache has them) and written with one
+TransactWriteItems that also stores the fight in both players' history, so a
+turn costs one read and one write round trip. The fight is also pushed onto
+each player's ring buffer of recent fights, when HISTORY_RING_SIZE keeps one.
+If either player changed since it was read, the turn is played again on fresh
+copies.
+
+The player sending the command is the one their auth_token belongs to, from
+the auth service's token index, never a playerId the client sends. A player's
+target comes from the command ("attack on bob"), the request's target, or the
+target they fought last, which costs a second read.
+"""
+import json
+import os
+from dataclasses import asdict, replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import boto3
+
+# Package imports only: database_ops can't be imported flat, see there
+from .actions import change_class, do_combat, to_player
+from .database_ops import (
+    StaleVersionError,
+    batch_load_players,
+    get_player,
+    transact_update_players,
+    update_player,
+)
+from ..worlds_worst_auth.fight_history import (
+    HISTORY_RING_SIZE,
+    fight_record,
+    push_recent,
+)
+from ..worlds_worst_auth.player_diff import diff_player
+from ..worlds_worst_auth.token_index import resolve_token
+from ..worlds_worst_combat.handler import player_payload
+from ..worlds_worst_combat.player_data import Player
+from ..worlds_worst_mapper.command_parser import parse_command
+from ..worlds_worst_middleware.middleware import Schema, lambda_handler
+
+LambdaDict = Dict[str, Any]
+
+# auth_token is checked by authenticated_player, so a missing one gets a 401
+TURN_SCHEMA = Schema(
+    {"action": str}, {"auth_token": object, "enhanced": bool, "target": str}
+)
+
+# Mapper function names -> the actions that run them
+ACTION_FUNCTIONS = {"do_combat": do_combat, "change_class": change_class}
+
+# Times a turn is played before giving up on players that keep changing
+MAX_ATTEMPTS = 3
+
+HEADERS = {"Access-Control-Allow-Origin": "*"}
+
+
+def route_action(action: str) -> Tuple[Optional[str], Optional[Callable]]:
+    """
+    Function to find the action a command asks for and the function running it
+
+    :param action: Text the player typed
+    :return: (canonical action, action function), or (None, None) if the text
+        has no action in it
+    """
+    command = parse_command(action)
+    return command["action"], ACTION_FUNCTIONS.get(command["function"])
+
+
+def encode_response(event: LambdaDict, response: LambdaDict) -> LambdaDict:
+    """
+    Function to send a response as it is: the operator's handlers build whole
+    responses, since not all of them are 200s
+
+    :param event: Input AWS Lambda event dict
+    :param response: Output AWS Lambda dict
+    :return: The same response
+    """
+    return response
+
+
+@lambda_handler(schema=TURN_SCHEMA, encode=encode_response)
+def route_tasks_and_response(
+    request_body: Dict, event: LambdaDict, context: LambdaDict
+) -> LambdaDict:
+    """
+    Function to take a command from a player and play it against their target
+
+    :param request_body: Decoded request body
+    :param event: Input AWS Lambda event dict
+    :param context: Input AWS Lambda context dict
+    :return: Output AWS Lambda dict
+    """
+    dynamodb = boto3.resource(
+        "dynamodb",
+        region_name="us-east-1",
+        endpoint_url=os.environ.get("DYNAMODB_ENDPOINT"),
+    )
+    player_token = authenticated_player(dynamodb, request_body)
+    if player_token is None:
+        return error_response(401, "Unknown or expired auth_token, log in again.")
+
+    command = parse_command(request_body["action"])
+    if command["action"] is None:
+        return error_response(400, f"No action found in {request_body['action']!r}")
+
+    table = dynamodb.Table(os.environ["DYNAMODB_TABLE"])
+    history_table_name = os.environ.get("HISTORY_TABLE")
+
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return play_turn(
+                table=table,
+                history_table_name=history_table_name,
+                player_token=player_token,
+                command=command,
+                text=request_body["action"],
+                enhanced=request_body.get("enhanced") is True,
+                target_token=command["target"] or request_body.get("target"),
+            )
+        except StaleVersionError as e:
+            print(f"Attempt {attempt + 1} lost a race, playing again: {e}")
+
+    return error_response(409, "Players changed during the turn, try again.")
+
+
+def authenticated_player(dynamodb: Any, request_body: Dict) -> Optional[str]:
+    """
+    Function to find the player sending a request from their auth_token
+
+    :param dynamodb: boto3 DynamoDB resource
+    :param request_body: Decoded request body
+    :return: The player's playerId, or None if the token is missing, unknown or
+        expired
+    """
+    auth_token = request_body.get("auth_token")
+    if not isinstance(auth_token, str) or not auth_token:
+        return None
+    return resolve_token(dynamodb.Table(os.environ["TOKEN_TABLE"]), auth_token)
+
+
+def play_turn(
+    table: Any,
+    history_table_name: Optional[str],
+    player_token: str,
+    command: Dict,
+    text: str,
+    enhanced: bool,
+    target_token: Optional[str],
+) -> LambdaDict:
+    """
+    Function to play one command, from loading the players to writing them back
+
+    :param table: DynamoDB player table object
+    :param history_table_name: Fight history table, or None to keep no history
+    :param player_token: Player ID token of the player sending the command
+    :param command: The command, from parse_command
+    :param text: Text the player typed
+    :param enhanced: Whether the request asked for an enhanced action
+    :param target_token: Player ID token of the target, or None for the player's
+        current target
+    :return: Output AWS Lambda dict
+    """
+    tokens = [player_token] if not target_token else [player_token, target_token]
+    items = batch_load_players(table=table, player_tokens=tokens)
+    if player_token not in items:
+        return {
+            "statusCode": 401,
+            "body": json.dumps({"Error": "Player does not exist in database"}),
+            "message": json.dumps("Time to reroll."),
+            "headers": HEADERS,
+        }
+
+    player_item = items[player_token]
+    if not target_token:
+        target_token = player_item["player_data"].get("target")
+        if not target_token:
+            return error_response(400, "Name a target, like 'attack on bob'.")
+        if target_token != player_token:
+            items[target_token] = get_player(table=table, player_token=target_token)
+    if target_token == player_token:
+        return error_response(400, "You can't target yourself.")
+    if "player_data" not in items.get(target_token, {}):
+        return error_response(404, f"Target {target_token} does not exist.")
+    target_item = items[target_token]
+
+    player = to_player(player_item["player_data"])
+    target = to_player(target_item["player_data"])
+    player_before = asdict(player)
+    target_before = asdict(target)
+    player.target = target_token
+
+    action_function = ACTION_FUNCTIONS[command["function"]]
+    if action_function is change_class:
+        # change_class reads the class to change to from the text, and leaves
+        # the players to us to change
+        _, _, player_updates, target_updates, message = change_class(
+            replace(player, action=text), target=target
+        )
+        player = replace(player, **player_updates)
+        target = replace(target, **target_updates)
+        history = []
+    else:
+        player.action = command["action"]
+        player.enhanced = command["enhanced"] or enhanced
+        chosen = {player_token: player.action, target_token: target.action}
+        player, target, _, _, message = action_function(player, target=target)
+        history = history_items(
+            history_table_name,
+            {player_token: player, target_token: target},
+            chosen,
+            message,
+        )
+
+    # Write back what changed since the players were read
+    updates = {
+        player_token: (
+            diff_player(player_before, asdict(player)),
+            player_item.get("version"),
+        ),
+        target_token: (
+            diff_player(target_before, asdict(target)),
+            target_item.get("version"),
+        ),
+    }
+    updates = {token: update for token, update in updates.items() if update[0]}
+    if updates:
+        transact_update_players(table=table, updates=updates, extra_items=history)
+
+    return {
+        "statusCode": 200,
+        "body": json.dumps({"Player": player_payload(player), "message": message}),
+        "headers": HEADERS,
+    }
+
+
+def history_items(
+    history_table_name: Optional[str],
+    players: Dict[str, Player],
+    chosen: Dict[str, str],
+    message: List[str],
+) -> List[Dict]:
+    """
+    Function to record a fight in both players' history: the fight history
+    records, as TransactItems, and the fight pushed onto each player's ring
+    buffer of recent fights, which is written back with the player
+
+    :param history_table_name: Fight history table, or None to keep no history
+    :param players: Both players of the fight, by Player ID token
+    :param chosen: The action each player chose, by Player ID token, as status
+        effects can change it during the turn
+    :param message: What happened
+    :return: List of TransactItems, empty without a history table
+    """
+    if not history_table_name:
+        return []
+
+    player_token, target_token = players
+    fought_at = None
+    items = []
+    for token, opponent in ((player_token, target_token), (target_token, player_token)):
+        entry = {"opponent": opponent, "action": chosen[token], "message": message}
+        record = fight_record(token, entry, fought_at)
+        fought_at = record["fought_at"]
+        players[token].history = push_recent(
+            players[token].history, record, size=HISTORY_RING_SIZE
+        )
+        items.append({"Put": {"TableName": history_table_name, "Item": record}})
+    return items
+
+
+def reset_characters(table: Any, player_tokens: List[str]) -> LambdaDict:
+    """
+    Function to restore players' HP, EX and status, all in one transaction
+
+    :param table: DynamoDB player table object
+    :param player_tokens: Player ID tokens of the players to reset
+    :return: Output AWS Lambda dict
+    """
+    items = batch_load_players(table=table, player_tokens=player_tokens)
+    missing = [token for token in player_tokens if token not in items]
+    if missing:
+        return error_response(404, f"Players {missing} do not exist.")
+
+    updates = dict()
+    message = []
+    for token, item in items.items():
+        player = to_player(item["player_data"])
+        update_map = {
+            "hit_points": player.max_hit_points,
+            "ex": 0,
+            "status_effects": [],
+        }
+        updates[token] = (update_map, item.get("version"))
+        message.append(f"Reset HP, EX and status for {player.name}.")
+    transact_update_players(table=table, updates=updates)
+
+    return {
+        "statusCode": 200,
+        "body": json.dumps({"message": message}),
+        "headers": HEADERS,
+    }
+
+
+def error_response(status_code: int, error: str) -> LambdaDict:
+    """
+    Function to build an error response
+
+    :param status_code: HTTP status code
+    :param error: What went wrong
+    :return: Output AWS Lambda dict
+    """
+    return {
+        "statusCode": status_code,
+        "body": json.dumps({"Error": error}),
+        "headers": HEADERS,
+    }